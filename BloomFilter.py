@@ -0,0 +1,46 @@
+from typing import Hashable, Self
+import math
+'''
+Filtre de Bloom
+
+Ensemble probabiliste compact : un élément ajouté est toujours reconnu,
+un élément absent est reconnu à tort avec une probabilité proche de error_rate
+'''
+
+class BloomFilter:
+    '''Filtre de Bloom sur un tableau de bits, les positions de chaque élément étant obtenues par double hachage'''
+    def __init__(self, capacity: int, error_rate: float=0.01) -> None:
+        '''capacity : nombre d'éléments prévus
+        error_rate : taux de faux positifs visé pour capacity éléments'''
+        capacity = max(capacity, 1)
+        # Nombre de bits et de fonctions de hachage optimaux, avec un minimum de bits pour les petits filtres
+        size = int(-capacity * math.log(error_rate) / math.log(2) ** 2) + 1
+        self.__hashes: int = max(1, round(size / capacity * math.log(2)))
+        self.__size: int = max(size, 1024)
+        self.__bits = bytearray((self.__size + 7) // 8)
+        self.__count: int = 0
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__}: {self.__count} items, {self.__size} bits, {self.__hashes} hashes>'
+
+    def __len__(self) -> int:
+        return self.__count
+
+    def __positions(self, item: Hashable) -> list[int]:
+        '''Retourne les positions des bits de l'élément'''
+        first = hash(item)
+        second = hash((item, __class__.__name__)) | 1
+        return [ (first + index * second) % self.__size for index in range(self.__hashes) ]
+
+    def add(self, item: Hashable) -> Self:
+        '''Ajoute un élément au filtre. TypeError si l'élément n'est pas hachable'''
+        for position in self.__positions(item):
+            self.__bits[position >> 3] |= 1 << (position & 7)
+        self.__count += 1
+        return self
+
+    def __contains__(self, item: Hashable) -> bool:
+        for position in self.__positions(item):
+            if not self.__bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
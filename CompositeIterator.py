@@ -1,4 +1,5 @@
-from typing import Iterable, Self, Any
+from typing import Iterable, Iterator, Self, Any
+import itertools
 '''
 Itérateur d'itérateurs - itérateur composite
 
@@ -7,47 +8,83 @@ Itère au travers des objets passés en paramètre
 
 class CompositeIterator:
     '''Itère parmi les itérateurs passés en paramètre.
-    Par exemple, fournit toutes les combinaisons possibles entre n listes.'''
-    def __init__(self, *objects: Iterable, right_to_left: bool = True) -> None:
-        # Les objets à itérer
+    Par exemple, fournit toutes les combinaisons possibles entre n listes.
+    L'itération n'est pas récursive : le nombre d'objets combinés n'est pas limité par la pile d'appels.'''
+    def __init__(self, *objects: Iterable, right_to_left: bool = True, reuse_buffer: bool = False) -> None:
+        '''right_to_left : le dernier objet varie le plus vite, sinon le premier
+        reuse_buffer : chaque combinaison est retournée dans la même liste, mise à jour sur place,
+        au lieu d'une nouvelle liste. La combinaison doit alors être exploitée avant l'itération suivante.'''
+        # Les objets à itérer, dans l'ordre de variation : le premier varie le plus vite
         self.__objects = objects
         self.__reverse = right_to_left
+        self.__reuse_buffer = reuse_buffer
         if self.__reverse:
-            self.__objects = list(self.__objects)
-            self.__objects.reverse()
-            self.__objects = tuple(self.__objects)
+            self.__objects = tuple(reversed(self.__objects))
 
     def __iter__(self) -> Self:
         self.__iterators = [ iter(obj) for obj in self.__objects ]
-        self.__iter_index = 0
         self.__last_result = None
+        self.__exhausted = False
+        # Position de chaque objet dans la combinaison retournée
+        size = len(self.__objects)
+        self.__positions = [ size - 1 - index for index in range(size) ] if self.__reverse else list(range(size))
         return self
-    
+
     def __next__(self) -> list[Any]:
-        return self.__next_result()
+        # Une fois épuisé, l'itérateur le reste : on ne repart pas des itérateurs réinitialisés
+        if self.__exhausted:
+            raise StopIteration
+        try:
+            return self.__next_result()
+        except StopIteration:
+            self.__exhausted = True
+            raise
 
     def __next_result(self) -> list[Any]:
         # Si on n'a pas encore donné de résultat, il est temps d'initialiser tous les itérateurs
         if self.__last_result is None:
-            self.__last_result = [ next(i) for i in self.__iterators ]
+            self.__last_result = [ None ] * len(self.__iterators)
+            for index, iterator in enumerate(self.__iterators):
+                self.__last_result[self.__positions[index]] = next(iterator)
+        elif not self.__iterators:
+            # Sans objet, l'unique combinaison (vide) a déjà été donnée
+            raise StopIteration
         else:
-            # On essaie d'itérer l'itérateur en cours...
-            try:
-                self.__last_result[self.__iter_index] = next(self.__iterators[self.__iter_index])
-                self.__iter_index = 0
-            # ... et si c'est impossible...
-            except StopIteration:
-                # ... soit on est à la dernière itération du dernier itérateur, auquel cas on arrête les itérations...
-                if self.__iter_index == len(self.__iterators) - 1:
-                    raise StopIteration
-                # ... soit on passe à l'itérateur suivant, en prenant soin de réinitialiser l'itérateur en cours
-                else:
-                    self.__iterators[self.__iter_index] = iter(self.__objects[self.__iter_index])
-                    self.__last_result[self.__iter_index] = next(self.__iterators[self.__iter_index])
-                    self.__iter_index += 1
-                    self.__next_result()
-        # On a un résultat, on en retourne une copie dans l'ordre souhaité
-        output = self.__last_result.copy()
-        if self.__reverse:
-            output.reverse()
-        return output
+            # On fait avancer l'itérateur le plus rapide ; à chaque itérateur épuisé,
+            # on le réinitialise et on fait avancer le suivant, comme un compteur kilométrique
+            index = 0
+            while True:
+                try:
+                    self.__last_result[self.__positions[index]] = next(self.__iterators[index])
+                    break
+                except StopIteration:
+                    # ... soit on est à la dernière itération du dernier itérateur, auquel cas on arrête les itérations...
+                    if index == len(self.__iterators) - 1:
+                        raise StopIteration
+                    # ... soit on passe à l'itérateur suivant, en prenant soin de réinitialiser l'itérateur en cours
+                    self.__iterators[index] = iter(self.__objects[index])
+                    self.__last_result[self.__positions[index]] = next(self.__iterators[index])
+                    index += 1
+        # On a un résultat, on le retourne tel quel ou on en retourne une copie
+        if self.__reuse_buffer:
+            return self.__last_result
+        return self.__last_result.copy()
+
+    def blocks(self, block_size: int = 4096) -> Iterator[list[tuple]]:
+        '''Itère les combinaisons par blocs de block_size tuples, dans le même ordre que l'itération.
+        La liste du bloc est réutilisée d'un bloc à l'autre.
+        Si tous les objets sont des séquences (list, tuple, range), les combinaisons sont produites par itertools.product.'''
+        objects = self.__objects[::-1] if self.__reverse else self.__objects
+        if all(isinstance(obj, (list, tuple, range)) for obj in objects):
+            if self.__reverse:
+                combinations = itertools.product(*objects)
+            else:
+                combinations = map(lambda combination: combination[::-1], itertools.product(*objects[::-1]))
+        else:
+            combinations = map(tuple, CompositeIterator(*objects, right_to_left=self.__reverse, reuse_buffer=True))
+        block = [ ]
+        while True:
+            block[:] = itertools.islice(combinations, block_size)
+            if not block:
+                return
+            yield block
@@ -1,7 +1,17 @@
+from bisect import bisect_right
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
 import csv
+import datetime
+import itertools
+import json
+import math
 import operator
+import os
+import random
 import re
-from typing import Self, Hashable, Iterable, Callable, Any, NamedTuple, TextIO
+import sys
+from typing import Self, Hashable, Iterable, Iterator, Callable, Any, NamedTuple, TextIO
 
 '''
 Dataset
@@ -14,6 +24,45 @@ Terminologie :
 - expression : une expression est définie à un instant et évaluée ultérieurement durant l'exécution
 '''
 
+def categorical(value: str) -> str:
+    '''Type catégoriel : les valeurs identiques partagent une seule instance de chaîne (interning).
+    Les comparaisons d'égalité entre valeurs d'un même champ catégoriel se réduisent à une comparaison d'identité'''
+    return sys.intern(value)
+
+def _conforms(value: Any, field_type: type | Callable) -> bool:
+    '''True si value est du type field_type d'un schéma, ou nulle'''
+    if value is None:
+        return True
+    if field_type is categorical:
+        return type(value) is str
+    return type(value) is field_type
+
+def _boolean(value: str) -> bool:
+    '''Conversion d'une chaîne en booléen'''
+    lowered = value.strip().lower()
+    if lowered in ('true', 'yes', '1'):
+        return True
+    if lowered in ('false', 'no', '0'):
+        return False
+    raise ValueError(f'Invalid boolean value {value!r}')
+
+# Fonctions de conversion des types de schéma : les chaînes du fichier CSV sont converties une seule fois au chargement
+_schema_converters: dict[type | Callable, Callable] = {
+    str: str,
+    int: int,
+    float: float,
+    bool: _boolean,
+    datetime.date: datetime.date.fromisoformat,
+    datetime.datetime: datetime.datetime.fromisoformat,
+    categorical: categorical,
+}
+
+# Numéros de version des datasets : uniques pour l'ensemble des datasets, ils changent à chaque modification
+_versions = itertools.count()
+
+# Ordre d'essai des types lors de l'inférence, du plus restrictif au plus général
+_inferred_types: tuple = (int, float, datetime.date, datetime.datetime)
+
 class ExpressionCatcher:
     '''Collection de fonctions de surcharge des opérateurs:
     - de comparaison
@@ -88,7 +137,17 @@ class ExpressionCatcher:
     
     # Fonctions ne pouvant pas être surchargées
     def in_(self, items: Iterable) -> 'Expression':
-        return Expression(operator.contains, items, self, _expression_string_=f'({self._objstring(self)} IN {self._objstring(items)})')
+        '''Appartenance à une liste de valeurs, hachées une fois pour toutes, ou au résultat d'une requête SELECT
+        à une seule colonne, exécutée une fois par exécution de la requête qui contient l'expression'''
+        if hasattr(items, 'stream'):
+            if not hasattr(items, '_terms'):
+                # Requête préparée : ses paramètres ne seraient pas liés par la requête qui contient l'expression
+                raise TypeError(f'IN requires a SELECT query, not {type(items).__name__}: pass the query itself rather than its prepared form')
+            return Expression(operator.contains, _InList(query=items), self, _expression_string_=f'({self._objstring(self)} IN ({items}))')
+        string = f'({self._objstring(self)} IN {self._objstring(items)})'
+        if isinstance(items, (list, tuple, set)) and not any(isinstance(item, ExpressionCatcher) for item in items):
+            items = _InList(items)
+        return Expression(operator.contains, items, self, _expression_string_=string)
     def is_(self, objtype: type) -> 'Expression':
         return Expression(operator.is_, self, objtype, _expression_string_=f'({self._objstring(self)} IS {self._objstring(objtype)})')
     def func(self, operator: Callable, *args, **kwargs) -> 'Expression':
@@ -142,15 +201,17 @@ class Expression(ExpressionCatcher):
     @property
     def value(self) -> Any:
         '''Retourne la valeur de l'expression'''
+        if self.__operator in (operator.and_, operator.or_) and len(self.__args) == 2 and not self.__kwargs:
+            return self.__logical_value()
         args = [ ]
         for arg in self.__args:
-            if isinstance(arg, (__class__, DatasetField)):
+            if isinstance(arg, (__class__, DatasetField, Parameter)):
                 args.append(arg.value)
             else:
                 args.append(arg)
         kwargs = { }
         for key, value in self.__kwargs.items():
-            if isinstance(value, (__class__, DatasetField)):
+            if isinstance(value, (__class__, DatasetField, Parameter)):
                 kwargs.update({ key: value.value })
             else:
                 kwargs.update({ key: value })
@@ -160,6 +221,21 @@ class Expression(ExpressionCatcher):
             # print(f'Caught Exception {E}')
             return None
     
+    def __logical_value(self) -> Any:
+        '''Evaluation court-circuitée de AND et OR : le second terme n'est pas évalué
+        si le premier suffit à déterminer le résultat (False pour AND, True pour OR, None en cas d'erreur)'''
+        left, right = self.__args
+        if isinstance(left, (__class__, DatasetField, Parameter)):
+            left = left.value
+        if left is None or (left is False and self.__operator is operator.and_) or (left is True and self.__operator is operator.or_):
+            return left
+        if isinstance(right, (__class__, DatasetField, Parameter)):
+            right = right.value
+        try:
+            return self.__operator(left, right)
+        except Exception as E:
+            return None
+
     @property
     def match(self) -> bool:
         '''Retourne True si la valeur de l'expression est exactement True.
@@ -186,6 +262,17 @@ class Expression(ExpressionCatcher):
         if self.__alias:
             return self.__alias
         return self.__name
+
+    # Accès à la structure de l'expression, utilisé par la planification des requêtes
+    @property
+    def operator(self) -> Callable:
+        return self.__operator
+    @property
+    def args(self) -> tuple:
+        return self.__args
+    @property
+    def kwargs(self) -> dict:
+        return self.__kwargs
     
     def cast_as(self, cast_type: type) -> 'Expression':
         '''Transtypage de l'expression'''
@@ -230,12 +317,15 @@ class DatasetField(ExpressionCatcher):
         if self.__alias:
             return self.__alias
         return self.__name
+    @property
+    def dataset(self) -> 'Dataset':
+        return self.__dataset
     
     @property
     def value(self) -> Any:
         '''Retourne la valeur associée à la clé du dictionnaire courant du dataset.
         Cette clé est le nom du champ. L'élément courant est défini dans le dataset.'''
-        return self.__dataset.current_element.data.get(self.__name, None)
+        return self.__dataset._current.get(self.__name, None)
     
     @property
     def exists(self) -> Expression:
@@ -244,22 +334,199 @@ class DatasetField(ExpressionCatcher):
     
     def __exists(self) -> bool:
         '''True si le champs existe dans l'élément courant'''
-        return self.name in self.__dataset.current_element.data
+        return self.name in self.__dataset._current
     
+    def __canonical(self, value: Any) -> Any:
+        '''Constante comparée au champ : l'instance du dictionnaire si le champ est encodé'''
+        dictionary = self.__dataset.dictionary(self.__name) if isinstance(value, str) else None
+        return value if dictionary is None else dictionary.canonical(value)
+
+    # Sur un champ encodé, les chaînes comparées sont celles du dictionnaire : l'égalité est une comparaison d'identité
+    def __eq__(self, other) -> Expression:
+        return super().__eq__(self.__canonical(other))
+    def __ne__(self, other) -> Expression:
+        return super().__ne__(self.__canonical(other))
+    def in_(self, items: Iterable) -> Expression:
+        if isinstance(items, (list, tuple, set)):
+            items = type(items)(map(self.__canonical, items))
+        return super().in_(items)
+
     def cast_as(self, datatype: type) -> Expression:
-        '''Retourne l'expression de transtypage du champ de l'élément courant'''
+        '''Retourne l'expression de transtypage du champ de l'élément courant
+        Si le schéma du dataset garantit le type du champ, le transtypage n'est pas réexécuté à chaque élément'''
+        if self.__dataset.schema.get(self.__name) is datatype:
+            return Expression(_SchemaCast(self.__dataset, self.__name, datatype), self, _expression_string_=f'CAST({str(self)} AS {datatype.__name__})').set_name(self.name)
         return Expression(datatype, self, _expression_string_=f'CAST({str(self)} AS {datatype.__name__})').set_name(self.name)
     
     def as_(self, alias: Hashable) -> Self:
-        '''Définition de l'alias du champ'''
-        self.__alias = alias
-        return self
+        '''Définition de l'alias du champ.
+        Les champs étant partagés par le dataset, l'alias est posé sur une copie du champ, qui est retournée'''
+        field = DatasetField(dataset=self.__dataset, name=self.__name)
+        field.__alias = alias
+        return field
 
     def like(self, regex: str, flag: re=re.NOFLAG) -> Self:
         '''Retourne une expression permettant de comparer l'élément actuel à une regex
         On peut spécifier le flag regex Python pour modifier le comportement de la regex - https://docs.python.org/3/library/re.html#flags'''
         return Expression(bool, Expression(re.match, regex, self, flag, _expression_string_=''), _expression_string_=f"{self} LIKE '{regex}' ({flag})")
     
+class Parameter(ExpressionCatcher):
+    '''Paramètre d'une requête préparée : un terme dont la valeur est fournie à chaque exécution'''
+
+    def __init__(self, name: str) -> None:
+        self.__name: str = name
+        self.__value: Any = None
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__} :{self.__name}>'
+
+    def __str__(self) -> str:
+        return f':{self.__name}'
+
+    @property
+    def name(self) -> str:
+        return self.__name
+    @property
+    def alias(self) -> str:
+        return self.__name
+
+    @property
+    def value(self) -> Any:
+        '''Valeur liée lors de la dernière exécution'''
+        return self.__value
+
+    def bind(self, value: Any) -> None:
+        '''Lie une valeur au paramètre'''
+        self.__value = value
+
+class _InList:
+    '''Valeurs d'une expression IN : les valeurs hachables sont cherchées dans un frozenset, les autres une à une.
+    Les valeurs d'une sous-requête (query) sont chargées par load à chaque exécution de la requête qui la contient.'''
+
+    def __init__(self, items: Iterable=( ), query: Any=None) -> None:
+        self.query = query
+        self.load(items)
+
+    def load(self, items: Iterable) -> None:
+        '''Remplace les valeurs'''
+        self.items: tuple = tuple(items)
+        hashed = set()
+        unhashable = [ ]
+        for item in self.items:
+            try:
+                hashed.add(item)
+            except TypeError:
+                unhashable.append(item)
+        self.__hashed: frozenset = frozenset(hashed)
+        self.__unhashable: tuple = tuple(unhashable)
+
+    def __contains__(self, value: Any) -> bool:
+        try:
+            if value in self.__hashed:
+                return True
+        except TypeError:
+            # Valeur non hachable : recherche dans toutes les valeurs
+            return value in self.items
+        return value in self.__unhashable if self.__unhashable else False
+
+    def __iter__(self) -> Iterator:
+        return iter(self.items)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __str__(self) -> str:
+        if self.query is not None:
+            return f'({self.query})'
+        return str(list(self.items))
+
+class _Dictionary:
+    '''Dictionnaire d'un champ encodé : le code d'une chaîne est sa position dans values,
+    et les éléments du dataset référencent l'instance de values'''
+
+    def __init__(self) -> None:
+        self.values: list[str] = [ ]
+        self.codes: dict[str, int] = { }
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __contains__(self, value: Any) -> bool:
+        return isinstance(value, str) and value in self.codes
+
+    def encode(self, value: str) -> str:
+        '''Retourne l'instance de value du dictionnaire, en l'y ajoutant si nécessaire.
+        L'instance est celle du type categorical : la chaîne internée'''
+        code = self.codes.get(value, None)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(categorical(value))
+        return self.values[code]
+
+    def canonical(self, value: Any) -> Any:
+        '''Retourne l'instance de value du dictionnaire si elle y figure, sinon value'''
+        if isinstance(value, str):
+            code = self.codes.get(value, None)
+            if code is not None:
+                return self.values[code]
+        return value
+
+def _projection(fields: Iterable[Hashable | DatasetField] | None) -> list[Hashable] | None:
+    '''Noms des champs à conserver, None pour tous les champs'''
+    if fields is None:
+        return None
+    return [ field.name if isinstance(field, DatasetField) else field for field in fields ]
+
+def _parse_jsonl(lines: Iterable[str | bytes], fields: list[Hashable] | None) -> list[dict]:
+    '''Décode des lignes JSON, en ne gardant que les champs fields s'ils sont fournis. Les lignes vides sont ignorées'''
+    elements = [ ]
+    for line in lines:
+        if not line.strip():
+            continue
+        element = json.loads(line)
+        if fields is not None:
+            element = { field: element[field] for field in fields if field in element }
+        elements.append(element)
+    return elements
+
+def _read_jsonl_range(path: str, start: int, end: int, fields: list[Hashable] | None) -> list[dict]:
+    '''Lit les lignes d'un fichier JSON Lines qui commencent entre les positions start (incluse) et end (exclue)'''
+    with open(path, 'rb') as file:
+        if start > 0:
+            # La ligne en cours à start appartient à la tranche précédente
+            file.seek(start - 1)
+            file.readline()
+        position = file.tell()
+        lines = [ ]
+        while position < end:
+            line = file.readline()
+            if not line:
+                break
+            position += len(line)
+            lines.append(line)
+    return _parse_jsonl(lines, fields)
+
+class _SchemaCast:
+    '''Transtypage d'un champ dont le schéma du dataset garantit le type : la valeur est retournée telle quelle
+    tant que le schéma le garantit, à l'exécution. Une écriture qui ne respecte pas le type le retire du schéma'''
+
+    def __init__(self, dataset: 'Dataset', name: Hashable, datatype: type) -> None:
+        self.dataset = dataset
+        self.name = name
+        self.datatype = datatype
+
+    def __call__(self, value: Any) -> Any:
+        if self.dataset.schema.get(self.name) is self.datatype:
+            return value
+        return self.datatype(value)
+
+    def __eq__(self, other: Any) -> bool:
+        return (isinstance(other, _SchemaCast) and other.dataset is self.dataset
+                and other.name == self.name and other.datatype is self.datatype)
+
+    def __hash__(self) -> int:
+        return hash((id(self.dataset), self.name, self.datatype))
+
 class DatasetElement(NamedTuple):
     '''Elément d'un dataset
     - index : index de l'élément dans la liste de dictionnaires constituant le dataset
@@ -283,16 +550,64 @@ class DatasetElement(NamedTuple):
         if field.name in self.data:
             del self.data[field.name]
 
+class _ChainedList(Sequence):
+    '''Séquence en lecture seule formée de listes mises bout à bout, sans copie.
+    L'accès par index passe par la table des sommes cumulées des longueurs des listes'''
+
+    def __init__(self, parts: list[list[dict]]) -> None:
+        self.parts: list[list[dict]] = [ part for part in parts if part ]
+        # offsets[n] : index du premier élément de la liste n
+        self.__offsets: list[int] = list(itertools.accumulate((len(part) for part in self.parts), initial=0))
+
+    def __len__(self) -> int:
+        return self.__offsets[-1]
+
+    def __getitem__(self, index: int | slice) -> dict | list[dict]:
+        if isinstance(index, slice):
+            return [ self[position] for position in range(*index.indices(len(self))) ]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f'{__class__.__name__} index out of range')
+        part = bisect_right(self.__offsets, index) - 1
+        return self.parts[part][index - self.__offsets[part]]
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.parts)
+
 class Dataset:
-    '''Classe de gestion d'une liste de dictionnaires'''
+    '''Classe de gestion d'une liste de dictionnaires.
+    Les champs sont accessibles par dataset.champ ou dataset['champ'] ; un champ qui porte le nom d'une méthode
+    ou d'une propriété publique du dataset (version, schema, sample, scan, ...) n'est accessible que par dataset['champ']'''
 
-    def __init__(self, dataset: list[dict], name=None) -> None:
+    def __init__(self, dataset: list[dict], name=None, schema: dict[Hashable, type]=None) -> None:
         '''dataset : liste de dictionnaires
-        name: nom du dataset'''
+        name: nom du dataset
+        schema: types garantis des champs du dataset, sous la forme { champ: type }'''
         self.__dataset = dataset
         self.__name = name
-        # Elément en cours
-        self.__current_element: DatasetElement = None
+        self.__schema = schema or { }
+        # Elément en cours : son index, et le dictionnaire correspondant, lu directement par les champs
+        self.__index: int = None
+        self._current: dict = None
+        # Champs du dataset, créés au premier accès puis réutilisés
+        self.__fields: dict[Hashable, DatasetField] = { }
+        # Résumés min/max par bloc (zone maps) des champs choisis, recalculés au besoin après modification
+        self.__zone_fields: tuple = ( )
+        self.__block_size: int = 4096
+        self.__zones: dict[Hashable, list] = None
+        # Dictionnaires des champs encodés, recalculés au besoin après modification
+        self.__encoded_fields: tuple = ( )
+        self.__dictionaries: dict[Hashable, _Dictionary] = None
+        # Index des éléments ajoutés ou modifiés via writable_element depuis le dernier touch, encodés par touch ;
+        # None si aucune écriture n'est connue : touch signale alors une modification quelconque
+        self.__written: set[int] = None
+        # Version du dataset, modifiée par touch
+        self.__version: int = next(_versions)
+        # Copie sur écriture : la liste des éléments est-elle partagée avec un instantané,
+        # et quels éléments (identifiants des dictionnaires) ont déjà été copiés depuis le dernier instantané
+        self.__shared: bool = False
+        self.__owned: set[int] = None
     
     def __len__(self) -> int:
         return len(self.__dataset)
@@ -320,58 +635,402 @@ class Dataset:
 
         return f'`{self.__class__.__name__}_{auto_name}`'
     
-    # Accès aux DatasetField via notation objet ou dictionnaire
+    # Accès aux DatasetField via notation objet ou dictionnaire : un même champ est retourné à chaque accès
     def __getattr__(self, field: Hashable) -> DatasetField:
-        return DatasetField(dataset=self, name=field)
+        if field == '_Dataset__fields':
+            # Dataset pas encore initialisé : pas de récursion
+            raise AttributeError(field)
+        return self[field]
     def __getitem__(self, field: Hashable) -> DatasetField:
-        return DatasetField(dataset=self, name=field)
+        dataset_field = self.__fields.get(field, None)
+        if dataset_field is None:
+            dataset_field = self.__fields[field] = DatasetField(dataset=self, name=field)
+        return dataset_field
     
     # Itération : retourne un DatasetElement composé de l'index et du dictionnaire correspondant
     def __iter__(self) -> Self:
-        self.__current_element = DatasetElement(index=-1, dataset=self.__dataset)
+        self.__index = -1
+        self._current = None
         return self
     def __next__(self) -> DatasetElement:
-        if self.__current_element.index < len(self.__dataset) - 1:
-            self.__current_element = DatasetElement(index=self.__current_element.index + 1, dataset=self.__dataset)
-            return self.__current_element
+        if self.__index < len(self.__dataset) - 1:
+            self.move_to(self.__index + 1)
+            return self.current_element
         raise StopIteration
+
+    def cursor(self, indexes: Iterable[int]=None) -> Iterator[int]:
+        '''Itération de bas niveau : positionne l'élément courant sur chacun des index fournis (par défaut, tous les éléments)
+        et retourne l'index. Aucun objet n'est créé par élément : le dictionnaire courant est dans _current'''
+        dataset = self.__dataset
+        if indexes is None:
+            indexes = range(len(dataset))
+        for index in indexes:
+            self.__index = index
+            self._current = dataset[index]
+            yield index
     
     def __iadd__(self, other: 'Dataset') -> Self:
         if not isinstance(other, Dataset):
             raise TypeError(f'Can only add another {__class__.__name__}')
-        self.__dataset += other.raw_dataset
+        self.prepare_write()
+        start = len(self.__dataset)
+        self.__dataset += other.__dataset
+        self.__record(range(start, len(self.__dataset)))
+        self.touch()
         return self
 
     def __add__(self, other: 'Dataset') -> Self:
+        '''Retourne la concaténation paresseuse des deux datasets, sans copier leurs éléments.
+        Les listes d'éléments sont partagées : une modification ultérieure de la structure d'un des datasets
+        (ajout, suppression d'éléments) le conduit à copier sa liste, la concaténation n'en voit rien.'''
         if not isinstance(other, Dataset):
             raise TypeError(f'Can only add another {__class__.__name__}')
-        joined_dataset = self.__dataset.copy()
-        joined_dataset += other.raw_dataset
-        return __class__(joined_dataset)
+        return __class__(_ChainedList(self.__parts() + other.__parts()))
+
+    def __parts(self) -> list[list[dict]]:
+        '''Retourne les listes d'éléments qui composent le dataset, désormais partagées'''
+        if isinstance(self.__dataset, _ChainedList):
+            return self.__dataset.parts
+        self.__shared = True
+        return [ self.__dataset ]
+
+    def materialize(self) -> Self:
+        '''Remplace une concaténation paresseuse par la liste de ses éléments'''
+        if isinstance(self.__dataset, _ChainedList):
+            self.__dataset = list(self.__dataset)
+            self.__shared = False
+        return self
+
+    def _replace(self, elements: list[dict]) -> None:
+        '''Remplace les éléments du dataset, qui garde son nom, son schéma et ses champs'''
+        self.__dataset = elements
+        self.__shared = False
+        self.__owned = None
+        self.__written = None
+        self.touch()
+
+    def touch(self) -> None:
+        '''Signale une modification des éléments du dataset.
+        A appeler après toute modification faite en dehors des requêtes, par exemple via raw_dataset'''
+        self.__version = next(_versions)
+        # Les résumés par bloc seront recalculés au prochain parcours
+        self.__zones = None
+        # Les dictionnaires et le schéma sont mis à jour d'après les seuls éléments écrits par les requêtes ;
+        # après une modification quelconque, les dictionnaires seront recalculés au prochain accès,
+        # et le schéma ne garantit plus aucun type
+        written, self.__written = self.__written, None
+        if written is None:
+            self.__dictionaries = None
+            self.__schema = { }
+        else:
+            self.__check_written(written)
+
+    def __record(self, indexes: Iterable[int]) -> None:
+        '''Note les index des éléments écrits, à vérifier par touch'''
+        if self.__encoded_fields or self.__schema:
+            if self.__written is None:
+                self.__written = set()
+            self.__written.update(indexes)
+
+    def __check_written(self, written: Iterable[int]) -> None:
+        '''Encode les éléments écrits, et retire du schéma les types qu'ils ne respectent plus'''
+        elements = [ self.__dataset[index] for index in written ]
+        if self.__dictionaries is not None:
+            self.__encode_elements(elements)
+        if self.__schema:
+            schema = { field: field_type for field, field_type in self.__schema.items()
+                        if all(_conforms(element.get(field, None), field_type) for element in elements) }
+            # Le schéma peut être partagé avec un instantané : il est remplacé, pas modifié
+            if len(schema) != len(self.__schema):
+                self.__schema = schema
+
+    @property
+    def version(self) -> int:
+        '''Version du dataset : elle change à chaque modification signalée par touch'''
+        return self.__version
+
+    def zone_map(self, *fields: Hashable | DatasetField, block_size: int=4096) -> Self:
+        '''Maintient les valeurs min/max de chaque bloc de block_size éléments pour les champs fields.
+        Les parcours des requêtes ignorent les blocs qui ne peuvent pas remplir leurs comparaisons à une constante.
+        Sans champ, désactive les résumés.'''
+        self.__zone_fields = tuple(field.name if isinstance(field, DatasetField) else field for field in fields)
+        self.__block_size = block_size
+        self.__zones = None
+        return self
+
+    def dictionary_encode(self, *fields: Hashable | DatasetField) -> Self:
+        '''Encode par dictionnaire les champs fields, aux valeurs textuelles répétitives :
+        chaque chaîne distincte reçoit un code, et tous les éléments partagent l'instance unique de la chaîne.
+        Les comparaisons d'égalité et IN aux constantes se réduisent alors à une comparaison d'identité,
+        le hachage (regroupements, jointures) à la lecture d'une empreinte déjà calculée, et une égalité
+        à une chaîne absente du dictionnaire n'a aucun élément à parcourir. Sans champ, désactive l'encodage.'''
+        self.__encoded_fields = tuple(field.name if isinstance(field, DatasetField) else field for field in fields)
+        self.__dictionaries = None
+        self.__encode()
+        return self
+
+    def __encode(self) -> dict[Hashable, '_Dictionary']:
+        '''Retourne les dictionnaires des champs encodés, calculés s'ils ne sont pas à jour :
+        les valeurs des éléments sont remplacées par l'instance unique de chaque chaîne'''
+        if self.__dictionaries is None:
+            self.__dictionaries = { field: _Dictionary() for field in self.__encoded_fields }
+            self.__encode_elements(self.__dataset)
+        return self.__dictionaries
+
+    def __encode_elements(self, elements: Iterable[dict]) -> None:
+        '''Ajoute aux dictionnaires les valeurs des champs encodés des éléments,
+        qui référencent désormais l'instance unique de chaque chaîne'''
+        for element in elements:
+            for field, dictionary in self.__dictionaries.items():
+                value = element.get(field, None)
+                if isinstance(value, str):
+                    encoded = dictionary.encode(value)
+                    # Les éléments en lecture seule (mémoire partagée) gardent leur valeur
+                    if encoded is not value and isinstance(element, dict):
+                        element[field] = encoded
+
+    def dictionary(self, field: Hashable | DatasetField) -> '_Dictionary | None':
+        '''Dictionnaire du champ encodé field, None si le champ n'est pas encodé'''
+        field = field.name if isinstance(field, DatasetField) else field
+        if field not in self.__encoded_fields:
+            return None
+        return self.__encode()[field]
+
+    def __zone_maps(self) -> dict[Hashable, list]:
+        '''Retourne les résumés par bloc, calculés s'ils ne sont pas à jour.
+        Un résumé vaut (min, max), ( ) si le bloc n'a aucune valeur, None si ses valeurs ne sont pas comparables'''
+        if self.__zones is None:
+            self.__zones = { }
+            for field in self.__zone_fields:
+                zones = [ ]
+                for start in range(0, len(self.__dataset), self.__block_size):
+                    values = [ ]
+                    for index in range(start, min(start + self.__block_size, len(self.__dataset))):
+                        value = self.__dataset[index].get(field, None)
+                        # None et NaN ne remplissent aucune comparaison
+                        if value is not None and value == value:
+                            values.append(value)
+                    try:
+                        zones.append((min(values), max(values)) if values else ( ))
+                    except TypeError:
+                        zones.append(None)
+                self.__zones[field] = zones
+        return self.__zones
+
+    @staticmethod
+    def __zone_may_match(zone: tuple | None, comparison: Callable, constant: Any) -> bool:
+        '''False si aucune valeur du bloc résumé par zone ne peut remplir la comparaison à constant'''
+        if zone is None:
+            return True
+        if not zone:
+            return False
+        low, high = zone
+        try:
+            if comparison is operator.eq:
+                return low <= constant <= high
+            if comparison is operator.lt:
+                return low < constant
+            if comparison is operator.le:
+                return low <= constant
+            if comparison is operator.gt:
+                return high > constant
+            if comparison is operator.ge:
+                return high >= constant
+        except TypeError:
+            pass
+        return True
+
+    def scan(self, predicates: Iterable[tuple[Hashable, Callable, Any]]=( ), clause: Any=None) -> Iterable[int]:
+        '''Retourne les index des éléments susceptibles de remplir toutes les comparaisons predicates,
+        de la forme (champ, opérateur, constante). Seuls les blocs résumés sont exclus, les éléments retournés
+        doivent toujours être évalués.
+        clause, la clause WHERE complète dont sont tirées les comparaisons, est exploitée par les datasets externes'''
+        predicates = list(predicates)
+        # Un champ encodé ne peut être égal à une chaîne absente de son dictionnaire
+        for field, comparison, constant in predicates:
+            if comparison is operator.eq and isinstance(constant, str) and field in self.__encoded_fields:
+                if constant not in self.dictionary(field):
+                    return range(0)
+        predicates = [ (field, comparison, constant) for field, comparison, constant in predicates
+                        if field in self.__zone_fields and constant is not None ]
+        if not predicates:
+            return range(len(self.__dataset))
+        zones = self.__zone_maps()
+        blocks = [ ]
+        for block, start in enumerate(range(0, len(self.__dataset), self.__block_size)):
+            if all(self.__zone_may_match(zones[field][block], comparison, constant) for field, comparison, constant in predicates):
+                blocks.append(range(start, min(start + self.__block_size, len(self.__dataset))))
+        return itertools.chain.from_iterable(blocks)
+
+    # Exécution des requêtes de modification par le dataset lui-même, sans parcourir ses éléments.
+    # Un dataset externe (base de données) les redéfinit ; retourner False fait exécuter la requête élément par élément
+    def push_update(self, assignments: list[tuple[DatasetField, Any]], clause: Any=None) -> bool:
+        '''Affecte à chaque champ la valeur de son terme dans les éléments remplissant clause'''
+        return False
+    def push_delete(self, clause: Any=None) -> bool:
+        '''Supprime les éléments remplissant clause'''
+        return False
+    def push_drop(self, fields: Iterable[DatasetField], clause: Any=None) -> bool:
+        '''Supprime les champs fields des éléments remplissant clause'''
+        return False
+
+    def snapshot(self) -> 'DatasetSnapshot':
+        '''Retourne une vue en lecture seule, figée, du dataset, sans copier ses éléments.
+        Les modifications ultérieures du dataset copient la liste et les éléments modifiés (copie sur écriture),
+        de sorte que l'instantané n'en voit aucune.'''
+        self.__shared = True
+        self.__owned = set()
+        snapshot = DatasetSnapshot(self.__dataset, name=self.__name, schema=self.__schema)
+        snapshot.__zone_fields = self.__zone_fields
+        snapshot.__block_size = self.__block_size
+        snapshot.__zones = self.__zones
+        snapshot.__encoded_fields = self.__encoded_fields
+        snapshot.__dictionaries = self.__dictionaries
+        return snapshot
+
+    def sample(self, fraction: float, seed: Hashable=None, method: str='bernoulli', block_size: int=4096) -> 'DatasetSample':
+        '''Retourne un échantillon aléatoire en lecture seule du dataset (TABLESAMPLE), sans copier ses éléments.
+        - fraction : probabilité de retenir chaque élément ('bernoulli') ou chaque bloc de block_size éléments consécutifs ('block')
+        - seed : graine du tirage, pour un échantillon reproductible
+        L'échantillonnage par blocs est plus rapide, mais moins précis si les éléments voisins se ressemblent.'''
+        if not 0 <= fraction <= 1:
+            raise ValueError(f'Sampling fraction must be between 0 and 1, got {fraction}')
+        generator = random.Random(seed)
+        elements = [ ]
+        units = [ ]
+        match method:
+            case 'bernoulli':
+                if fraction > 0:
+                    # On tire l'écart entre deux éléments retenus (loi géométrique) :
+                    # le coût est proportionnel à la taille de l'échantillon, pas à celle du dataset
+                    log_rejection = math.log(1 - fraction) if fraction < 1 else None
+                    index = -1
+                    while True:
+                        if log_rejection is None:
+                            index += 1
+                        else:
+                            index += 1 + int(math.log(1.0 - generator.random()) / log_rejection)
+                        if index >= len(self.__dataset):
+                            break
+                        elements.append(self.__dataset[index])
+                        units.append(index)
+            case 'block':
+                for block, start in enumerate(range(0, len(self.__dataset), block_size)):
+                    if generator.random() < fraction:
+                        part = self.__dataset[start:start + block_size]
+                        elements += part
+                        units += [ block ] * len(part)
+            case _:
+                raise ValueError(f'Unknown sampling method {method}')
+        # Les éléments retenus sont partagés avec l'échantillon : ils seront copiés avant toute modification
+        self.__owned = set()
+        return DatasetSample(elements, name=self.__name, schema=self.__schema, fraction=fraction, method=method, units=units)
+
+    def prepare_write(self) -> None:
+        '''A appeler avant d'ajouter ou de supprimer des éléments : copie la liste des éléments si elle est partagée'''
+        self.materialize()
+        if self.__shared:
+            self.__dataset = list(self.__dataset)
+            self.__shared = False
+
+    def writable_element(self, index: int) -> DatasetElement:
+        '''Positionne l'élément courant sur l'élément d'index index en vue de le modifier :
+        l'élément est copié s'il est partagé avec un instantané'''
+        self.prepare_write()
+        if self.__owned is not None:
+            data = self.__dataset[index]
+            if id(data) not in self.__owned:
+                data = data.copy()
+                self.__dataset[index] = data
+                self.__owned.add(id(data))
+        self.__record((index, ))
+        return self.seek(index)
+
+    def remove(self, indexes: Iterable[int]) -> None:
+        '''Supprime les éléments dont les index sont fournis'''
+        self.prepare_write()
+        # Les éléments écrits sont vérifiés avant que leurs index ne changent ;
+        # les dictionnaires peuvent garder des valeurs qui ne figurent plus dans aucun élément
+        if self.__written:
+            self.__check_written(self.__written)
+        if self.__encoded_fields or self.__schema:
+            self.__written = set()
+        for index in sorted(set(indexes), reverse=True):
+            if self.__owned is not None:
+                self.__owned.discard(id(self.__dataset[index]))
+            del self.__dataset[index]
+        self.touch()
+
+    def seek(self, index: int) -> DatasetElement:
+        '''Positionne l'élément courant sur l'élément d'index index, sans itérer'''
+        self.move_to(index)
+        return self.current_element
+
+    def move_to(self, index: int) -> dict:
+        '''Comme seek, sans créer de DatasetElement : retourne le dictionnaire de l'élément'''
+        self.__index = index
+        self._current = self.__dataset[index] if index >= 0 else None
+        return self._current
 
     @property
     def current_element(self) -> DatasetElement:
-        return self.__current_element
+        if self.__index is None:
+            return None
+        return DatasetElement(index=self.__index, dataset=self.__dataset)
     @property
     def raw_dataset(self) -> list[dict]:
-        return self.__dataset
+        '''Liste des éléments du dataset. Une concaténation paresseuse est alors matérialisée'''
+        return self.materialize().__dataset
+    @property
+    def schema(self) -> dict[Hashable, type]:
+        '''Types garantis des champs du dataset. Un type est retiré du schéma dès qu'une écriture ne le respecte pas,
+        et tous le sont après une modification hors requête signalée par touch'''
+        return self.__schema
     
     def set_name(self, name: str) -> Self:
         self.__name = name
         return self
 
-    def to_table(self, separator: str=' | ', maxwidth: int=0) -> None:
-        '''Affiche le dataset sous forme d'un tableau formaté'''
-        # On commence par trouver les noms des colonnes et la plus grande largeur de chacune
+    def to_table(self,
+                 separator: str=' | ',
+                 maxwidth: int=0,
+                 file: TextIO=None,
+                 offset: int=0,
+                 page_size: int=0,
+                 max_rows: int=0,
+                 sample_size: int=0,
+                 widths: dict[Hashable, int]=None,
+                 buffer_lines: int=1000) -> None:
+        '''Affiche le dataset sous forme d'un tableau formaté
+        file : objet fichier de sortie, sys.stdout par défaut
+        offset, page_size : n'affiche que la page de page_size éléments commençant à l'élément offset (0 : jusqu'à la fin)
+        max_rows : nombre maximum d'éléments affichés (0 : pas de limite)
+        sample_size : nombre d'éléments de la page utilisés pour estimer la largeur des colonnes (0 : tous).
+            Les noms des colonnes sont toujours lus sur toute la page ; les valeurs plus larges que l'estimation sont tronquées.
+        widths : largeurs imposées de certaines colonnes, sous la forme { colonne: largeur }
+        buffer_lines : nombre de lignes accumulées avant chaque écriture dans file
+        Le coût de l'affichage est proportionnel à la taille de la page, pas à celle du dataset.'''
+        if file is None:
+            file = sys.stdout
+        widths = widths or { }
+
+        # On détermine les éléments à afficher
+        start = min(max(offset, 0), len(self.__dataset))
+        stop = len(self.__dataset)
+        if page_size > 0:
+            stop = min(stop, start + page_size)
+        if max_rows > 0:
+            stop = min(stop, start + max_rows)
+        page = range(start, stop)
+
         def columnsize(element: Any) -> int:
             '''Retourne la longueur de str(element) ou maxwidth'''
-            size = len(str(element))
+            size = len(element if isinstance(element, str) else str(element))
             if maxwidth > 0 and size > maxwidth:
                 return maxwidth
             return size
         
-        def value_size(value: Any, size: int, justify: str='left') -> str:
-            value = str(value)
+        def value_size(value: str, size: int, justify: str='left') -> str:
             if len(value) > size:
                 value = value[:size-3] + '...'
             match justify:
@@ -385,14 +1044,24 @@ class Dataset:
         def dataline(line: str) -> str:
             return f'{separator.lstrip()}{line}{separator.rstrip()}'
 
+        # On estime la plus grande largeur de chaque colonne à partir d'un échantillon de la page...
         columns = { }
-        for element in self.__dataset:
-            # for key, value in self.current_element.data.items():
-            for key, value in element.items():
+        sample = page if sample_size <= 0 else page[:sample_size]
+        for index in sample:
+            for key, value in self.__dataset[index].items():
                 if key not in columns:
                     columns[key] = columnsize(key)
-                if len(str(value)) > columns[key]:
-                    columns[key] = columnsize(value)
+                size = columnsize(value)
+                if size > columns[key]:
+                    columns[key] = size
+        # ... les colonnes absentes de l'échantillon étant relevées sur le reste de la page...
+        for index in page[len(sample):]:
+            for key in self.__dataset[index]:
+                if key not in columns:
+                    columns[key] = columnsize(key)
+        # ... à moins qu'elle ne soit imposée
+        for column, width in widths.items():
+            columns[column] = width
 
         # On crée la ligne de séparation horizontale, elle va servir trois fois...
         table_width = sum(columns.values())
@@ -401,28 +1070,63 @@ class Dataset:
 
         horizontal_line = '-' * table_width
 
-        # On peut afficher l'en-tête...
+        # On peut préparer l'en-tête...
         header_columns = [ ]
         for column, size in columns.items():
-            header_columns.append(value_size(column, size, justify='center'))
-        print(horizontal_line)
-        print(dataline(separator.join(header_columns)))
-        print(horizontal_line)
+            header_columns.append(value_size(str(column), size, justify='center'))
+        lines = [ horizontal_line, dataline(separator.join(header_columns)), horizontal_line ]
 
-        # ... et les lignes
-        for element in self.__dataset:
+        # ... et les lignes, écrites par paquets
+        for index in page:
+            element = self.__dataset[index]
             line_chunks = [ ]
             for column, size in columns.items():
                 if column in element:
-                    if isinstance(element[column], (int, float)):
-                        value = value_size(element[column], size, justify='right')
+                    value = element[column]
+                    if isinstance(value, (int, float)):
+                        line_chunks.append(value_size(str(value), size, justify='right'))
                     else:
-                        value = value_size(element[column], size)
+                        line_chunks.append(value_size(str(value), size))
                 else:
-                    value = value_size('', size)
-                line_chunks.append(value)
-            print(dataline(separator.join(line_chunks)))
-        print(horizontal_line)
+                    line_chunks.append(' ' * size)
+            lines.append(dataline(separator.join(line_chunks)))
+            if len(lines) >= buffer_lines:
+                file.write('\n'.join(lines) + '\n')
+                lines = [ ]
+        lines.append(horizontal_line)
+        file.write('\n'.join(lines) + '\n')
+
+class DatasetSnapshot(Dataset):
+    '''Instantané en lecture seule d'un dataset, obtenu via Dataset.snapshot'''
+
+    def __iadd__(self, other: Dataset) -> Self:
+        raise TypeError(f'{__class__.__name__} is read-only')
+
+    def prepare_write(self) -> None:
+        raise TypeError(f'{__class__.__name__} is read-only')
+
+class DatasetSample(DatasetSnapshot):
+    '''Echantillon aléatoire en lecture seule d'un dataset, obtenu via Dataset.sample'''
+
+    def __init__(self, dataset: list[dict], name=None, schema: dict[Hashable, type]=None,
+                 fraction: float=1.0, method: str='bernoulli', units: list[int]=None) -> None:
+        '''fraction, method : paramètres de l'échantillonnage
+        units : unité de tirage de chaque élément, index de l'élément ou du bloc dans le dataset source'''
+        super().__init__(dataset, name=name, schema=schema)
+        self.__fraction = fraction
+        self.__method = method
+        self.__units = units if units is not None else list(range(len(dataset)))
+
+    @property
+    def fraction(self) -> float:
+        '''Probabilité d'inclusion de chaque élément du dataset source'''
+        return self.__fraction
+    @property
+    def method(self) -> str:
+        return self.__method
+    @property
+    def units(self) -> list[int]:
+        return self.__units
 
 class CSVDataset(Dataset):
     '''De quoi utiliser un fichier CSV comme Dataset'''
@@ -437,17 +1141,89 @@ class CSVDataset(Dataset):
                     restkey: str=None,
                     restval: Any=None,
                     dialect: csv.Dialect=None,
-                    *args, **kwargs) -> Self:
-        '''Initialise le dataset avec les données du fichier CSV'''
+                    *args,
+                    schema: dict[Hashable, type | Callable]=None,
+                    infer_types: bool=False,
+                    sample_size: int=100,
+                    encode: list[Hashable]=None,
+                    **kwargs) -> Self:
+        '''Initialise le dataset avec les données du fichier CSV
+        schema : types des champs, sous la forme { champ: type }
+            Types connus : str, int, float, bool, datetime.date, datetime.datetime, categorical
+            Tout autre callable est utilisé tel quel comme fonction de conversion
+        infer_types : déduit le type des champs absents du schéma à partir des sample_size premiers éléments
+        encode : champs à encoder par dictionnaire (voir Dataset.dictionary_encode), en plus des champs catégoriels
+        Les valeurs sont converties une seule fois, au chargement. Les chaînes vides des champs non textuels deviennent None.'''
         reader = csv.DictReader(csv_file_handler,
                                 fieldnames=fieldnames,
                                 restkey=restkey,
                                 restval=restval,
                                 dialect=dialect,
                                 *args, **kwargs)
-        super().__init__([ element for element in reader ])
+        elements = [ element for element in reader ]
+        declared = schema or { }
+        schema = dict(declared)
+        if infer_types:
+            for field, field_type in self.__infer_schema(elements, sample_size).items():
+                schema.setdefault(field, field_type)
+        for field, field_type in list(schema.items()):
+            schema[field] = self.__convert_field(elements, field, field_type, strict=field in declared)
+        super().__init__(elements, schema=schema)
+        encoded = list(encode or [ ])
+        encoded += [ field for field, field_type in schema.items() if field_type is categorical and field not in encoded ]
+        if encoded:
+            self.dictionary_encode(*encoded)
         return self
 
+    @staticmethod
+    def __infer_schema(elements: list[dict], sample_size: int) -> dict[Hashable, type]:
+        '''Déduit le type de chaque champ à partir d'un échantillon d'éléments'''
+        samples: dict[Hashable, list[str]] = { }
+        for element in elements[:sample_size]:
+            for key, value in element.items():
+                if isinstance(value, str) and value != '':
+                    samples.setdefault(key, [ ]).append(value)
+        schema = { }
+        for field, values in samples.items():
+            for candidate in _inferred_types:
+                try:
+                    for value in values:
+                        _schema_converters[candidate](value)
+                except ValueError:
+                    continue
+                schema[field] = candidate
+                break
+            else:
+                # Peu de valeurs distinctes : le champ est catégoriel
+                if len(set(values)) <= len(values) // 2:
+                    schema[field] = categorical
+                else:
+                    schema[field] = str
+        return schema
+
+    @staticmethod
+    def __convert_field(elements: list[dict], field: Hashable, field_type: type | Callable, strict: bool=True) -> type | Callable:
+        '''Convertit les valeurs d'un champ de tous les éléments, et retourne le type finalement retenu.
+        En mode non strict (type inféré), un échec de conversion élargit le type : int, puis float, puis str'''
+        converter = _schema_converters.get(field_type, field_type)
+        keep_empty = field_type in (str, categorical)
+        converted = [ ]
+        try:
+            for element in elements:
+                value = element.get(field, None)
+                if isinstance(value, str):
+                    value = None if value == '' and not keep_empty else converter(value)
+                converted.append(value)
+        except ValueError:
+            if strict:
+                raise ValueError(f'Field `{field}` of element #{len(converted)}: cannot convert {value!r} to {getattr(field_type, "__name__", field_type)}')
+            fallback = float if field_type is int else str
+            return __class__.__convert_field(elements, field, fallback, strict=fallback is str)
+        for element, value in zip(elements, converted):
+            if field in element:
+                element[field] = value
+        return field_type
+
     def to_file(self,
                 csv_file_handler: TextIO,
                 fields: list=None,
@@ -458,8 +1234,8 @@ class CSVDataset(Dataset):
         # Si on n'a pas de champs, c'est qu'il faut tous les champs actuels
         if fields is None:
             fieldnames = [ ]
-            for _ in self:
-                for key in self.current_element.data:
+            for _ in self.cursor():
+                for key in self._current:
                     if key not in fieldnames:
                         fieldnames.append(key)
             fields = [ self[field] for field in fieldnames ]
@@ -471,7 +1247,68 @@ class CSVDataset(Dataset):
         # ... et on l'écrit...
         writer.writeheader()
         # ... puis on écrit le reste des données
-        for _ in self:
+        for _ in self.cursor():
             output = { field.alias: field.value for field in fields }
             writer.writerow(output)
         return self
+
+class JSONLDataset(Dataset):
+    '''De quoi utiliser un fichier JSON Lines (un objet JSON par ligne) comme Dataset'''
+
+    def __init__(self, dataset: list[dict]=None, name=None):
+        '''Le dataset est vide tant qu'on n'a pas chargé les données depuis le fichier'''
+        super().__init__(dataset=dataset if dataset is not None else [ ], name=name)
+
+    def from_file(self, jsonl_file_handler: TextIO, fields: Iterable[Hashable | DatasetField]=None, chunk_size: int=4096) -> Self:
+        '''Initialise le dataset avec les éléments du fichier
+        fields : champs à conserver (projection), tous les champs par défaut'''
+        elements = [ ]
+        for chunk in self.chunks(jsonl_file_handler, fields=fields, chunk_size=chunk_size):
+            elements += chunk.raw_dataset
+        self._replace(elements)
+        return self
+
+    @classmethod
+    def chunks(cls, jsonl_file_handler: TextIO, fields: Iterable[Hashable | DatasetField]=None, chunk_size: int=4096) -> Iterator['JSONLDataset']:
+        '''Lecture paresseuse du fichier : retourne des datasets successifs d'au plus chunk_size éléments,
+        de sorte qu'un parcours du fichier ne le charge jamais entièrement en mémoire'''
+        fields = _projection(fields)
+        while True:
+            lines = list(itertools.islice(jsonl_file_handler, chunk_size))
+            if not lines:
+                return
+            yield cls(_parse_jsonl(lines, fields))
+
+    @classmethod
+    def read_parallel(cls, path: str, fields: Iterable[Hashable | DatasetField]=None, workers: int=None, name=None) -> 'JSONLDataset':
+        '''Charge le fichier path en le découpant en autant de tranches que de processus workers (par défaut, le nombre de CPU).
+        Les tranches sont coupées aux fins de ligne, et les éléments gardent l'ordre du fichier'''
+        fields = _projection(fields)
+        workers = workers or os.cpu_count() or 1
+        size = os.path.getsize(path)
+        bounds = [ size * worker // workers for worker in range(workers + 1) ]
+        if workers == 1:
+            return cls(_read_jsonl_range(path, 0, size, fields), name=name)
+        elements = [ ]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for part in executor.map(_read_jsonl_range, [ path ] * workers, bounds[:-1], bounds[1:], [ fields ] * workers):
+                elements += part
+        return cls(elements, name=name)
+
+    def to_file(self, jsonl_file_handler: TextIO, fields: list=None, buffer_lines: int=1000) -> Self:
+        '''Ecrit le dataset vers un fichier JSON Lines, par paquets de buffer_lines lignes.
+        Comme pour CSVDataset.to_file, fields peut comporter des expressions.
+        Les valeurs qui ne sont pas des types JSON sont écrites sous forme de chaîne (dates, ...)'''
+        buffer = [ ]
+        for _ in self.cursor():
+            if fields is None:
+                output = self._current
+            else:
+                output = { field.alias: field.value for field in fields }
+            buffer.append(json.dumps(output, default=str))
+            if len(buffer) >= buffer_lines:
+                jsonl_file_handler.write('\n'.join(buffer) + '\n')
+                buffer.clear()
+        if buffer:
+            jsonl_file_handler.write('\n'.join(buffer) + '\n')
+        return self
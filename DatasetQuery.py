@@ -1,11 +1,31 @@
 '''
 De quoi faire des requêtes du genre SQL sur des datasets
 '''
-from typing import NamedTuple, Self, Any
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from contextlib import ExitStack
+from operator import itemgetter
+from statistics import NormalDist
+from time import perf_counter_ns
+from typing import NamedTuple, Self, Any, Hashable, Iterator, IO
+import hashlib
+import heapq
+import itertools
+import math
+import numbers
+import operator
+import pickle
+import sys
+import tempfile
+import threading
 
 from .QuerySyntax import Syntax, SelectQuerySyntax, UpdateQuerySyntax, DeleteQuerySyntax, DropQuerySyntax
-from .Dataset import Dataset, DatasetField, Expression
+from .QuerySyntax import InsertQuerySyntax, MergeQuerySyntax
+from .Dataset import Dataset, DatasetField, DatasetSample, Expression, ExpressionCatcher, Parameter, _InList
 from .CompositeIterator import CompositeIterator
+from .BloomFilter import BloomFilter
+from .HyperLogLog import HyperLogLog
+from .TDigest import TDigest
 
 '''
 Fonctions et classes "publiques"
@@ -27,6 +47,38 @@ def alter(dataset: Dataset) -> '_AlterQuery':
     '''Initiateur d'une requête ALTER'''
     return _AlterQuery(dataset)
 
+def insert() -> '_InsertQuery':
+    '''Initiateur d'une requête INSERT'''
+    return _InsertQuery()
+
+def merge(dataset: Dataset) -> '_MergeQuery':
+    '''Initiateur d'une requête MERGE (mise à jour ou insertion selon une clé)'''
+    return _MergeQuery(dataset)
+
+def param(name: str) -> Parameter:
+    '''Paramètre d'une requête préparée (prepare), dont la valeur est fournie à chaque exécution'''
+    return Parameter(name)
+
+def enable_result_cache(max_entries: int=128, max_bytes: int=64 * 1024 ** 2) -> None:
+    '''Active le cache LRU des résultats des requêtes SELECT.
+    Une requête identique sur des datasets dont la version n'a pas changé retourne le résultat en cache.
+    Les modifications faites en dehors des requêtes doivent être signalées par Dataset.touch'''
+    global _result_cache
+    _result_cache = _ResultCache(max_entries=max_entries, max_bytes=max_bytes)
+
+def disable_result_cache() -> None:
+    '''Désactive et vide le cache des résultats des requêtes SELECT'''
+    global _result_cache
+    _result_cache = None
+
+def add_observer(observer: 'QueryObserver') -> None:
+    '''Ajoute un observateur de l'exécution de toutes les requêtes'''
+    _observers.append(observer)
+
+def remove_observer(observer: 'QueryObserver') -> None:
+    '''Retire un observateur ajouté par add_observer'''
+    _observers.remove(observer)
+
 def asc(sort_key: DatasetField | Expression) -> Expression:
     '''Inutile, permet de clarifier la syntaxe des clés de tri si utilisé'''
     return Expression(lambda x: x, sort_key, _expression_string_=f'{sort_key} ASC')
@@ -35,6 +87,44 @@ def desc(sort_key: DatasetField | Expression) -> Expression:
     '''Permet de créer une clé de tri en ordre descendant'''
     return Expression(_DescOrder, sort_key, _expression_string_=f'{sort_key} DESC')
 
+def count(term: DatasetField | Expression=None) -> '_Aggregate':
+    '''Agrégat COUNT : nombre d'éléments, ou nombre de valeurs non nulles de term'''
+    return _Aggregate('COUNT', term)
+
+def sum_(term: DatasetField | Expression) -> '_Aggregate':
+    '''Agrégat SUM : somme des valeurs non nulles de term'''
+    return _Aggregate('SUM', term)
+
+def avg(term: DatasetField | Expression) -> '_Aggregate':
+    '''Agrégat AVG : moyenne des valeurs non nulles de term'''
+    return _Aggregate('AVG', term)
+
+def approx_count_distinct(term: DatasetField | Expression, precision: int=14) -> '_SketchAggregate':
+    '''Agrégat approché du nombre de valeurs distinctes de term, en mémoire fixe (HyperLogLog)'''
+    return _SketchAggregate('APPROX_COUNT_DISTINCT', term, precision)
+
+def approx_percentile(term: DatasetField | Expression, quantile: float, compression: float=100) -> '_SketchAggregate':
+    '''Agrégat approché du quantile (entre 0 et 1) des valeurs de term, en mémoire bornée (t-digest)'''
+    if not 0 <= quantile <= 1:
+        raise ValueError(f'Quantile must be between 0 and 1, got {quantile}')
+    return _SketchAggregate('APPROX_PERCENTILE', term, quantile, compression)
+
+def row_number() -> '_Window':
+    '''Fonction de fenêtre ROW_NUMBER : rang de l'élément dans sa partition, à partir de 1'''
+    return _Window('ROW_NUMBER')
+
+def lag(term: DatasetField | Expression, offset: int=1, default: Any=None) -> '_Window':
+    '''Fonction de fenêtre LAG : valeur de term offset éléments avant l'élément dans sa partition, default à défaut'''
+    return _Window('LAG', term, offset, default)
+
+def lead(term: DatasetField | Expression, offset: int=1, default: Any=None) -> '_Window':
+    '''Fonction de fenêtre LEAD : valeur de term offset éléments après l'élément dans sa partition, default à défaut'''
+    return _Window('LEAD', term, offset, default)
+
+def running_sum(term: DatasetField | Expression) -> '_Window':
+    '''Fonction de fenêtre SUM : somme cumulée des valeurs non nulles de term, jusqu'à l'élément inclus'''
+    return _Window('SUM', term)
+
 class UpdateElement(NamedTuple):
     '''Eléments d'une requête UPDATE : champ et nouvelle valeur du champ'''
     field: DatasetField
@@ -43,6 +133,91 @@ class UpdateElement(NamedTuple):
     def __str__(self) -> str:
         return f'{self.field} = {self.value}'
 
+class Estimate(float):
+    '''Valeur d'un agrégat d'une requête approximative : la valeur exacte est à plus ou moins error de l'estimation,
+    avec la probabilité confidence'''
+    def __new__(cls, value: float, error: float=0.0, confidence: float=0.95) -> Self:
+        estimate = super().__new__(cls, value)
+        estimate.error = error
+        estimate.confidence = confidence
+        return estimate
+
+    def __getnewargs__(self) -> tuple:
+        return (float(self), self.error, self.confidence)
+
+    def __repr__(self) -> str:
+        return f'{float(self)!r} ± {self.error:.6g}'
+
+    def __str__(self) -> str:
+        return repr(self)
+
+    @property
+    def low(self) -> float:
+        return float(self) - self.error
+    @property
+    def high(self) -> float:
+        return float(self) + self.error
+
+class QueryObserver:
+    '''Observateur de l'exécution des requêtes, global (add_observer) ou propre à une requête (observe).
+    Les méthodes ne font rien : un observateur surcharge celles qui l'intéressent.
+    - fingerprint : empreinte de la requête, identique pour deux requêtes de même texte (valeurs des paramètres exclues)
+    - operator : étape de l'exécution (SCAN, jointure, FILTER, AGGREGATE, SORT...)
+    - duration : durée en nanosecondes ; celle d'une requête lue par stream inclut le temps de lecture
+    - rows_in, rows_out : nombre d'éléments en entrée et en sortie de l'étape, dont le rapport donne la démultiplication d'une jointure
+    - counters : compteurs de la requête (rows_scanned, rows_joined, rows_returned, rows_affected, cache_hits)'''
+
+    def query_started(self, query: '_DatasetQuery', fingerprint: str) -> None:
+        pass
+
+    def query_finished(self, query: '_DatasetQuery', fingerprint: str, duration: int, counters: dict[str, int]) -> None:
+        pass
+
+    def operator_started(self, query: '_DatasetQuery', operator: str) -> None:
+        pass
+
+    def operator_finished(self, query: '_DatasetQuery', operator: str, duration: int, rows_in: int, rows_out: int) -> None:
+        pass
+
+class SlowQuery(NamedTuple):
+    '''Requête relevée par SlowQueryLog : durée en nanosecondes, empreinte, explication et compteurs'''
+    duration: int
+    fingerprint: str
+    explain: str
+    counters: dict[str, int]
+
+class SlowQueryLog(QueryObserver):
+    '''Observateur gardant les size requêtes les plus lentes, avec le texte de leur explain'''
+
+    def __init__(self, size: int=10) -> None:
+        self.size = size
+        # Tas des plus lentes : (durée, numéro d'ordre, requête), la plus rapide en tête
+        self.__heap: list[tuple[int, int, SlowQuery]] = [ ]
+        self.__sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.__heap)
+
+    def query_finished(self, query: '_DatasetQuery', fingerprint: str, duration: int, counters: dict[str, int]) -> None:
+        if len(self.__heap) >= self.size and duration <= self.__heap[0][0]:
+            return
+        entry = (duration, next(self.__sequence), SlowQuery(duration, fingerprint, query.explain(pretty=True), dict(counters)))
+        if len(self.__heap) < self.size:
+            heapq.heappush(self.__heap, entry)
+        else:
+            heapq.heapreplace(self.__heap, entry)
+
+    @property
+    def entries(self) -> list[SlowQuery]:
+        '''Requêtes relevées, de la plus lente à la plus rapide'''
+        return [ entry for _, _, entry in sorted(self.__heap, reverse=True) ]
+
+    def clear(self) -> None:
+        self.__heap.clear()
+
+class ResourceLimitError(MemoryError):
+    '''Levée quand les résultats intermédiaires d'une requête dépassent les limites fixées à son exécution'''
+
 '''
 Fonctions et classes "privées"
 '''
@@ -63,38 +238,697 @@ class _DescOrder:
         return f'<{__class__.__name__}: descending sort for {self.obj}>'
 
 class _Clauses:
-    '''Classe d'évaluation d'une liste de clauses'''
+    '''Classe d'évaluation d'une liste de clauses, toutes requises.
+    Les termes reliés par AND sont évalués séparément et réordonnés au fil des évaluations :
+    les termes les moins coûteux et les plus sélectifs sont évalués en premier.
+    Pour profiter du réordonnancement, une même instance doit servir à toutes les évaluations d'une exécution.'''
+    # Nombre d'évaluations entre deux réordonnancements
+    _reorder_interval: int = 1024
+    # Le coût d'un terme est mesuré une évaluation sur _sample_interval
+    _sample_interval: int = 16
+
     def __init__(self, *clauses: Expression) -> None:
-        self.__clauses = clauses
+        self.__clauses = [ ]
+        for clause in clauses:
+            if clause:
+                conjuncts = _conjuncts(clause)
+                if all(isinstance(conjunct, Expression) for conjunct in conjuncts):
+                    self.__clauses += conjuncts
+                else:
+                    self.__clauses.append(clause)
+        self.__order = list(range(len(self.__clauses)))
+        self.__evaluations = 0
+        # Statistiques de chaque terme : évaluations, rejets, évaluations chronométrées, durée cumulée (ns)
+        self.__evaluated = [ 0 ] * len(self.__clauses)
+        self.__rejected = [ 0 ] * len(self.__clauses)
+        self.__sampled = [ 0 ] * len(self.__clauses)
+        self.__cost = [ 0 ] * len(self.__clauses)
+
+    @property
+    def clauses(self) -> list[Expression]:
+        '''Termes évalués, dans l'ordre d'évaluation actuel'''
+        return [ self.__clauses[position] for position in self.__order ]
     
     @property
     def match(self) -> bool:
         '''Retourne True si toutes les clauses sont True, sinon False'''
-        if self.__clauses:
-            for clause in self.__clauses:
-                if clause and not clause.match:
-                    return False
+        if len(self.__clauses) < 2:
+            return not self.__clauses or self.__clauses[0].match
+        self.__evaluations += 1
+        if self.__evaluations % self._reorder_interval == 0:
+            self.__reorder()
+        timed = self.__evaluations % self._sample_interval == 0
+        for position in self.__order:
+            if timed:
+                start = perf_counter_ns()
+                matched = self.__clauses[position].match
+                self.__cost[position] += perf_counter_ns() - start
+                self.__sampled[position] += 1
+            else:
+                matched = self.__clauses[position].match
+            self.__evaluated[position] += 1
+            if not matched:
+                self.__rejected[position] += 1
+                return False
         return True
 
-class _Term:
-    '''Classe d'évaluation d'un terme : champ, expression ou autre'''
-    def __init__(self, term: Any):
-        self._term = term
-    
+    def __reorder(self) -> None:
+        '''Trie les termes par coût moyen rapporté à leur taux de rejet, croissant'''
+        def rank(position: int) -> float:
+            if not self.__evaluated[position] or not self.__sampled[position]:
+                return 0.0
+            cost = self.__cost[position] / self.__sampled[position]
+            rejection = self.__rejected[position] / self.__evaluated[position]
+            return cost / max(rejection, 1e-9)
+        self.__order.sort(key=rank)
+
+def _value(term: Any) -> Any:
+    '''Evalue un terme sur les éléments courants, sans créer d'objet intermédiaire'''
+    if isinstance(term, (DatasetField, Expression, Parameter)):
+        return term.value
+    return term
+
+class _Aggregate(Expression):
+    '''Fonction d'agrégation d'une requête SELECT : COUNT, SUM ou AVG.
+    Les autres termes sélectionnés sont les clés de regroupement : le résultat comporte un élément par groupe.
+    Les valeurs sont cumulées par unité de tirage des échantillons, pour estimer la variance en mode approximatif.'''
+    def __init__(self, function: str, term: Any=None, *parameters: Any) -> None:
+        '''parameters : paramètres de la fonction, à la suite du terme agrégé'''
+        string = f'{function}({", ".join(map(str, ("*" if term is None else term, *parameters)))})'
+        super().__init__(function, *(( ) if term is None else (term, )), *parameters, _expression_string_=string)
+        self.set_name(string)
+        self.term = term
+        self.parameters = parameters
+
     @property
-    def value(self):
-        if isinstance(self._term, DatasetField):
-            return self._term.value
-        elif isinstance(self._term, Expression):
-            return self._term.value
-        else:
-            return self._term
+    def value(self) -> Any:
+        '''Un agrégat n'a de valeur que calculé par une requête SELECT, sur l'ensemble des éléments de chaque groupe'''
+        raise TypeError(f'{self} is an aggregate: it can only be computed by a SELECT query, not on the current elements')
+
+    def accumulate(self, totals: dict[Hashable, list], unit: Hashable) -> None:
+        '''Cumule la valeur de l'élément courant dans totals, de la forme { unité de tirage: [ nombre, somme ] }'''
+        value = None
+        if self.term is not None:
+            value = _value(self.term)
+            if value is None:
+                return
+        total = totals.get(unit, None)
+        if total is None:
+            total = totals[unit] = [ 0, 0 ]
+        if self.operator != 'COUNT':
+            try:
+                total[1] += value
+            except TypeError:
+                raise TypeError(f'{self}: cannot add non-numeric value {value!r}') from None
+        total[0] += 1
+
+    def result(self, totals: dict[Hashable, list], fraction: float=1.0, confidence: float=None) -> Any:
+        '''Valeur de l'agrégat d'après les cumuls totals.
+        Si confidence est fourni, les comptes et les sommes sont extrapolés d'après la probabilité d'inclusion fraction
+        des éléments (estimateur de Horvitz-Thompson) et la valeur est une Estimate'''
+        count = sum(total[0] for total in totals.values())
+        total = sum(total[1] for total in totals.values())
+        if confidence is None:
+            match self.operator:
+                case 'COUNT':
+                    return count
+                case 'SUM':
+                    return total if count else None
+                case _:
+                    return total / count if count else None
+        if not count:
+            return Estimate(0.0, 0.0, confidence) if self.operator == 'COUNT' else None
+        # Contributions de chaque unité de tirage, dont dépend la variance de l'estimation
+        match self.operator:
+            case 'COUNT':
+                value = count / fraction
+                contributions = [ total[0] for total in totals.values() ]
+            case 'SUM':
+                value = total / fraction
+                contributions = [ total[1] for total in totals.values() ]
+            case _:
+                value = total / count
+                contributions = [ (unit_total[1] - value * unit_total[0]) / (count / fraction) for unit_total in totals.values() ]
+        variance = (1 - fraction) / fraction ** 2 * sum(contribution ** 2 for contribution in contributions)
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        return Estimate(value, z * math.sqrt(variance), confidence)
+
+class _SketchAggregate(_Aggregate):
+    '''Agrégat approché calculé en une passe par un résumé de taille bornée, fusionnable (HyperLogLog, TDigest).
+    Le résumé ne tient pas compte des unités de tirage : calculé sur un échantillon, l'agrégat n'est pas extrapolé'''
+
+    def accumulate(self, totals: dict[Hashable, Any], unit: Hashable) -> None:
+        '''Ajoute la valeur de l'élément courant au résumé, stocké dans totals'''
+        value = _value(self.term)
+        if value is None:
+            return
+        # Le t-digest ne résume que des nombres : la valeur est vérifiée avant d'entrer dans son tampon
+        if self.operator != 'APPROX_COUNT_DISTINCT' and not isinstance(value, numbers.Real):
+            raise TypeError(f'{self}: cannot add non-numeric value {value!r}')
+        sketch = totals.get(None, None)
+        if sketch is None:
+            match self.operator:
+                case 'APPROX_COUNT_DISTINCT':
+                    sketch = HyperLogLog(*self.parameters)
+                case _:
+                    sketch = TDigest(*self.parameters[1:])
+            totals[None] = sketch
+        sketch.add(value)
+
+    def result(self, totals: dict[Hashable, Any], fraction: float=1.0, confidence: float=None) -> Any:
+        '''Estimation tirée du résumé'''
+        sketch = totals.get(None, None)
+        match self.operator:
+            case 'APPROX_COUNT_DISTINCT':
+                return len(sketch) if sketch is not None else 0
+            case _:
+                return sketch.quantile(self.parameters[0]) if sketch is not None else None
+
+class _Window(Expression):
+    '''Fonction de fenêtre d'une requête SELECT, définie par over.
+    Elle est calculée après le filtrage des éléments, en une passe par partition triée,
+    sans jointure de la requête avec elle-même'''
+    def __init__(self, function: str, term: Any=None, *parameters: Any,
+                 partition_by: tuple=( ), order_by: tuple=( )) -> None:
+        '''parameters : paramètres de la fonction, à la suite du terme
+        partition_by, order_by : termes de partitionnement et clés de tri de la fenêtre'''
+        arguments = ( ) if term is None else (term, *parameters)
+        string = f'{function}({", ".join(map(str, arguments))}) OVER ('
+        clauses = [ ]
+        if partition_by:
+            clauses.append(f'PARTITION BY {", ".join(map(str, partition_by))}')
+        if order_by:
+            clauses.append(f'ORDER BY {", ".join(map(str, order_by))}')
+        string += ' '.join(clauses) + ')'
+        super().__init__(function, *arguments, _expression_string_=string, partition_by=partition_by, order_by=order_by)
+        self.set_name(string)
+        self.term = term
+        self.parameters = parameters
+        self.partition_by = partition_by
+        self.order_by = order_by
+
+    def over(self, partition_by: Any=( ), order_by: Any=( )) -> '_Window':
+        '''Retourne la fonction de fenêtre partitionnée par partition_by et triée par order_by,
+        chacun étant un terme ou une liste de termes. Les clés de tri acceptent desc'''
+        if not isinstance(partition_by, (list, tuple)):
+            partition_by = (partition_by, )
+        if not isinstance(order_by, (list, tuple)):
+            order_by = (order_by, )
+        return __class__(self.operator, self.term, *self.parameters, partition_by=tuple(partition_by), order_by=tuple(order_by))
+
+    def row_values(self) -> tuple:
+        '''Retourne la clé de partition, la clé de tri et la valeur du terme de l'élément courant'''
+        return (
+            tuple(_value(term) for term in self.partition_by),
+            tuple(_value(term) for term in self.order_by),
+            _value(self.term),
+        )
+
+    def compute(self, rows: list[tuple]) -> list:
+        '''Retourne la valeur de la fonction pour chaque élément, d'après les valeurs rows retournées par row_values'''
+        partitions: dict[tuple, list[int]] = { }
+        for index, row in enumerate(rows):
+            partitions.setdefault(row[0], [ ]).append(index)
+        results = [ None ] * len(rows)
+        for indexes in partitions.values():
+            # Le tri est stable : sans clé de tri, les éléments restent dans l'ordre de la requête
+            if self.order_by:
+                indexes.sort(key=lambda index: rows[index][1])
+            match self.operator:
+                case 'ROW_NUMBER':
+                    for number, index in enumerate(indexes, start=1):
+                        results[index] = number
+                case 'LAG' | 'LEAD':
+                    offset, default = self.parameters
+                    if self.operator == 'LAG':
+                        offset = -offset
+                    for position, index in enumerate(indexes):
+                        source = position + offset
+                        results[index] = rows[indexes[source]][2] if 0 <= source < len(indexes) else default
+                case _:
+                    total = None
+                    for index in indexes:
+                        value = rows[index][2]
+                        if value is not None:
+                            total = value if total is None else total + value
+                        results[index] = total
+        return results
 
 class _JoinClause(NamedTuple):
     '''Eléments d'une clause JOIN : dataset et clause (optionnelle)'''
     dataset: Dataset
     clause: Expression = None
 
+# Opérateurs de comparaison exploitables par une jointure sur entrées triées, et leur symétrique
+_mirrored_comparisons = {
+    operator.eq: operator.eq,
+    operator.lt: operator.gt,
+    operator.le: operator.ge,
+    operator.gt: operator.lt,
+    operator.ge: operator.le,
+}
+
+_comparison_symbols = {
+    operator.eq: '=',
+    operator.lt: '<',
+    operator.le: '<=',
+    operator.gt: '>',
+    operator.ge: '>=',
+}
+
+def _conjuncts(clause: Any) -> list:
+    '''Décompose une clause en la liste de ses termes reliés par AND'''
+    if isinstance(clause, Expression) and clause.operator is operator.and_:
+        conjuncts = [ ]
+        for arg in clause.args:
+            conjuncts += _conjuncts(arg)
+        return conjuncts
+    return [ clause ]
+
+def _datasets_of(term: Any) -> list[Dataset]:
+    '''Retourne la liste des datasets référencés par un terme : champ, expression ou autre'''
+    datasets = [ ]
+    def collect(dataset: Dataset) -> None:
+        if not any(dataset is known for known in datasets):
+            datasets.append(dataset)
+    def walk(term: Any) -> None:
+        if isinstance(term, DatasetField):
+            collect(term.dataset)
+        elif isinstance(term, Expression):
+            # Cas des expressions construites sur une méthode d'un champ, par exemple EXISTS
+            owner = getattr(term.operator, '__self__', None)
+            if isinstance(owner, DatasetField):
+                collect(owner.dataset)
+            for arg in term.args:
+                walk(arg)
+            for value in term.kwargs.values():
+                walk(value)
+    walk(term)
+    return datasets
+
+def _parameters_of(term: Any) -> list[Parameter]:
+    '''Retourne la liste des paramètres d'un terme, y compris ceux de ses sous-requêtes'''
+    if isinstance(term, Parameter):
+        return [ term ]
+    parameters = [ ]
+    if isinstance(term, Expression):
+        for arg in (*term.args, *term.kwargs.values()):
+            parameters += _parameters_of(arg)
+    elif isinstance(term, (list, tuple)):
+        for item in term:
+            parameters += _parameters_of(item)
+    elif isinstance(term, _InList) and term.query is not None:
+        parameters += _parameters_of(term.query._terms())
+    return parameters
+
+def _subqueries_of(term: Any) -> list[_InList]:
+    '''Retourne la liste des valeurs de IN d'un terme provenant d'une sous-requête'''
+    if isinstance(term, _InList):
+        return [ term ] if term.query is not None else [ ]
+    subqueries = [ ]
+    if isinstance(term, Expression):
+        for arg in (*term.args, *term.kwargs.values()):
+            subqueries += _subqueries_of(arg)
+    return subqueries
+
+def _outer_datasets(query: Any) -> list[Dataset]:
+    '''Retourne les datasets référencés par les termes d'une requête SELECT sans être lus par ses FROM et JOIN :
+    ceux de la requête englobante, pour une sous-requête corrélée'''
+    if isinstance(query, _CompoundQuery):
+        return _outer_datasets(query._left) + _outer_datasets(query._right)
+    own = [ query._from ] + [ join.dataset for join in query._join ]
+    outer = [ ]
+    for term in query._terms():
+        for dataset in _datasets_of(term):
+            if not any(dataset is known for known in own + outer):
+                outer.append(dataset)
+    return outer
+
+def _references_only(term: Any, datasets: list[Dataset]) -> bool:
+    '''True si le terme ne référence que des datasets de la liste datasets'''
+    return all(any(dataset is known for known in datasets) for dataset in _datasets_of(term))
+
+def _hash_key(values: tuple) -> Hashable | None:
+    '''Clé de hachage d'une clé de jointure : None si une valeur est nulle,
+    l'empreinte des valeurs si elles ne sont pas hachables'''
+    if any(value is None for value in values):
+        return None
+    try:
+        hash(values)
+    except TypeError:
+        return _fingerprint(values)
+    return values
+
+def _scan_predicates(clause: Any, dataset: Dataset) -> list[tuple]:
+    '''Retourne les comparaisons (champ, opérateur, constante) d'un champ du dataset à une constante
+    que tout élément doit remplir pour remplir la clause'''
+    predicates = [ ]
+    for conjunct in _conjuncts(clause):
+        if not isinstance(conjunct, Expression) or conjunct.operator not in _mirrored_comparisons:
+            continue
+        if len(conjunct.args) != 2 or conjunct.kwargs:
+            continue
+        # Les paramètres sont des constantes, de leur valeur à l'exécution
+        left, right = (arg.value if isinstance(arg, Parameter) else arg for arg in conjunct.args)
+        if isinstance(left, DatasetField) and left.dataset is dataset and not isinstance(right, ExpressionCatcher):
+            predicates.append((left.name, conjunct.operator, right))
+        elif isinstance(right, DatasetField) and right.dataset is dataset and not isinstance(left, ExpressionCatcher):
+            predicates.append((right.name, _mirrored_comparisons[conjunct.operator], left))
+    return predicates
+
+def _term_key(term: Any) -> Hashable:
+    '''Identifiant d'un terme : deux champs de même nom d'un même dataset sont identiques'''
+    if isinstance(term, DatasetField):
+        return (id(term.dataset), term.name)
+    return id(term)
+
+class _JoinPlan(NamedTuple):
+    '''Stratégie d'exécution d'une clause JOIN
+    - strategy : 'nested loop', 'merge' (équi-jointure par tri-fusion) ou 'range' (jointure par intervalle sur entrée triée)
+    - right_keys : champs du dataset joint comparés aux datasets précédents
+    - left_keys : termes des datasets précédents comparés à right_keys
+    - sorted_side : côté trié d'une jointure par intervalle, 'right' (dataset joint, clé right_keys[0])
+      ou 'left' (lignes des datasets précédents, clé left_keys[0])
+    - lower, upper : bornes (opérateur, terme de l'autre côté) de la clé triée'''
+    strategy: str
+    right_keys: tuple = ( )
+    left_keys: tuple = ( )
+    lower: tuple = None
+    upper: tuple = None
+    sorted_side: str = 'right'
+
+    def __str__(self) -> str:
+        match self.strategy:
+            case 'merge':
+                keys = ', '.join(f'{right} = {left}' for right, left in zip(self.right_keys, self.left_keys))
+                return f'MERGE JOIN ({keys})'
+            case 'range':
+                key = self.right_keys[0] if self.sorted_side == 'right' else self.left_keys[0]
+                bounds = [ ]
+                for bound in (self.lower, self.upper):
+                    if bound is not None:
+                        bounds.append(f'{key} {_comparison_symbols[bound[0]]} {bound[1]}')
+                return f'RANGE JOIN ({" AND ".join(bounds)})'
+        return 'NESTED LOOP JOIN'
+
+
+def _fingerprint(term: Any) -> Hashable:
+    '''Retourne une empreinte hachable de la structure d'un terme : deux termes construits de la même façon
+    sur les mêmes datasets ont la même empreinte'''
+    if isinstance(term, DatasetField):
+        return ('field', id(term.dataset), term.name, term.alias)
+    if isinstance(term, Expression):
+        function = term.operator
+        owner = getattr(function, '__self__', None)
+        if isinstance(owner, DatasetField):
+            # Méthode d'un champ, par exemple EXISTS
+            function = (function.__func__, _fingerprint(owner))
+        return ('expression', function, tuple(map(_fingerprint, term.args)),
+                tuple((key, _fingerprint(value)) for key, value in term.kwargs.items()), term.alias)
+    if isinstance(term, Parameter):
+        return ('parameter', term.name, _fingerprint(term.value))
+    if isinstance(term, Dataset):
+        return ('dataset', id(term))
+    if isinstance(term, _InList):
+        if term.query is None:
+            return (tuple, tuple(map(_fingerprint, term.items)))
+        # Sous-requête : son texte et les versions des datasets qu'elle lit
+        if isinstance(term.query, _SelectQuery):
+            return ('subquery', term.query._cache_key())
+        return ('subquery', id(term.query), object())
+    if isinstance(term, (list, tuple, set, frozenset)):
+        return (type(term), tuple(map(_fingerprint, term)))
+    try:
+        hash(term)
+        return (type(term), term)
+    except TypeError:
+        return (type(term), repr(term))
+
+def _estimate_size(rows: list[dict]) -> int:
+    '''Estimation de la taille mémoire d'une liste de dictionnaires, en octets'''
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        for value in row.values():
+            size += sys.getsizeof(value)
+    return size
+
+class _ResultCache:
+    '''Cache LRU des résultats de requêtes, borné en nombre d'entrées et en taille estimée'''
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        self.__entries: OrderedDict[Hashable, tuple[list[dict], int]] = OrderedDict()
+        self.__max_entries = max_entries
+        self.__max_bytes = max_bytes
+        self.__bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def get(self, key: Hashable) -> list[dict] | None:
+        '''Retourne une copie du résultat en cache, None s'il est absent'''
+        if key not in self.__entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.__entries.move_to_end(key)
+        rows, _ = self.__entries[key]
+        return [ row.copy() for row in rows ]
+
+    def put(self, key: Hashable, rows: list[dict]) -> None:
+        '''Stocke une copie du résultat, en évinçant les entrées les moins récemment utilisées'''
+        size = _estimate_size(rows)
+        if size > self.__max_bytes or self.__max_entries <= 0:
+            return
+        if key in self.__entries:
+            self.__bytes -= self.__entries.pop(key)[1]
+        self.__entries[key] = ([ row.copy() for row in rows ], size)
+        self.__bytes += size
+        while len(self.__entries) > self.__max_entries or self.__bytes > self.__max_bytes:
+            _, (_, evicted_size) = self.__entries.popitem(last=False)
+            self.__bytes -= evicted_size
+
+# Cache des résultats des requêtes SELECT, désactivé par défaut
+_result_cache: _ResultCache = None
+
+# Nombre d'éléments par paquet sérialisé dans les fichiers du tri externe
+_run_chunk_size: int = 1024
+# Mémoire minimale allouée aux éléments retournés avant écriture sur disque, avec une limite de mémoire
+_min_spill_memory: int = 64 * 1024
+# Nombre de partitions écrites sur disque par une opération ensembliste qui dépasse sa mémoire
+_set_partitions: int = 16
+
+# Erreurs levées par pickle pour une valeur qui ne peut être sérialisée (verrou, fonction locale, générateur...)
+_unpicklable_errors = (pickle.PicklingError, TypeError, AttributeError)
+
+def _write_run(rows: list[dict], directory: str=None) -> IO[bytes] | None:
+    '''Ecrit une séquence d'éléments triés dans un fichier temporaire, détruit à sa fermeture.
+    Retourne None si les éléments ne peuvent être sérialisés'''
+    run = tempfile.TemporaryFile(dir=directory)
+    try:
+        for start in range(0, len(rows), _run_chunk_size):
+            pickle.dump(rows[start:start + _run_chunk_size], run, protocol=pickle.HIGHEST_PROTOCOL)
+    except _unpicklable_errors:
+        run.close()
+        return None
+    run.seek(0)
+    return run
+
+def _read_run(run: IO[bytes]) -> Iterator[dict]:
+    '''Relit paquet par paquet les éléments écrits par _write_run'''
+    while True:
+        try:
+            chunk = pickle.load(run)
+        except EOFError:
+            return
+        yield from chunk
+
+def _drop_key(rows: Iterator[dict], key: Hashable) -> Iterator[dict]:
+    '''Retire le champ key des éléments, au fil de la lecture'''
+    for row in rows:
+        del row[key]
+        yield row
+
+# Marqueurs des formes hachables des listes et des dictionnaires : ils ne peuvent figurer dans aucune valeur
+_list_marker = object()
+_dict_marker = object()
+
+def _hashable(value: Any) -> Hashable:
+    '''Forme hachable d'une valeur, égale pour des valeurs égales : les valeurs hachables sont gardées telles quelles,
+    les listes deviennent des tuples, les dictionnaires l'ensemble de leurs couples, les ensembles des frozenset'''
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        pass
+    if isinstance(value, list):
+        return (_list_marker, *map(_hashable, value))
+    if isinstance(value, tuple):
+        return tuple(map(_hashable, value))
+    if isinstance(value, dict):
+        return (_dict_marker, frozenset((key, _hashable(item)) for key, item in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    return (type(value), repr(value))
+
+def _row_key(row: dict) -> Hashable:
+    '''Clé de hachage d'un élément : ses valeurs, dans l'ordre des champs.
+    Les valeurs non hachables (listes, dictionnaires...) sont remplacées par leur forme hachable'''
+    key = tuple(row.values())
+    try:
+        hash(key)
+    except TypeError:
+        key = tuple(map(_hashable, key))
+    return key
+
+def _combine(operation: str, tagged: Iterator[tuple[int, dict]]) -> Iterator[dict]:
+    '''Opération ensembliste en une passe sur des éléments marqués par leur côté (0 à gauche, 1 à droite).
+    Pour INTERSECT et EXCEPT, tous les éléments de droite précèdent ceux de gauche.
+    Chaque élément retourné est la première occurrence de sa clé, sauf pour UNION ALL.'''
+    if operation == 'UNION ALL':
+        yield from (row for _, row in tagged)
+        return
+    right: set[Hashable] = set()
+    seen: set[Hashable] = set()
+    for side, row in tagged:
+        key = _row_key(row)
+        if side == 1 and operation != 'UNION':
+            right.add(key)
+            continue
+        if key in seen:
+            continue
+        if operation == 'INTERSECT' and key not in right:
+            continue
+        if operation == 'EXCEPT' and key in right:
+            continue
+        seen.add(key)
+        yield row
+
+def _hash_set_operation(operation: str, tagged: Iterator[tuple[int, dict]], max_memory: int=None, directory: str=None) -> Iterator[dict]:
+    '''Exécute l'opération ensembliste (voir _combine) en mémoire, ou, si les éléments dépassent max_memory octets,
+    par partitions : les éléments sont répartis sur disque selon le hachage de leur clé, et chaque partition,
+    qui contient toutes les occurrences de ses clés, est traitée en mémoire. L'ordre des éléments n'est alors plus conservé.'''
+    if max_memory is None or operation == 'UNION ALL':
+        yield from _combine(operation, tagged)
+        return
+    buffered = [ ]
+    size = 0
+    for item in tagged:
+        buffered.append(item)
+        size += _estimate_size((item[1], ))
+        if size > max_memory:
+            break
+    else:
+        yield from _combine(operation, iter(buffered))
+        return
+    partitions = [ tempfile.TemporaryFile(dir=directory) for _ in range(_set_partitions) ]
+    with ExitStack() as stack:
+        for partition in partitions:
+            stack.enter_context(partition)
+        chunks: list[list[tuple[int, dict]]] = [ [ ] for _ in partitions ]
+
+        def dump(chunk: list[tuple[int, dict]], partition: IO[bytes]) -> None:
+            try:
+                pickle.dump(chunk, partition, protocol=pickle.HIGHEST_PROTOCOL)
+            except _unpicklable_errors as error:
+                raise ResourceLimitError(f'{operation} exceeded the memory budget of {max_memory} bytes, '
+                                         f'and its rows cannot be written to disk: {error}') from None
+
+        for item in itertools.chain(buffered, tagged):
+            number = hash(_row_key(item[1])) % _set_partitions
+            chunks[number].append(item)
+            if len(chunks[number]) >= _run_chunk_size:
+                dump(chunks[number], partitions[number])
+                chunks[number].clear()
+        buffered = None
+        for partition, chunk in zip(partitions, chunks):
+            if chunk:
+                dump(chunk, partition)
+        for partition in partitions:
+            partition.seek(0)
+            yield from _combine(operation, _read_run(partition))
+
+class _NullTracer:
+    '''Suivi d'exécution sans observateur : ne fait rien.
+    Les opérateurs sont fournis en parties (mot-clé, dataset, ...), jointes en libellé seulement s'il y a des observateurs'''
+    def start(self, *operator: Any) -> int:
+        return 0
+    def finish(self, started: int, rows_in: int, rows_out: int, *operator: Any) -> None:
+        pass
+    def count(self, counter: str, rows: int) -> None:
+        pass
+    def close(self) -> None:
+        pass
+
+class _Tracer(_NullTracer):
+    '''Suivi de l'exécution d'une requête : transmet ses événements aux observateurs'''
+    def __init__(self, query: '_DatasetQuery', observers: list[QueryObserver]) -> None:
+        self.__query = query
+        self.__observers = observers
+        self.__fingerprint = query.fingerprint
+        self.counters: dict[str, int] = { }
+        for observer in observers:
+            observer.query_started(query, self.__fingerprint)
+        self.__started = perf_counter_ns()
+
+    def start(self, *operator: Any) -> int:
+        label = ' '.join(map(str, operator))
+        for observer in self.__observers:
+            observer.operator_started(self.__query, label)
+        return perf_counter_ns()
+
+    def finish(self, started: int, rows_in: int, rows_out: int, *operator: Any) -> None:
+        duration = perf_counter_ns() - started
+        label = ' '.join(map(str, operator))
+        for observer in self.__observers:
+            observer.operator_finished(self.__query, label, duration, rows_in, rows_out)
+
+    def count(self, counter: str, rows: int) -> None:
+        self.counters[counter] = self.counters.get(counter, 0) + rows
+
+    def close(self) -> None:
+        duration = perf_counter_ns() - self.__started
+        for observer in self.__observers:
+            observer.query_finished(self.__query, self.__fingerprint, duration, self.counters)
+
+_null_tracer = _NullTracer()
+
+class _Budget:
+    '''Limites d'exécution d'une requête : nombre d'éléments produits par une étape,
+    et mémoire estimée (en octets) des résultats intermédiaires retenus'''
+    def __init__(self, max_rows: int=None, max_memory: int=None) -> None:
+        self.max_rows = max_rows
+        self.max_memory = max_memory
+        # Mémoire retenue par les étapes précédentes, par exemple les combinaisons d'index des jointures
+        self.reserved: int = 0
+
+    @property
+    def available(self) -> int | None:
+        '''Mémoire disponible pour l'étape en cours, None sans limite'''
+        if self.max_memory is None:
+            return None
+        return max(self.max_memory - self.reserved, 0)
+
+    def capacity(self, size: int) -> int | float:
+        '''Nombre d'éléments de size octets qu'une étape peut produire sans dépasser les limites, math.inf sans limite'''
+        capacity = math.inf if self.max_rows is None else self.max_rows
+        if self.max_memory is not None:
+            capacity = min(capacity, max(self.max_memory - self.reserved, 0) // size)
+        return capacity
+
+    def check(self, rows: int, memory: int, *operator: Any) -> None:
+        '''Vérifie qu'une étape (operator) ayant produit rows éléments et retenant memory octets reste dans les limites'''
+        if self.max_rows is not None and rows > self.max_rows:
+            raise ResourceLimitError(f'{" ".join(map(str, operator))} produced more than {self.max_rows} rows')
+        if self.max_memory is not None and self.reserved + memory > self.max_memory:
+            raise ResourceLimitError(f'{" ".join(map(str, operator))} exceeded the memory budget of {self.max_memory} bytes')
+
+_unlimited = _Budget()
+
+# Observateurs de toutes les requêtes
+_observers: list[QueryObserver] = [ ]
+
 class _DatasetQuery:
     '''Classe de base des dataset queries
     Comporte les éléments communs à plusieurs requêtes
@@ -111,6 +945,14 @@ class _DatasetQuery:
         self._from: Dataset = None
         self._where: Expression = None
         self._syntax: Syntax = None
+        # Etat conservé d'une exécution à l'autre par une requête préparée : plans, évaluateurs de clauses
+        self._compiled: dict[Hashable, Any] = None
+        # Observateurs propres à la requête, et suivi de l'exécution en cours
+        self._observers: list[QueryObserver] = [ ]
+        self._tracer: _NullTracer = _null_tracer
+        # Exécution en cours : l'état d'exécution (suivi, limites, résultats des sous-requêtes) est porté par la requête,
+        # qui n'est donc pas réentrante. Deux exécutions simultanées, même depuis deux threads, lèvent RuntimeError
+        self._running: threading.Lock = threading.Lock()
 
     def from_(self, dataset: Dataset) -> Self:
         '''Configuration de l'expression FROM'''
@@ -124,6 +966,88 @@ class _DatasetQuery:
         self._where = clause
         return self
 
+    def _terms(self) -> list:
+        '''Termes de la requête : champs, expressions et constantes'''
+        return [ self._where ]
+
+    def observe(self, observer: QueryObserver) -> Self:
+        '''Ajoute un observateur propre à cette requête, en plus des observateurs globaux'''
+        self._observers.append(observer)
+        return self
+
+    def _statement(self) -> str:
+        '''Texte de la requête, sans les statistiques d'exécution'''
+        return self.explain(pretty=False)
+
+    @property
+    def fingerprint(self) -> str:
+        '''Empreinte du texte de la requête : les paramètres y figurent par leur nom, pas par leur valeur'''
+        return hashlib.blake2b(self._statement().encode(), digest_size=8).hexdigest()
+
+    def _trace(self) -> _NullTracer:
+        '''Démarre l'exécution et son suivi, qui ne coûte rien sans observateur'''
+        if not self._running.acquire(blocking=False):
+            raise RuntimeError(f'Query is already being executed, and cannot run twice at the same time: {self}')
+        observers = _observers + self._observers
+        self._tracer = _Tracer(self, observers) if observers else _null_tracer
+        return self._tracer
+
+    def _load_subqueries(self) -> None:
+        '''Exécute une fois les sous-requêtes des expressions IN : chaque élément est ensuite cherché
+        dans leur résultat haché (semi-jointure, ou anti-jointure sous NOT)'''
+        for term in self._terms():
+            for in_list in _subqueries_of(term):
+                outer = _outer_datasets(in_list.query)
+                if outer:
+                    raise SyntaxError(f'IN subquery references {", ".join(map(str, outer))}, which it does not read: '
+                                      'correlated subqueries are not supported')
+                started = self._tracer.start('SUBQUERY', in_list)
+                values = [ ]
+                for row in in_list.query.stream():
+                    if len(row) != 1:
+                        raise ValueError(f'IN subquery must select exactly one field, got {len(row)}')
+                    values += row.values()
+                in_list.load(values)
+                self._tracer.finish(started, len(values), len(in_list), 'SUBQUERY', in_list)
+
+    def _end_trace(self) -> None:
+        '''Termine le suivi de l'exécution, et l'exécution'''
+        try:
+            self._tracer.close()
+        finally:
+            self._tracer = _null_tracer
+            self._running.release()
+
+    def prepare(self) -> '_PreparedQuery':
+        '''Prépare la requête : sa syntaxe est vérifiée une fois pour toutes, ses plans et l'ordre d'évaluation
+        de ses clauses sont conservés d'une exécution à l'autre. Les valeurs des paramètres (param)
+        sont fournies à chaque exécution. La requête ne doit plus être modifiée.'''
+        self._syntax.check()
+        self._compiled = { }
+        return _PreparedQuery(self)
+
+    def _check(self) -> bool:
+        '''Vérifie la syntaxe de la requête, une seule fois pour une requête préparée'''
+        return self._compiled is not None or self._syntax.check()
+
+    def _clauses(self, key: Hashable, *clauses: Expression) -> _Clauses:
+        '''Retourne l'évaluateur des clauses. Une requête préparée garde le même d'une exécution à l'autre,
+        avec l'ordre d'évaluation qu'il a appris'''
+        if self._compiled is None:
+            return _Clauses(*clauses)
+        if key not in self._compiled:
+            self._compiled[key] = _Clauses(*clauses)
+        return self._compiled[key]
+
+    def _scan(self, dataset: Dataset) -> list[int]:
+        '''Retourne les index des éléments du dataset à évaluer,
+        en ignorant les blocs que les résumés min/max du dataset excluent de la clause WHERE'''
+        started = self._tracer.start('SCAN', dataset)
+        indexes = list(dataset.scan(_scan_predicates(self._where, dataset), clause=self._where))
+        self._tracer.finish(started, len(dataset), len(indexes), 'SCAN', dataset)
+        self._tracer.count('rows_scanned', len(indexes))
+        return indexes
+
     def _explain_where(self, pretty: bool=False) -> str:
         '''Retourne la chaîne explicative  de l'expression WHERE'''
         if self._where:
@@ -148,6 +1072,17 @@ class _SelectQuery(_DatasetQuery):
         self._where: Expression = None
         self._order_by: list[Expression] = [ ]
         self._limit: int = None
+        # Niveau de confiance du mode approximatif, None si la requête est exacte
+        self._confidence: float = None
+        # SELECT DISTINCT : les éléments en double sont écartés du résultat
+        self._distinct: bool = False
+        # Tri externe : mémoire allouée au tri avant écriture sur disque, None pour un tri en mémoire, et répertoire des fichiers
+        self._sort_memory: int = None
+        self._sort_directory: str = None
+        # Limites de l'exécution en cours
+        self._budget: _Budget = _unlimited
+        # Filtres de Bloom appliqués lors de la dernière exécution : (clause JOIN, plan, nombre d'éléments écartés)
+        self._semi_join_stats: list[tuple[_JoinClause, _JoinPlan, int]] = [ ]
         self._syntax: SelectQuerySyntax = SelectQuerySyntax()
         self._syntax.add_keyword('select')
 
@@ -187,6 +1122,38 @@ class _SelectQuery(_DatasetQuery):
         self._syntax.add_keyword('limit')
         self._limit = limit
         return self
+
+    def distinct(self) -> Self:
+        '''SELECT DISTINCT : seule la première occurrence de chaque élément est retournée, avant la limite.
+        Sans ORDER BY, une limite de mémoire à l'exécution (max_memory) s'applique aussi à l'élimination des doublons,
+        qui se fait alors par partitions sur disque si nécessaire, sans conserver l'ordre des éléments.'''
+        self._distinct = True
+        return self
+
+    def union(self, query: '_SelectQuery | _CompoundQuery') -> '_CompoundQuery':
+        '''UNION : éléments des deux requêtes, sans doublons'''
+        return _CompoundQuery('UNION', self, query)
+
+    def union_all(self, query: '_SelectQuery | _CompoundQuery') -> '_CompoundQuery':
+        '''UNION ALL : éléments des deux requêtes, doublons compris'''
+        return _CompoundQuery('UNION ALL', self, query)
+
+    def intersect(self, query: '_SelectQuery | _CompoundQuery') -> '_CompoundQuery':
+        '''INTERSECT : éléments de cette requête présents dans le résultat de query, sans doublons'''
+        return _CompoundQuery('INTERSECT', self, query)
+
+    def except_(self, query: '_SelectQuery | _CompoundQuery') -> '_CompoundQuery':
+        '''EXCEPT : éléments de cette requête absents du résultat de query, sans doublons'''
+        return _CompoundQuery('EXCEPT', self, query)
+
+    def approximate(self, confidence: float=0.95) -> Self:
+        '''Mode approximatif : les agrégats COUNT et SUM calculés sur des échantillons (Dataset.sample)
+        sont extrapolés à l'ensemble des éléments, et chaque agrégat est une Estimate
+        accompagnée de la demi-largeur de son intervalle de confiance au niveau confidence'''
+        if not 0 < confidence < 1:
+            raise ValueError(f'Confidence must be between 0 and 1, got {confidence}')
+        self._confidence = confidence
+        return self
     
     '''
     Explain
@@ -195,6 +1162,8 @@ class _SelectQuery(_DatasetQuery):
     def _explain_selected(self, pretty: bool=True) -> str:
         '''Retourne la chaîne explicative des champs mentionnés dans l'expression SELECT'''
         explanation = 'SELECT'
+        if self._distinct:
+            explanation += ' DISTINCT'
         if not self._selected:
             explanation += ' *'
         else:
@@ -239,70 +1208,683 @@ class _SelectQuery(_DatasetQuery):
             return string + ', '.join(sort_keys)
         return ''
     
+    def _explain_semi_joins(self, pretty: bool=False) -> str:
+        '''Retourne la chaîne explicative des filtres de Bloom appliqués lors de la dernière exécution'''
+        if self._semi_join_stats:
+            filters = [ ]
+            for join, plan, removed in self._semi_join_stats:
+                keys = ' AND '.join(f'{left} IN {right}' for right, left in zip(plan.right_keys, plan.left_keys))
+                string = f'{self._indent}' if pretty else ''
+                string += f'{keys} ({removed} rows removed)'
+                filters.append(string)
+            if pretty:
+                return 'BLOOM FILTER\n' + ',\n'.join(filters)
+            return 'BLOOM FILTER ' + ', '.join(filters)
+        return ''
+
+    def external_sort(self, max_memory: int=64 * 1024 ** 2, directory: str=None) -> Self:
+        '''Tri externe de l'expression ORDER BY : dès que les éléments à trier occupent environ max_memory octets,
+        ils sont triés et écrits dans un fichier temporaire (dans directory, ou le répertoire temporaire par défaut).
+        Les fichiers sont ensuite fusionnés au fil de la lecture du résultat (stream).
+        Sans effet sur les requêtes comportant des agrégats ou des fonctions de fenêtre, triées en mémoire.'''
+        self._sort_memory = max_memory
+        self._sort_directory = directory
+        return self
+
+    def _explain_approximate(self) -> str:
+        '''Retourne la chaîne explicative du mode approximatif'''
+        if self._confidence is not None:
+            return f'APPROXIMATE ({self._confidence:.0%} CONFIDENCE)'
+        return ''
+
     def _explain_limit(self):
         '''Retourne la chaîne explicative de l'expression SELECT'''
         if self._limit:
             return f'LIMIT {self._limit}'
         return ''
 
-    def explain(self, pretty: bool=True) -> str:
-        '''Retourne l'explication de l'ensemble de la requête'''
+    def _statement(self) -> str:
+        return self.explain(pretty=False, statistics=False)
+
+    def explain(self, pretty: bool=True, statistics: bool=True) -> str:
+        '''Retourne l'explication de l'ensemble de la requête
+        statistics : avec les filtres de Bloom appliqués lors de la dernière exécution'''
         explanation = [ self._explain_selected(pretty=pretty) ]
         explanation.append(self._explain_from(pretty=pretty))
         explanation.append(self._explain_join(pretty=pretty))
         explanation.append(self._explain_where(pretty=pretty))
         explanation.append(self._explain_order_by(pretty=pretty))
         explanation.append(self._explain_limit())
+        explanation.append(self._explain_approximate())
+        if statistics:
+            explanation.append(self._explain_semi_joins(pretty=pretty))
         explanation = filter(None, explanation)
         if pretty:
             return '\n'.join(explanation)
         else:
             return ' '.join(explanation)
 
+    '''
+    Planification des jointures
+    '''
+
+    def _plan_join(self, position: int) -> _JoinPlan:
+        '''Choisit la stratégie d'exécution du JOIN d'index position.
+        Les comparaisons entre un champ du dataset joint et un terme des datasets précédents permettent
+        une équi-jointure par tri-fusion (=) ou une jointure par intervalle (<, <=, >, >=) sur entrée triée.
+        A défaut, la jointure est une boucle imbriquée.'''
+        join = self._join[position]
+        previous = [ self._from ] + [ join.dataset for join in self._join[:position] ]
+        comparisons = [ ]
+        for conjunct in _conjuncts(join.clause):
+            if not isinstance(conjunct, Expression) or conjunct.operator not in _mirrored_comparisons:
+                continue
+            if len(conjunct.args) != 2 or conjunct.kwargs:
+                continue
+            left, right = conjunct.args
+            if isinstance(left, DatasetField) and left.dataset is join.dataset and _references_only(right, previous):
+                comparisons.append((conjunct.operator, left, right))
+            elif isinstance(right, DatasetField) and right.dataset is join.dataset and _references_only(left, previous):
+                comparisons.append((_mirrored_comparisons[conjunct.operator], right, left))
+        equalities = [ (right, left) for comparison, right, left in comparisons if comparison is operator.eq ]
+        if equalities:
+            return _JoinPlan('merge', right_keys=tuple(right for right, _ in equalities), left_keys=tuple(left for _, left in equalities))
+        # Jointure par intervalle : on trie le côté dont une même clé est bornée par le plus de comparaisons
+        candidates = [ ]
+        for _, field, left_term in comparisons:
+            lower = upper = None
+            for comparison, right, left in comparisons:
+                if right.name != field.name:
+                    continue
+                if comparison in (operator.gt, operator.ge) and lower is None:
+                    lower = (comparison, left)
+                elif comparison in (operator.lt, operator.le) and upper is None:
+                    upper = (comparison, left)
+            candidates.append(_JoinPlan('range', right_keys=(field, ), lower=lower, upper=upper))
+            # Même intervalle vu depuis les datasets précédents : left_term OP right
+            lower = upper = None
+            for comparison, right, left in comparisons:
+                if _term_key(left) != _term_key(left_term):
+                    continue
+                comparison = _mirrored_comparisons[comparison]
+                if comparison in (operator.gt, operator.ge) and lower is None:
+                    lower = (comparison, right)
+                elif comparison in (operator.lt, operator.le) and upper is None:
+                    upper = (comparison, right)
+            candidates.append(_JoinPlan('range', left_keys=(left_term, ), lower=lower, upper=upper, sorted_side='left'))
+        if candidates:
+            return max(candidates, key=lambda plan: (plan.lower is not None) + (plan.upper is not None))
+        return _JoinPlan('nested loop')
+
+    def _join_plan(self, position: int) -> _JoinPlan:
+        '''Plan du JOIN d'index position, établi une seule fois pour une requête préparée'''
+        if self._compiled is None:
+            return self._plan_join(position)
+        key = ('plan', position)
+        if key not in self._compiled:
+            self._compiled[key] = self._plan_join(position)
+        return self._compiled[key]
+
+    def _join_clause_applies(self, position: int) -> bool:
+        '''True si la clause du JOIN d'index position peut être évaluée dès ce JOIN,
+        c'est-à-dire si elle ne référence aucun dataset joint ultérieurement'''
+        datasets = [ self._from ] + [ join.dataset for join in self._join[:position + 1] ]
+        return _references_only(self._join[position].clause, datasets)
+
+    @staticmethod
+    def _seek(datasets: list[Dataset], row: tuple) -> None:
+        '''Positionne chaque dataset sur l'élément dont l'index figure dans row'''
+        for dataset, index in zip(datasets, row):
+            dataset.move_to(index)
+
+    def _check_join(self, count: int, datasets: list[Dataset]) -> None:
+        '''Vérifie que les count combinaisons d'index produites par une jointure restent dans les limites de l'exécution'''
+        self._budget.check(count, count * (sys.getsizeof((0, ) * len(datasets)) + 8), 'JOIN', datasets[-1])
+
+    def _join_capacity(self, datasets: list[Dataset]) -> int | float:
+        '''Nombre de combinaisons d'index qu'une jointure peut produire dans les limites de l'exécution :
+        les jointures le comparent à chaque combinaison retenue, sans attendre la fin de l'élément en cours'''
+        return self._budget.capacity(sys.getsizeof((0, ) * len(datasets)) + 8)
+
+    def _nested_loop_join(self, rows: list[tuple], datasets: list[Dataset], candidates: list[int], clause: Expression) -> list[tuple]:
+        '''Jointure par boucle imbriquée : chaque ligne est combinée à chaque élément candidat du dataset joint'''
+        joined = [ ]
+        if clause is None:
+            # Produit cartésien : sa taille est connue avant sa construction.
+            # Les combinaisons sont produites par blocs, sans évaluation ni positionnement
+            self._check_join(len(rows) * len(candidates), datasets)
+            for block in CompositeIterator(rows, candidates).blocks():
+                joined += [ row + (index, ) for row, index in block ]
+            return joined
+        right = datasets[-1]
+        capacity = self._join_capacity(datasets)
+        for row in rows:
+            self._seek(datasets, row)
+            for index in candidates:
+                right.move_to(index)
+                if clause.match:
+                    joined.append(row + (index, ))
+                    if len(joined) > capacity:
+                        self._check_join(len(joined), datasets)
+        return joined
+
+    def _merge_join(self, rows: list[tuple], datasets: list[Dataset], candidates: list[int], clause: Expression, plan: _JoinPlan) -> list[tuple]:
+        '''Equi-jointure par tri-fusion : les deux entrées sont triées sur leurs clés puis parcourues en parallèle.
+        Le tri est quasi linéaire sur une entrée déjà triée.'''
+        right = datasets[-1]
+        # Les clés comportant None ne se trient pas avec les autres : elles sont comparées à part,
+        # None == None étant vrai comme dans une boucle imbriquée
+        left_keyed, left_null = [ ], [ ]
+        for position, row in enumerate(rows):
+            self._seek(datasets, row)
+            key = tuple(_value(term) for term in plan.left_keys)
+            if any(value is None for value in key):
+                left_null.append(position)
+            else:
+                left_keyed.append((key, position))
+        right_keyed, right_null = [ ], [ ]
+        for index in candidates:
+            right.move_to(index)
+            key = tuple(field.value for field in plan.right_keys)
+            if any(value is None for value in key):
+                right_null.append(index)
+            else:
+                right_keyed.append((key, index))
+        left_keyed.sort(key=itemgetter(0))
+        right_keyed.sort(key=itemgetter(0))
+
+        # Index des éléments du dataset joint correspondant à chaque ligne (par position), dans l'ordre croissant
+        matches: dict[int, list[int]] = { }
+        count = 0
+        capacity = self._join_capacity(datasets)
+        left_position = right_position = 0
+        while left_position < len(left_keyed) and right_position < len(right_keyed):
+            left_key = left_keyed[left_position][0]
+            right_key = right_keyed[right_position][0]
+            if left_key < right_key:
+                left_position += 1
+            elif right_key < left_key:
+                right_position += 1
+            else:
+                # Clés égales : on combine les groupes de clés identiques des deux côtés
+                left_end = left_position
+                while left_end < len(left_keyed) and left_keyed[left_end][0] == left_key:
+                    left_end += 1
+                right_end = right_position
+                while right_end < len(right_keyed) and right_keyed[right_end][0] == right_key:
+                    right_end += 1
+                for _, position in left_keyed[left_position:left_end]:
+                    self._seek(datasets, rows[position])
+                    for _, index in right_keyed[right_position:right_end]:
+                        right.move_to(index)
+                        # Le reste de la clause doit aussi être rempli
+                        if clause.match:
+                            matches.setdefault(position, [ ]).append(index)
+                            count += 1
+                            if count > capacity:
+                                self._check_join(count, datasets)
+                left_position = left_end
+                right_position = right_end
+        for position in left_null:
+            self._seek(datasets, rows[position])
+            for index in right_null:
+                right.move_to(index)
+                if clause.match:
+                    matches.setdefault(position, [ ]).append(index)
+                    count += 1
+                    if count > capacity:
+                        self._check_join(count, datasets)
+        # Le tri étant stable, chaque ligne a ses correspondances dans l'ordre des index :
+        # on restitue l'ordre d'une boucle imbriquée sans trier les combinaisons
+        return [ row + (index, ) for position, row in enumerate(rows) for index in matches.get(position, ( )) ]
+
+    @staticmethod
+    def _bounds(keys: list, plan: _JoinPlan) -> tuple[int, int] | None:
+        '''Retourne la plage des clés triées keys comprises entre les bornes du plan,
+        évaluées sur les éléments courants. None si une borne est nulle'''
+        start, end = 0, len(keys)
+        if plan.lower is not None:
+            comparison, term = plan.lower
+            bound = _value(term)
+            if bound is None:
+                return None
+            start = bisect_left(keys, bound) if comparison is operator.ge else bisect_right(keys, bound)
+        if plan.upper is not None:
+            comparison, term = plan.upper
+            bound = _value(term)
+            if bound is None:
+                return None
+            end = bisect_right(keys, bound) if comparison is operator.le else bisect_left(keys, bound)
+        return start, end
+
+    def _range_join(self, rows: list[tuple], datasets: list[Dataset], candidates: list[int], clause: Expression, plan: _JoinPlan) -> list[tuple]:
+        '''Jointure par intervalle : un côté est trié sur sa clé, puis chaque élément de l'autre côté
+        ne parcourt que la plage d'éléments comprise entre ses bornes'''
+        right = datasets[-1]
+        joined = [ ]
+        if plan.sorted_side == 'right':
+            right_keyed = [ ]
+            for index in candidates:
+                right.move_to(index)
+                value = plan.right_keys[0].value
+                if value is not None:
+                    right_keyed.append((value, index))
+            right_keyed.sort(key=itemgetter(0))
+            keys = [ key for key, _ in right_keyed ]
+            capacity = self._join_capacity(datasets)
+            for row in rows:
+                self._seek(datasets, row)
+                bounds = self._bounds(keys, plan)
+                if bounds is None:
+                    continue
+                matches = [ index for _, index in right_keyed[bounds[0]:bounds[1]] ]
+                matches.sort()
+                for index in matches:
+                    right.move_to(index)
+                    # Le reste de la clause doit aussi être rempli
+                    if clause.match:
+                        joined.append(row + (index, ))
+                        if len(joined) > capacity:
+                            self._check_join(len(joined), datasets)
+            return joined
+
+        left_keyed = [ ]
+        for position, row in enumerate(rows):
+            self._seek(datasets, row)
+            value = _value(plan.left_keys[0])
+            if value is not None:
+                left_keyed.append((value, position))
+        left_keyed.sort(key=itemgetter(0))
+        keys = [ key for key, _ in left_keyed ]
+        # Index des éléments du dataset joint correspondant à chaque ligne (par position), dans l'ordre croissant
+        matches: dict[int, list[int]] = { }
+        count = 0
+        capacity = self._join_capacity(datasets)
+        for index in candidates:
+            right.move_to(index)
+            bounds = self._bounds(keys, plan)
+            if bounds is None:
+                continue
+            for _, position in left_keyed[bounds[0]:bounds[1]]:
+                # Seuls les datasets précédents sont repositionnés, le dataset joint reste sur index
+                self._seek(datasets, rows[position])
+                if clause.match:
+                    matches.setdefault(position, [ ]).append(index)
+                    count += 1
+                    if count > capacity:
+                        self._check_join(count, datasets)
+        # Les candidats étant parcourus dans l'ordre, on restitue l'ordre d'une boucle imbriquée sans trier les combinaisons
+        return [ row + (index, ) for position, row in enumerate(rows) for index in matches.get(position, ( )) ]
+
+    def _semi_join_filters(self) -> tuple[list[tuple[int, _JoinPlan, BloomFilter]], dict[int, list[int]]]:
+        '''Construit les filtres de Bloom des clés des datasets joints restreints par la clause WHERE.
+        Seules les équi-jointures dont les clés ne référencent, à gauche, que le dataset FROM sont concernées :
+        les éléments du dataset FROM dont la clé est absente du filtre ne peuvent remplir ni le JOIN ni le WHERE.
+        Retourne la liste des (position du JOIN, plan, filtre), et pour chaque position les index des éléments
+        du dataset joint qui remplissent ses termes du WHERE : ce sont les candidats de la jointure, déjà parcourus'''
+        filters = [ ]
+        candidates: dict[int, list[int]] = { }
+        where_clauses = [ clause for clause in _conjuncts(self._where) if _datasets_of(clause) ]
+        for position, join in enumerate(self._join):
+            if join.clause is None or not self._join_clause_applies(position):
+                continue
+            plan = self._join_plan(position)
+            if plan.strategy != 'merge' or not all(_references_only(term, [ self._from ]) for term in plan.left_keys):
+                continue
+            dimension_clauses = [ clause for clause in where_clauses if _references_only(clause, [ join.dataset ]) ]
+            if not dimension_clauses:
+                continue
+            keys = [ ]
+            kept = candidates[position] = [ ]
+            dimension_where = self._clauses(('dimension', position), *dimension_clauses)
+            for index in self._scan(join.dataset):
+                join.dataset.move_to(index)
+                if dimension_where.match:
+                    kept.append(index)
+                    # Les clés nulles sont gardées : None == None dans la clause du JOIN
+                    keys.append(tuple(field.value for field in plan.right_keys))
+            bloom = BloomFilter(len(keys))
+            try:
+                for key in keys:
+                    bloom.add(key)
+            except TypeError:
+                # Clés non hachables : pas de filtre
+                continue
+            filters.append((position, plan, bloom))
+        return filters, candidates
+
+    def _joined_rows(self) -> list[tuple]:
+        '''Retourne les combinaisons d'index des datasets de la requête qui remplissent les clauses JOIN,
+        dans l'ordre d'une boucle imbriquée'''
+        datasets = [ self._from ]
+        rows = [ (index, ) for index in self._scan(self._from) ]
+        # Semi-jointures : les éléments du dataset FROM sans correspondance possible sont écartés avant toute jointure
+        filters, filtered = self._semi_join_filters()
+        removed = [ 0 ] * len(filters)
+        if filters:
+            started = self._tracer.start('BLOOM FILTER')
+            kept = [ ]
+            for row in rows:
+                self._from.move_to(row[0])
+                for number, (_, plan, bloom) in enumerate(filters):
+                    try:
+                        found = tuple(_value(term) for term in plan.left_keys) in bloom
+                    except TypeError:
+                        found = True
+                    if not found:
+                        removed[number] += 1
+                        break
+                else:
+                    kept.append(row)
+            self._tracer.finish(started, len(rows), len(kept), 'BLOOM FILTER')
+            rows = kept
+        self._semi_join_stats = [ (self._join[position], plan, count) for (position, plan, _), count in zip(filters, removed) ]
+        for position, join in enumerate(self._join):
+            datasets.append(join.dataset)
+            # Dataset joint déjà parcouru pour son filtre : seuls ses éléments remplissant le WHERE sont candidats
+            candidates = filtered[position] if position in filtered else self._scan(join.dataset)
+            clause = join.clause if self._join_clause_applies(position) else None
+            plan = self._join_plan(position) if clause is not None else _JoinPlan('nested loop')
+            started = self._tracer.start(plan, join.dataset)
+            rows_in = len(rows)
+            try:
+                match plan.strategy:
+                    case 'merge':
+                        rows = self._merge_join(rows, datasets, candidates, clause, plan)
+                    case 'range':
+                        rows = self._range_join(rows, datasets, candidates, clause, plan)
+                    case _:
+                        rows = self._nested_loop_join(rows, datasets, candidates, clause)
+            except TypeError:
+                # Clés non comparables entre elles : on se rabat sur la boucle imbriquée
+                rows = self._nested_loop_join(rows, datasets, candidates, clause)
+            self._tracer.finish(started, rows_in, len(rows), plan, join.dataset)
+        self._tracer.count('rows_joined', len(rows))
+        return rows
+
+    def _terms(self) -> list:
+        '''Termes de la requête : champs, expressions et constantes'''
+        return [ *self._selected, self._where, *self._order_by, *[ join.clause for join in self._join ] ]
+
+    def _datasets(self) -> list[Dataset]:
+        '''Retourne la liste des datasets lus par la requête'''
+        datasets = [ self._from ] + [ join.dataset for join in self._join ]
+        for term in self._terms():
+            for dataset in _datasets_of(term):
+                if not any(dataset is known for known in datasets):
+                    datasets.append(dataset)
+        return datasets
+
+    def _cache_key(self) -> Hashable:
+        '''Clé du cache des résultats : empreinte de la requête et versions des datasets lus'''
+        fingerprint = (
+            __class__.__name__,
+            tuple(map(_fingerprint, self._selected)),
+            _fingerprint(self._from),
+            tuple((_fingerprint(join.dataset), _fingerprint(join.clause)) for join in self._join),
+            _fingerprint(self._where),
+            tuple(map(_fingerprint, self._order_by)),
+            self._limit,
+            self._confidence,
+            self._distinct,
+        )
+        return (fingerprint, tuple((id(dataset), dataset.version) for dataset in self._datasets()))
+
     '''
     Exécution de la requête
     '''
     
-    def execute(self):
-        if self._syntax.check():
-            resultset = [ ]
-            # On prend tous les datasets de la requête
-            datasets = [ self._from ] + [ join.dataset for join in self._join ]
-            # ... et on les itère pour créer le dataset résultant de la requête
-            for results in CompositeIterator(*datasets):
-                element = { }
-                # Si les clauses join sont remplies
-                join_clauses = [ join.clause for join in self._join if join.clause is not None ]
-                if _Clauses(*join_clauses).match:
-                    # ... et que les clauses where sont remplies
-                    if _Clauses(self._where).match:
-                        # ... on récupère les champs ou objets sélectionnés
-                        if not self._selected:
-                            # Aucun champ n'est sélectionné, on retourne TOUT
-                            for result in results:
-                                element.update(result.data)
-                        else:
-                            # On s'occupe de chaque champs sélectionné
-                            for selected in self._selected:
-                                element.update({ selected.alias: _Term(selected).value })
-                        # Si on a un tri à faire, on ajoute la clé temporaire de tri
+    def execute(self, max_rows: int=None, max_memory: int=None):
+        '''Exécute la requête. Voir stream pour les limites max_rows et max_memory'''
+        return Dataset(list(self.stream(max_rows=max_rows, max_memory=max_memory)))
+
+    def stream(self, max_rows: int=None, max_memory: int=None) -> Iterator[dict]:
+        '''Exécute la requête et retourne ses éléments au fur et à mesure de la lecture.
+        Avec un tri externe, le résultat trié n'est jamais entièrement en mémoire.
+        Limites de l'exécution, vérifiées au fil de la croissance des résultats intermédiaires :
+        - max_rows : nombre d'éléments produits par chaque étape (jointure, filtre, regroupement)
+        - max_memory : mémoire estimée, en octets, des résultats intermédiaires. Au-delà, les éléments à retourner
+        sont écrits sur disque (triés s'il y a lieu), comme avec external_sort ; les jointures, agrégats et fonctions
+        de fenêtre, qui ne peuvent pas l'être, lèvent ResourceLimitError, comme tout dépassement de max_rows'''
+        if self._check():
+            tracer = self._trace()
+            budget = self._budget = _unlimited if max_rows is None and max_memory is None else _Budget(max_rows, max_memory)
+            try:
+                cache_key = None
+                if _result_cache is not None:
+                    cache_key = self._cache_key()
+                    cached = _result_cache.get(cache_key)
+                    if cached is not None:
+                        tracer.count('cache_hits', 1)
+                        tracer.count('rows_returned', len(cached))
+                        yield from cached
+                        return
+                # Les sous-requêtes sont exécutées une fois, avant le parcours des éléments
+                self._load_subqueries()
+                resultset = [ ]
+                # Tri externe : séquences triées écrites sur disque, et taille estimée des éléments en mémoire
+                runs: list[IO[bytes]] = [ ]
+                buffered = 0
+                # On prend tous les datasets de la requête
+                datasets = [ self._from ] + [ join.dataset for join in self._join ]
+                # Les clauses join qui n'ont pas pu être évaluées lors des jointures le sont avec la clause where
+                join_clauses = [ join.clause for position, join in enumerate(self._join)
+                                    if join.clause is not None and not self._join_clause_applies(position) ]
+                # Les clauses sont évaluées par les mêmes instances tout au long de l'exécution, qui les réordonnent
+                remaining_joins = self._clauses('joins', *join_clauses)
+                where = self._clauses('where', self._where)
+                # Agrégats : les autres termes sélectionnés sont les clés de regroupement
+                aggregates = [ selected for selected in self._selected if isinstance(selected, _Aggregate) ]
+                group_terms = [ selected for selected in self._selected if not isinstance(selected, _Aggregate) ]
+                # Fonctions de fenêtre : les valeurs dont elles dépendent sont relevées pour chaque élément du résultat
+                windows = [ selected for selected in self._selected if isinstance(selected, _Window) ]
+                if windows and aggregates:
+                    raise SyntaxError('Window functions cannot be combined with aggregates')
+                window_rows: list[list[tuple]] = [ [ ] for _ in windows ]
+                # Mémoire au-delà de laquelle les éléments à retourner sont écrits sur disque, None pour les garder en mémoire
+                spill_memory = None
+                if not windows and not aggregates and self._order_by and self._sort_memory is not None:
+                    spill_memory = self._sort_memory
+                sort_key = itemgetter(self._temp_sort_key)
+                # Groupes : clé de regroupement -> (élément partiel, cumuls de chaque agrégat)
+                groups: dict[tuple, tuple[dict, list[dict]]] = { }
+                # En mode approximatif, les agrégats sont cumulés par unité de tirage des datasets échantillonnés
+                samples = [ ]
+                if self._confidence is not None:
+                    samples = [ (position, dataset) for position, dataset in enumerate(datasets) if isinstance(dataset, DatasetSample) ]
+                # ... et on parcourt leurs combinaisons pour créer le dataset résultant de la requête
+                joined_rows = self._joined_rows()
+                if joined_rows:
+                    budget.reserved = len(joined_rows) * (sys.getsizeof(joined_rows[0]) + 8)
+                if budget.available is not None and not windows and not aggregates:
+                    # Pas de séquences minuscules sur disque : avec trop peu de mémoire disponible, la limite est atteinte avant
+                    available = max(budget.available, _min_spill_memory)
+                    spill_memory = available if spill_memory is None else min(spill_memory, available)
+                started = tracer.start('FILTER')
+                matched = 0
+                for row in joined_rows:
+                    self._seek(datasets, row)
+                    element = { }
+                    # Si les clauses join restantes sont remplies
+                    if remaining_joins.match:
+                        # ... et que les clauses where sont remplies
+                        if where.match:
+                            matched += 1
+                            # ... on cumule les agrégats dans le groupe de l'élément
+                            if aggregates:
+                                key = tuple(_value(term) for term in group_terms)
+                                group = groups.get(key, None)
+                                if group is None:
+                                    element = dict(zip((term.alias for term in group_terms), key))
+                                    if self._order_by:
+                                        element.update({ self._temp_sort_key: tuple(_value(x) for x in self._order_by) })
+                                    # Le groupe n'est créé que s'il tient dans les limites
+                                    if budget is not _unlimited:
+                                        buffered += _estimate_size((element, ))
+                                        budget.check(len(groups) + 1, buffered, 'AGGREGATE')
+                                    group = groups[key] = (element, [ { } for _ in aggregates ])
+                                unit = tuple(dataset.units[row[position]] for position, dataset in samples)
+                                for aggregate, totals in zip(aggregates, group[1]):
+                                    aggregate.accumulate(totals, unit)
+                            # ... ou on récupère les champs ou objets sélectionnés
+                            elif not self._selected:
+                                # Aucun champ n'est sélectionné, on retourne TOUT
+                                for dataset in datasets:
+                                    element.update(dataset._current)
+                            else:
+                                # On s'occupe de chaque champs sélectionné
+                                for selected in self._selected:
+                                    if isinstance(selected, _Window):
+                                        element.update({ selected.alias: None })
+                                    else:
+                                        element.update({ selected.alias: _value(selected) })
+                                for window, rows in zip(windows, window_rows):
+                                    rows.append(window.row_values())
+                            # Si on a un tri à faire, on ajoute la clé temporaire de tri
+                            if self._order_by:
+                                sort_keys = [ _value(x) for x in self._order_by ]
+                                element.update({ self._temp_sort_key: tuple(sort_keys) })
+                            # L'élément est créé, on ajoute SA COPIE au résultat
+                            if not aggregates:
+                                resultset.append(element.copy())
+                                # Au-delà de la mémoire allouée, les éléments, triés le cas échéant, sont écrits sur disque
+                                if spill_memory is not None or budget is not _unlimited:
+                                    buffered += _estimate_size((element, ))
+                                    if spill_memory is not None and buffered > spill_memory:
+                                        if self._order_by:
+                                            resultset.sort(key=sort_key)
+                                        run = _write_run(resultset, self._sort_directory)
+                                        if run is not None:
+                                            runs.append(run)
+                                            resultset = [ ]
+                                            buffered = 0
+                                        elif budget.max_memory is not None:
+                                            raise ResourceLimitError(f'FILTER exceeded the memory budget of {budget.max_memory} bytes, '
+                                                                     'and its rows cannot be written to disk')
+                                        else:
+                                            # Eléments non sérialisables : le tri externe se poursuit en mémoire
+                                            spill_memory = None
+                                    budget.check(matched, buffered, 'FILTER')
+                tracer.finish(started, len(joined_rows), matched, 'FILTER')
+                # Les fonctions de fenêtre sont calculées avant le tri et la limite du résultat
+                for window, rows in zip(windows, window_rows):
+                    started = tracer.start('WINDOW', window)
+                    for element, value in zip(resultset, window.compute(rows)):
+                        element[window.alias] = value
+                    tracer.finish(started, len(rows), len(rows), 'WINDOW', window)
+                # Un élément par groupe, dans l'ordre des termes sélectionnés ; sans clé de regroupement, il y en a toujours un
+                if aggregates:
+                    started = tracer.start('AGGREGATE')
+                    if not groups and not group_terms:
+                        groups[( )] = ({ self._temp_sort_key: ( ) } if self._order_by else { }, [ { } for _ in aggregates ])
+                    fraction = math.prod(dataset.fraction for _, dataset in samples)
+                    for group, all_totals in groups.values():
+                        results = iter(all_totals)
+                        element = { }
+                        for selected in self._selected:
+                            if isinstance(selected, _Aggregate):
+                                element[selected.alias] = selected.result(next(results), fraction, self._confidence)
+                            else:
+                                element[selected.alias] = group[selected.alias]
+                        if self._order_by:
+                            element[self._temp_sort_key] = group[self._temp_sort_key]
+                        resultset.append(element)
+                    tracer.finish(started, matched, len(resultset), 'AGGREGATE')
+                # On a les éléments du résultat, on les trie si nécessaire...
+                if self._order_by:
+                    started = tracer.start('SORT')
+                    resultset.sort(key=sort_key)
+                    tracer.finish(started, len(resultset), len(resultset), 'SORT')
+                with ExitStack() as stack:
+                    # ... en fusionnant les séquences écrites sur disque le cas échéant : la fusion est stable...
+                    rows = iter(resultset)
+                    if runs:
+                        for run in runs:
+                            stack.enter_context(run)
                         if self._order_by:
-                            sort_keys = [ _Term(x).value for x in self._order_by ]
-                            element.update({ self._temp_sort_key: tuple(sort_keys) })
-                        # L'élément est créé, on ajoute SA COPIE au résultat
-                        resultset.append(element.copy())
-            # On a les éléments du résultat, on les trie si nécessaire...
-            if self._order_by:
-                resultset.sort(key=lambda x: x[self._temp_sort_key])
-            # ... on applique la limite si nécessaire...
-            if self._limit:
-                resultset = resultset[:self._limit]
-            # ... on supprime la clé temporaire de tri si nécessaire
-            if self._order_by:
-                for element in resultset:
-                    del element[self._temp_sort_key]
-            # ... et on retourne le dataset
-            return Dataset(resultset)
+                            rows = heapq.merge(*map(_read_run, runs), resultset, key=sort_key)
+                        else:
+                            rows = itertools.chain(*map(_read_run, runs), resultset)
+                    # ... on supprime la clé temporaire de tri si nécessaire...
+                    if self._order_by:
+                        rows = _drop_key(rows, self._temp_sort_key)
+                    # ... on écarte les doublons si nécessaire, sur disque au besoin si l'ordre importe peu...
+                    if self._distinct:
+                        rows = _hash_set_operation('DISTINCT', ((0, element) for element in rows),
+                                                    None if self._order_by else max_memory, self._sort_directory)
+                    # ... on applique la limite si nécessaire...
+                    if self._limit:
+                        rows = itertools.islice(rows, self._limit)
+                    cached = [ ]
+                    returned = 0
+                    for element in rows:
+                        returned += 1
+                        if cache_key is not None:
+                            cached.append(element.copy())
+                        # ... et on retourne l'élément
+                        yield element
+                    tracer.count('rows_returned', returned)
+                # On garde le résultat en cache si nécessaire
+                if cache_key is not None:
+                    _result_cache.put(cache_key, cached)
+            finally:
+                # Requête terminée, ou lecture abandonnée
+                self._end_trace()
+                self._budget = _unlimited
+
+class _CompoundQuery:
+    '''Combinaison de deux requêtes SELECT par une opération ensembliste : UNION, UNION ALL, INTERSECT, EXCEPT.
+    Les éléments sont comparés sur leurs valeurs, dans l'ordre des champs : les éléments de la requête de droite
+    d'une union prennent les noms de champs de la requête de gauche.'''
+
+    def __init__(self, operation: str, left: '_SelectQuery | _CompoundQuery', right: '_SelectQuery | _CompoundQuery') -> None:
+        self._operation = operation
+        self._left = left
+        self._right = right
+
+    def __str__(self) -> str:
+        return self.explain(pretty=False)
+
+    # Les opérations s'enchaînent de gauche à droite
+    union = _SelectQuery.union
+    union_all = _SelectQuery.union_all
+    intersect = _SelectQuery.intersect
+    except_ = _SelectQuery.except_
+
+    def explain(self, pretty: bool=True) -> str:
+        separator = '\n' if pretty else ' '
+        return separator.join((self._left.explain(pretty=pretty), self._operation, self._right.explain(pretty=pretty)))
+
+    def _terms(self) -> list:
+        '''Termes des deux requêtes'''
+        return [ *self._left._terms(), *self._right._terms() ]
+
+    def __tagged(self, max_memory: int=None) -> Iterator[tuple[int, dict]]:
+        '''Eléments des deux requêtes marqués par leur côté, la droite en premier pour INTERSECT et EXCEPT'''
+        if self._operation in ('INTERSECT', 'EXCEPT'):
+            yield from ((1, row) for row in self._right.stream(max_memory=max_memory))
+            yield from ((0, row) for row in self._left.stream(max_memory=max_memory))
+            return
+        fields = None
+        for row in self._left.stream(max_memory=max_memory):
+            if fields is None:
+                fields = list(row)
+            yield (0, row)
+        for row in self._right.stream(max_memory=max_memory):
+            if fields is not None and len(fields) == len(row) and fields != list(row):
+                row = dict(zip(fields, row.values()))
+            yield (1, row)
+
+    def execute(self, max_memory: int=None, directory: str=None) -> Dataset:
+        '''Exécute la combinaison. Voir stream pour max_memory et directory'''
+        return Dataset(list(self.stream(max_memory=max_memory, directory=directory)))
+
+    def stream(self, max_memory: int=None, directory: str=None) -> Iterator[dict]:
+        '''Exécute la combinaison en une passe, par hachage des éléments.
+        Au-delà de max_memory octets, les éléments sont répartis en partitions sur disque (dans directory),
+        traitées l'une après l'autre : l'ordre des éléments n'est alors plus conservé.
+        max_memory s'applique aussi à l'exécution de chaque requête.'''
+        return _hash_set_operation(self._operation, self.__tagged(max_memory), max_memory, directory)
 
 class _UpdateQuery(_DatasetQuery):
     '''De quoi faire une requête UPDATE sur un dataset '''
@@ -321,6 +1903,10 @@ class _UpdateQuery(_DatasetQuery):
     '''
     Mots clés de la requête UPDATE
     '''
+    def _terms(self) -> list:
+        '''Termes de la requête : champs, expressions et constantes'''
+        return [ *[ update.value for update in self._set ], self._where ]
+
     def set_(self, *set_values: UpdateElement) -> Self:
         self._syntax.add_keyword('set')
         self._set = set_values
@@ -331,15 +1917,27 @@ class _UpdateQuery(_DatasetQuery):
     '''
 
     def execute(self) -> Self:
-        if self._syntax.check():
-            for element in self._dataset:
-                if _Clauses(self._where).match:
-                    # On met à jour une copie, sinon les mises à jour peuvent se chevaucher
-                    updated = element.data.copy()
-                    for update in self._set:
-                        updated.update({ update.field.name: _Term(update.value).value })
-                    element.data.update(updated.copy())
-            return self._dataset
+        if self._check():
+            tracer = self._trace()
+            try:
+                self._load_subqueries()
+                # Un dataset externe peut exécuter la requête lui-même
+                if self._dataset.push_update([ (update.field, update.value) for update in self._set ], self._where):
+                    return self._dataset
+                where = self._clauses('where', self._where)
+                for index in self._dataset.cursor(self._scan(self._dataset)):
+                    if where.match:
+                        # On met à jour une copie, sinon les mises à jour peuvent se chevaucher
+                        updated = self._dataset._current.copy()
+                        for update in self._set:
+                            updated.update({ update.field.name: _value(update.value) })
+                        # L'élément est copié au préalable s'il est partagé avec un instantané
+                        self._dataset.writable_element(index).data.update(updated)
+                        tracer.count('rows_affected', 1)
+                self._dataset.touch()
+                return self._dataset
+            finally:
+                self._end_trace()
     
     '''
     Explain
@@ -385,17 +1983,25 @@ class _DeleteQuery(_DatasetQuery):
     '''
 
     def execute(self) -> Dataset:
-        if self._syntax.check():
-            # On collecte l'ensemble des index qui répondent au critère
-            delete_elements = [ ]
-            for element in self._from:
-                if _Clauses(self._where).match:
-                    delete_elements.append(element)
-            # ... et on supprime les éléments dans l'ordre inverse de leur index
-            delete_elements.sort(key=lambda element: element.index, reverse=True)
-            for element in delete_elements:
-                element.delete()
-            return self._from
+        if self._check():
+            tracer = self._trace()
+            try:
+                self._load_subqueries()
+                # Un dataset externe peut exécuter la requête lui-même
+                if self._from.push_delete(self._where):
+                    return self._from
+                # On collecte l'ensemble des index qui répondent au critère
+                delete_indexes = [ ]
+                where = self._clauses('where', self._where)
+                for index in self._from.cursor(self._scan(self._from)):
+                    if where.match:
+                        delete_indexes.append(index)
+                # ... et on supprime les éléments une fois le parcours terminé
+                self._from.remove(delete_indexes)
+                tracer.count('rows_affected', len(delete_indexes))
+                return self._from
+            finally:
+                self._end_trace()
 
     '''
     Explain
@@ -433,12 +2039,24 @@ class _AlterQuery(_DatasetQuery):
         return self
     
     def execute(self) -> Dataset:
-        if self._syntax.check():
-            for element in self._dataset:
-                if _Clauses(self._where).match:
-                    for field in self._drop_fields:
-                        element.drop(field)
-            return self._dataset
+        if self._check():
+            tracer = self._trace()
+            try:
+                self._load_subqueries()
+                # Un dataset externe peut exécuter la requête lui-même
+                if self._dataset.push_drop(self._drop_fields, self._where):
+                    return self._dataset
+                where = self._clauses('where', self._where)
+                for index in self._dataset.cursor(self._scan(self._dataset)):
+                    if where.match:
+                        element = self._dataset.writable_element(index)
+                        for field in self._drop_fields:
+                            element.drop(field)
+                        tracer.count('rows_affected', 1)
+                self._dataset.touch()
+                return self._dataset
+            finally:
+                self._end_trace()
 
     '''
     Explain
@@ -466,3 +2084,299 @@ class _AlterQuery(_DatasetQuery):
         if pretty:
             return '\n'.join(explain_strings)
         return ' '.join(explain_strings)
+
+class _InsertQuery(_DatasetQuery):
+    '''De quoi ajouter des éléments à un dataset, fournis ou résultant d'une requête SELECT'''
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._dataset: Dataset = None
+        self._values: list[dict] = None
+        self._query: _SelectQuery | _CompoundQuery = None
+        self._syntax: InsertQuerySyntax = InsertQuerySyntax()
+        self._syntax.add_keyword('insert')
+
+    def __str__(self) -> str:
+        return self.explain(pretty=False)
+
+    '''
+    Mots clés de la requête INSERT
+    '''
+    def _terms(self) -> list:
+        '''Termes de la requête SELECT fournissant les éléments'''
+        return self._query._terms() if self._query is not None else [ ]
+
+    def into(self, dataset: Dataset) -> Self:
+        self._syntax.add_keyword('into')
+        self._dataset = dataset
+        return self
+
+    def values(self, *elements: dict) -> Self:
+        '''Eléments à insérer, copiés à l'exécution'''
+        self._syntax.add_keyword('values')
+        self._values = elements
+        return self
+
+    def from_query(self, query: '_SelectQuery | _CompoundQuery') -> Self:
+        '''Requête dont le résultat est inséré, exécutée à chaque exécution de l'insertion'''
+        self._syntax.add_keyword('from_query')
+        self._query = query
+        return self
+
+    '''
+    Exécution de la requête INSERT
+    '''
+
+    def execute(self) -> Dataset:
+        if self._check():
+            if (self._values is None) == (self._query is None):
+                raise SyntaxError('INSERT requires either VALUES or a query')
+            tracer = self._trace()
+            try:
+                if self._query is not None:
+                    rows = list(self._query.stream())
+                else:
+                    rows = [ dict(element) for element in self._values ]
+                # L'ajout passe par le dataset, qui tient à jour ses résumés (zone maps) et sa version
+                if rows:
+                    self._dataset += Dataset(rows)
+                tracer.count('rows_affected', len(rows))
+                return self._dataset
+            finally:
+                self._end_trace()
+
+    '''
+    Explain
+    '''
+
+    def explain(self, pretty: bool=True) -> str:
+        separator = '\n' if pretty else ' '
+        explanation = f'INSERT INTO {self._dataset}'
+        if self._query is not None:
+            return explanation + separator + self._query.explain(pretty=pretty)
+        if self._values is not None:
+            return explanation + separator + f'VALUES ({len(self._values)} elements)'
+        return explanation
+
+class _MergeQuery(_DatasetQuery):
+    '''De quoi fusionner un dataset source dans un dataset cible selon une clé (MERGE, ou upsert) :
+    les éléments de la cible dont la clé figure dans la source sont mis à jour, les autres éléments de la source sont insérés.
+    La requête s'exécute en une passe sur chaque dataset, par une table de hachage des clés de la cible.'''
+
+    def __init__(self, dataset: Dataset) -> None:
+        super().__init__()
+        self._dataset: Dataset = dataset
+        self._source: Dataset = None
+        self._keys: tuple[Hashable | DatasetField | Expression] = ( )
+        # None si la clause WHEN correspondante est absente
+        self._set: tuple[UpdateElement] = None
+        self._insert: tuple[DatasetField | Expression] = None
+        self._syntax: MergeQuerySyntax = MergeQuerySyntax()
+        self._syntax.add_keyword('merge')
+
+    def __str__(self) -> str:
+        return self.explain(pretty=False)
+
+    '''
+    Mots clés de la requête MERGE
+    '''
+    def _terms(self) -> list:
+        '''Termes de la requête : champs, expressions et constantes'''
+        return [ *[ update.value for update in self._set or ( ) ], *(self._insert or ( )) ]
+
+    def using(self, source: Dataset) -> Self:
+        '''Dataset source, dont les éléments sont fusionnés dans la cible'''
+        self._syntax.add_keyword('using')
+        self._source = source
+        return self
+
+    def on(self, *keys: Hashable | DatasetField | Expression) -> Self:
+        '''Clé de la fusion : noms de champs ou champs, de même nom dans la cible et la source,
+        ou égalités (reliées par AND) entre un champ de la cible et un champ de la source'''
+        self._syntax.add_keyword('on')
+        self._keys = keys
+        return self
+
+    def when_matched_update(self, *set_values: UpdateElement) -> Self:
+        '''Mise à jour des éléments de la cible dont la clé figure dans la source.
+        Les valeurs peuvent référencer les champs de l'élément de la cible et de celui de la source.
+        Sans valeur, tous les champs de l'élément de la source sont recopiés dans l'élément de la cible.'''
+        self._syntax.add_keyword('when_matched_update')
+        self._set = set_values
+        return self
+
+    def when_not_matched_insert(self, *fields: DatasetField | Expression) -> Self:
+        '''Insertion des éléments de la source dont la clé ne figure pas dans la cible,
+        réduits aux champs ou expressions fields s'ils sont fournis'''
+        self._syntax.add_keyword('when_not_matched_insert')
+        self._insert = fields
+        return self
+
+    def _key_fields(self) -> list[tuple[DatasetField, DatasetField]]:
+        '''Couples (champ de la cible, champ de la source) formant la clé'''
+        pairs = [ ]
+        for key in self._keys:
+            if not isinstance(key, Expression):
+                name = key.name if isinstance(key, DatasetField) else key
+                pairs.append((self._dataset[name], self._source[name]))
+                continue
+            for conjunct in _conjuncts(key):
+                if (not isinstance(conjunct, Expression) or conjunct.operator is not operator.eq or len(conjunct.args) != 2
+                        or not all(isinstance(arg, DatasetField) for arg in conjunct.args)):
+                    raise SyntaxError(f'MERGE key must be an equality between fields, got {conjunct}')
+                left, right = conjunct.args
+                if left.dataset is self._source and right.dataset is self._dataset:
+                    left, right = right, left
+                if left.dataset is not self._dataset or right.dataset is not self._source:
+                    raise SyntaxError(f'MERGE key must compare a target field to a source field, got {conjunct}')
+                pairs.append((left, right))
+        return pairs
+
+    '''
+    Exécution de la requête MERGE
+    '''
+
+    def execute(self) -> Dataset:
+        if self._check():
+            tracer = self._trace()
+            try:
+                self._load_subqueries()
+                pairs = self._key_fields()
+                # Table de hachage des clés de la cible : clé -> index des éléments
+                started = tracer.start('HASH', self._dataset)
+                targets: dict[Hashable, list[int]] = { }
+                for index in self._dataset.cursor(self._scan(self._dataset)):
+                    key = _hash_key(tuple(target.value for target, _ in pairs))
+                    if key is not None:
+                        targets.setdefault(key, [ ]).append(index)
+                tracer.finish(started, len(self._dataset), len(targets), 'HASH', self._dataset)
+                # Clés de la source, qui doivent être uniques, relevées avant toute modification
+                sources = [ ]
+                seen = set()
+                for index in self._source.cursor(self._scan(self._source)):
+                    key = _hash_key(tuple(source.value for _, source in pairs))
+                    if key is not None:
+                        if key in seen:
+                            raise ValueError(f'MERGE source has several elements with key {key}')
+                        seen.add(key)
+                    sources.append((index, key))
+                # Mises à jour et insertions
+                started = tracer.start('MERGE', self._source)
+                inserted = [ ]
+                updated = 0
+                for index, key in sources:
+                    self._source.move_to(index)
+                    matches = targets.get(key, ( )) if key is not None else ( )
+                    if matches:
+                        if self._set is None:
+                            continue
+                        for position in matches:
+                            self._dataset.move_to(position)
+                            # On met à jour une copie, sinon les mises à jour peuvent se chevaucher
+                            element = self._dataset._current.copy()
+                            if self._set:
+                                for update in self._set:
+                                    element[update.field.name] = _value(update.value)
+                            else:
+                                element.update(self._source._current)
+                            self._dataset.writable_element(position).data.update(element)
+                            updated += 1
+                    elif self._insert is not None:
+                        if self._insert:
+                            inserted.append({ field.alias: _value(field) for field in self._insert })
+                        else:
+                            inserted.append(dict(self._source._current))
+                # L'ajout passe par le dataset, qui tient à jour ses résumés (zone maps) et sa version
+                if inserted:
+                    self._dataset += Dataset(inserted)
+                self._dataset.touch()
+                tracer.finish(started, len(sources), updated + len(inserted), 'MERGE', self._source)
+                tracer.count('rows_affected', updated + len(inserted))
+                return self._dataset
+            finally:
+                self._end_trace()
+
+    '''
+    Explain
+    '''
+
+    def explain(self, pretty: bool=True) -> str:
+        keys = ' AND '.join(str(key.name if isinstance(key, DatasetField) else key) for key in self._keys)
+        explain_strings = [ f'MERGE INTO {self._dataset}', f'USING {self._source}', f'ON {keys}' ]
+        if self._set is not None:
+            explain_strings.append('WHEN MATCHED THEN UPDATE ' + (f'SET {", ".join(map(str, self._set))}' if self._set else '*'))
+        if self._insert is not None:
+            explain_strings.append('WHEN NOT MATCHED THEN INSERT ' + (", ".join(map(str, self._insert)) if self._insert else '*'))
+        if pretty:
+            return '\n'.join(explain_strings)
+        return ' '.join(explain_strings)
+
+class _PreparedQuery:
+    '''Requête préparée, exécutée avec les valeurs de ses paramètres.
+    Les valeurs sont liées aux paramètres, partagés par toutes les exécutions : une requête préparée n'est pas réentrante.
+    Une exécution lancée avant la fin de la précédente (lecture de stream en cours, autre thread) lève RuntimeError.'''
+
+    def __init__(self, query: _DatasetQuery) -> None:
+        self.__query = query
+        # Exécution en cours, des valeurs liées jusqu'à la fin de la requête
+        self.__running: threading.Lock = threading.Lock()
+        self.__parameters: dict[str, list[Parameter]] = { }
+        for term in query._terms():
+            for parameter in _parameters_of(term):
+                self.__parameters.setdefault(parameter.name, [ ]).append(parameter)
+        reserved = [ name for name in ('max_rows', 'max_memory') if name in self.__parameters ]
+        if reserved:
+            raise TypeError(f'Reserved query parameter names (execution limits): {", ".join(reserved)}')
+
+    def __str__(self) -> str:
+        return str(self.__query)
+
+    @property
+    def parameters(self) -> list[str]:
+        '''Noms des paramètres de la requête'''
+        return list(self.__parameters)
+
+    def explain(self, pretty: bool=True) -> str:
+        return self.__query.explain(pretty=pretty)
+
+    def __check(self, binds: dict[str, Any]) -> None:
+        '''Vérifie que les valeurs binds correspondent aux paramètres de la requête, qui doivent tous être fournis'''
+        unknown = [ name for name in binds if name not in self.__parameters ]
+        if unknown:
+            raise TypeError(f'Unknown query parameters: {", ".join(unknown)}')
+        missing = [ name for name in self.__parameters if name not in binds ]
+        if missing:
+            raise TypeError(f'Missing query parameters: {", ".join(missing)}')
+
+    def __bind(self, binds: dict[str, Any]) -> None:
+        '''Démarre une exécution : lie les valeurs binds aux paramètres de la requête'''
+        if not self.__running.acquire(blocking=False):
+            raise RuntimeError(f'Prepared query is already being executed, and cannot run twice at the same time: {self}')
+        for name, value in binds.items():
+            for parameter in self.__parameters[name]:
+                parameter.bind(value)
+
+    def execute(self, max_rows: int=None, max_memory: int=None, **binds: Any) -> Any:
+        '''Exécute la requête avec les valeurs de paramètres binds.
+        Comme pour stream, max_rows et max_memory sont les limites d'une requête SELECT (voir _SelectQuery.stream)'''
+        self.__check(binds)
+        limits = { name: limit for name, limit in (('max_rows', max_rows), ('max_memory', max_memory)) if limit is not None }
+        self.__bind(binds)
+        try:
+            return self.__query.execute(**limits)
+        finally:
+            self.__running.release()
+
+    def stream(self, max_rows: int=None, max_memory: int=None, **binds: Any) -> Iterator[dict]:
+        '''Exécute une requête SELECT avec les valeurs de paramètres binds, et retourne ses éléments au fil de la lecture.
+        Voir _SelectQuery.stream pour les limites max_rows et max_memory. Les valeurs ne sont liées qu'au début de la lecture'''
+        self.__check(binds)
+        return self.__stream(binds, max_rows=max_rows, max_memory=max_memory)
+
+    def __stream(self, binds: dict[str, Any], **limits: int) -> Iterator[dict]:
+        self.__bind(binds)
+        try:
+            yield from self.__query.stream(**limits)
+        finally:
+            self.__running.release()
+
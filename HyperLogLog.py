@@ -0,0 +1,88 @@
+from decimal import Decimal
+from fractions import Fraction
+from numbers import Real
+from typing import Hashable, Self
+import hashlib
+import math
+'''
+HyperLogLog
+
+Estimation du nombre de valeurs distinctes en mémoire fixe : 2 ** precision registres d'un octet,
+pour une erreur relative type de 1.04 / sqrt(2 ** precision)
+'''
+
+class HyperLogLog:
+    '''Compteur probabiliste de valeurs distinctes.
+    Le hachage ne dépend pas du processus : des compteurs remplis par des processus différents peuvent être fusionnés'''
+    def __init__(self, precision: int=14) -> None:
+        '''precision : nombre de bits de hachage désignant le registre, entre 4 et 18'''
+        if not 4 <= precision <= 18:
+            raise ValueError(f'Precision must be between 4 and 18, got {precision}')
+        self.__precision: int = precision
+        self.__registers = bytearray(1 << precision)
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__}: ~{len(self)} distinct items, {len(self.__registers)} registers>'
+
+    @staticmethod
+    def __encode(item: Hashable) -> bytes:
+        '''Représentation binaire d'une valeur, identique pour des valeurs égales :
+        les nombres égaux (1, 1.0, True, Decimal(1)) sont représentés par la même fraction'''
+        if isinstance(item, bytes):
+            return b'b' + item
+        if isinstance(item, str):
+            return b's' + item.encode('utf-8', 'surrogatepass')
+        if isinstance(item, int):
+            # Cas le plus courant, sans passer par Fraction
+            return b'n%d/1' % item
+        if isinstance(item, (Real, Decimal)):
+            try:
+                fraction = Fraction(item)
+            except (ValueError, OverflowError, TypeError):
+                # NaN, infinis
+                pass
+            else:
+                return b'n' + f'{fraction.numerator}/{fraction.denominator}'.encode()
+        if isinstance(item, tuple):
+            parts = [ __class__.__encode(part) for part in item ]
+            return b't' + b''.join(len(part).to_bytes(8, 'little') + part for part in parts)
+        return b'r' + repr(item).encode('utf-8', 'surrogatepass')
+
+    @staticmethod
+    def __hash(item: Hashable) -> int:
+        '''Hachage 64 bits stable d'une valeur, indépendant de PYTHONHASHSEED'''
+        return int.from_bytes(hashlib.blake2b(__class__.__encode(item), digest_size=8).digest(), 'little')
+
+    def add(self, item: Hashable) -> Self:
+        '''Ajoute une valeur au compteur'''
+        hashed = self.__hash(item)
+        # Les premiers bits désignent le registre, qui conserve le rang du premier bit à 1 des bits restants
+        width = 64 - self.__precision
+        register = hashed >> width
+        rank = width - (hashed & ((1 << width) - 1)).bit_length() + 1
+        if rank > self.__registers[register]:
+            self.__registers[register] = rank
+        return self
+
+    def merge(self, other: 'HyperLogLog') -> Self:
+        '''Ajoute au compteur les valeurs comptées par other, de même précision'''
+        if other.__precision != self.__precision:
+            raise ValueError(f'Cannot merge {self.__class__.__name__} of different precisions')
+        self.__registers = bytearray(map(max, self.__registers, other.__registers))
+        return self
+
+    def __len__(self) -> int:
+        '''Estimation du nombre de valeurs distinctes'''
+        size = len(self.__registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(2.0 ** -register for register in self.__registers)
+        # Petits effectifs : le comptage des registres vides est plus précis
+        empty = self.__registers.count(0)
+        if estimate <= 2.5 * size and empty:
+            estimate = size * math.log(size / empty)
+        return round(estimate)
+
+    @property
+    def relative_error(self) -> float:
+        '''Erreur relative type de l'estimation'''
+        return 1.04 / math.sqrt(len(self.__registers))
@@ -149,3 +149,22 @@ class DropQuerySyntax(Syntax):
             Once('drop'),
             NoneOrOnce('where')
         )
+
+class InsertQuerySyntax(Syntax):
+    def __init__(self):
+        super().__init__(
+            Once('insert'),
+            Once('into'),
+            NoneOrOnce('values'),
+            NoneOrOnce('from_query')
+        )
+
+class MergeQuerySyntax(Syntax):
+    def __init__(self):
+        super().__init__(
+            Once('merge'),
+            Once('using'),
+            Once('on'),
+            NoneOrOnce('when_matched_update'),
+            NoneOrOnce('when_not_matched_insert')
+        )
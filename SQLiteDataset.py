@@ -0,0 +1,461 @@
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Any, Hashable, Iterable, Iterator, Self
+import math
+import operator
+import re
+import sqlite3
+
+from .Dataset import Dataset, DatasetElement, DatasetField, Expression, Parameter, _InList
+
+'''
+Datasets stockés dans une table SQLite
+
+Les éléments ne sont lus qu'à la demande, par blocs de rowid consécutifs : la table n'a pas à tenir en mémoire.
+Les requêtes traduisent en SQL ce qu'elles peuvent de leurs clauses (comparaisons, IN, LIKE, NOT, AND, OR
+entre champs et constantes), exécuté par SQLite avec ses index ; le reste (arithmétique, CAST, func, ...) est évalué en Python,
+élément par élément. Les conditions traduites ont exactement la valeur qu'aurait l'expression en Python :
+NULL y vaut None, une valeur n'est égale qu'aux valeurs de sa classe de type (nombres, textes, blobs),
+une comparaison d'ordre entre classes différentes vaut NULL comme l'erreur vaut None en Python.
+'''
+
+'''
+Fonctions et classes "privées"
+'''
+
+# Comparaisons et leur équivalent SQL
+_sql_comparisons = {
+    operator.eq: '=',
+    operator.ne: '!=',
+    operator.lt: '<',
+    operator.le: '<=',
+    operator.gt: '>',
+    operator.ge: '>=',
+}
+
+# Classes de types SQLite des constantes, comparables entre elles en Python : nombres, textes, blobs.
+# La classe d'un champ n'est connue qu'à l'exécution, par typeof
+_null_class = "('null')"
+_number_class = "('integer', 'real')"
+_sql_classes = {
+    bool: _number_class,
+    int: _number_class,
+    float: _number_class,
+    str: "('text')",
+    bytes: "('blob')",
+}
+
+# Nombre d'éléments modifiés conservés en mémoire avant leur écriture dans la table
+_flush_size: int = 4096
+
+def _quote(name: Hashable) -> str:
+    '''Nom SQL d'une table ou d'une colonne'''
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _regexp(pattern: str, value: Any, flags: int) -> int:
+    '''Fonction SQL équivalente à DatasetField.like'''
+    if not isinstance(value, str):
+        return 0
+    return int(re.match(pattern, value, flags) is not None)
+
+def _sql_class(sql: str) -> str:
+    '''Classe de type SQLite de la valeur d'un champ : les entiers et les réels sont une même classe'''
+    return f"(CASE typeof({sql}) WHEN 'real' THEN 'integer' ELSE typeof({sql}) END)"
+
+def _operand(term: Any, dataset: Dataset) -> tuple[str, list, str | None] | None:
+    '''Traduit un champ du dataset ou une constante en SQL : chaîne SQL, paramètres,
+    et classe de type de la constante (None pour un champ). None si le terme n'est ni l'un ni l'autre'''
+    if isinstance(term, Parameter):
+        term = term.value
+    if isinstance(term, DatasetField):
+        if term.dataset is not dataset:
+            return None
+        return (_quote(term.name), [ ], None)
+    if term is None:
+        return ('NULL', [ ], _null_class)
+    if isinstance(term, bool):
+        return ('?', [ int(term) ], _number_class)
+    # Au-delà, SQLite ne représente pas la valeur
+    if isinstance(term, int) and not -2 ** 63 <= term < 2 ** 63:
+        return None
+    if isinstance(term, float) and math.isnan(term):
+        return None
+    if type(term) in _sql_classes:
+        return ('?', [ term ], _sql_classes[type(term)])
+    return None
+
+def _boolean(value: Any) -> tuple[str, list]:
+    '''Valeur SQL d'une condition évaluée en Python'''
+    if value is True or value is False:
+        return (str(int(value)), [ ])
+    return ('NULL', [ ])
+
+def _condition(term: Any, dataset: Dataset, top: bool=False) -> tuple[str, list] | None:
+    '''Traduit une condition en SQL : chaîne SQL et paramètres. La valeur SQL (1, 0, NULL) est celle
+    de l'expression en Python (True, False, None). None si la condition ne peut pas être évaluée par SQLite.
+    top : la condition est un terme de la clause WHERE, dont seule compte la valeur 1 ;
+    les comparaisons y valent 0 au lieu de NULL, ce qui permet à SQLite d'utiliser ses index'''
+    if isinstance(term, Parameter):
+        term = term.value
+    if not isinstance(term, Expression) or term.kwargs:
+        return None
+    function, args = term.operator, term.args
+    # LIKE : expression bool(re.match(regex, champ, flag)), toujours True ou False
+    if function is bool and len(args) == 1 and isinstance(args[0], Expression) and args[0].operator is re.match:
+        pattern, value, flags = args[0].args
+        translated = _operand(value, dataset)
+        if translated is None or not isinstance(pattern, str):
+            return None
+        return (f'_dataset_regexp(?, {translated[0]}, ?)', [ pattern, *translated[1], int(flags) ])
+    # IN : expression contains(valeurs, champ), sauf sur une sous-requête ; toujours True ou False
+    if (function is operator.contains and len(args) == 2 and isinstance(args[0], (list, tuple, set, frozenset, _InList))
+            and getattr(args[0], 'query', None) is None):
+        items, value = args
+        translated = _operand(value, dataset)
+        constants = [ _operand(item, dataset) for item in items ]
+        if translated is None or translated[2] is not None or any(constant is None or constant[2] is None for constant in constants):
+            return None
+        # Une valeur n'est égale qu'aux valeurs de sa classe de type
+        classes: dict[str, list] = { }
+        for _, parameters, sql_class in constants:
+            classes.setdefault(sql_class, [ ]).extend(parameters)
+        field = translated[0]
+        conditions, parameters = [ ], [ ]
+        for sql_class, values in classes.items():
+            if sql_class == _null_class:
+                conditions.append(f'{field} IS NULL')
+            else:
+                conditions.append(f'(typeof({field}) IN {sql_class} AND {field} IN ({", ".join("?" * len(values))}))')
+                parameters += values
+        if not conditions:
+            return ('0', [ ])
+        return (f'({" OR ".join(conditions)})', parameters)
+    # NOT : vrai sauf si la condition est vraie
+    if function is operator.not_ and len(args) == 1:
+        translated = _condition(args[0], dataset)
+        if translated is None:
+            return None
+        return (f'({translated[0]} IS NOT 1)', translated[1])
+    if len(args) != 2:
+        return None
+    # AND et OR, court-circuités comme en Python : une valeur None du premier terme donne None
+    if function in (operator.and_, operator.or_):
+        left, right = _condition(args[0], dataset), _condition(args[1], dataset)
+        if left is None or right is None:
+            return None
+        if function is operator.and_:
+            return (f'(CASE {left[0]} WHEN 0 THEN 0 WHEN 1 THEN {right[0]} END)', left[1] + right[1])
+        return (f'(CASE {left[0]} WHEN 1 THEN 1 WHEN 0 THEN {right[0]} END)', left[1] + right[1])
+    if function not in _sql_comparisons:
+        return None
+    left, right = _operand(args[0], dataset), _operand(args[1], dataset)
+    if left is None or right is None:
+        return None
+    if left[2] is not None and right[2] is not None:
+        # Comparaison de constantes
+        return _boolean(term.value)
+    (left_sql, left_parameters, left_class), (right_sql, right_parameters, right_class) = left, right
+    parameters = left_parameters + right_parameters
+    if function in (operator.eq, operator.ne):
+        # Egalité : toujours True ou False, None étant égal à None
+        if left_class == _null_class or right_class == _null_class:
+            field = right_sql if left_class == _null_class else left_sql
+            return (f'({field} IS {"" if function is operator.eq else "NOT "}NULL)', [ ])
+        if left_class is None and right_class is None:
+            equal = f'({left_sql} IS {right_sql} AND {_sql_class(left_sql)} = {_sql_class(right_sql)})'
+        else:
+            field, sql_class = (left_sql, right_class) if right_class is not None else (right_sql, left_class)
+            equal = f'({left_sql} = {right_sql} AND typeof({field}) IN {sql_class})'
+        return (equal if function is operator.eq else f'(NOT {equal})', parameters)
+    # Comparaison d'ordre : None (erreur en Python) si l'une des valeurs est None ou si leurs classes diffèrent
+    if left_class == _null_class or right_class == _null_class:
+        return ('NULL', [ ])
+    if left_class is None and right_class is None:
+        comparable = f"({_sql_class(left_sql)} = {_sql_class(right_sql)} AND typeof({left_sql}) != 'null')"
+    else:
+        field, sql_class = (left_sql, right_class) if right_class is not None else (right_sql, left_class)
+        comparable = f'typeof({field}) IN {sql_class}'
+    comparison = f'{left_sql} {_sql_comparisons[function]} {right_sql}'
+    if top:
+        return (f'({comparable} AND {comparison})', parameters)
+    return (f'(CASE WHEN {comparable} THEN {comparison} END)', parameters)
+
+def _conjuncts(clause: Any) -> list:
+    '''Décompose une clause en la liste de ses termes reliés par AND'''
+    if isinstance(clause, Expression) and clause.operator is operator.and_:
+        conjuncts = [ ]
+        for arg in clause.args:
+            conjuncts += _conjuncts(arg)
+        return conjuncts
+    return [ clause ]
+
+class _SQLiteRows(Sequence):
+    '''Eléments d'une table SQLite, indexés par leur rowid et lus par blocs de rowid consécutifs.
+    Un rowid sans élément (élément supprimé) donne un élément vide.'''
+    # Nombre de blocs conservés en mémoire
+    _cached_blocks: int = 16
+
+    def __init__(self, connection: sqlite3.Connection, table: str, block_size: int) -> None:
+        self.__connection = connection
+        self.__table = table
+        self.__block_size = block_size
+        self.__blocks: OrderedDict[int, dict[int, dict]] = OrderedDict()
+        # Plus grand rowid plus un, lu dans la table jusqu'à la prochaine modification
+        self.__extent: int = None
+        # Eléments modifiés, pas encore écrits dans la table
+        self.dirty: dict[int, dict] = { }
+
+    def __len__(self) -> int:
+        if self.__extent is None:
+            try:
+                self.__extent = self.__connection.execute(f'SELECT COALESCE(MAX(rowid), -1) + 1 FROM {_quote(self.__table)}').fetchone()[0]
+            except sqlite3.OperationalError:
+                # La table n'existe pas encore
+                return 0
+        return self.__extent
+
+    def __fetch(self, sql: str, parameters: Iterable=( )) -> Iterator[tuple[int, dict]]:
+        '''Exécute une requête SELECT rowid, * et retourne les couples (rowid, élément)'''
+        cursor = self.__connection.execute(sql, tuple(parameters))
+        names = [ description[0] for description in cursor.description[1:] ]
+        for row in cursor:
+            yield row[0], dict(zip(names, row[1:]))
+
+    def __getitem__(self, index: int | slice) -> dict | list[dict]:
+        if isinstance(index, slice):
+            return [ row for row in (self[position] for position in range(*index.indices(len(self)))) if row ]
+        if index in self.dirty:
+            return self.dirty[index]
+        block = index // self.__block_size
+        rows = self.__blocks.get(block, None)
+        if rows is None:
+            start = block * self.__block_size
+            rows = dict(self.__fetch(f'SELECT rowid, * FROM {_quote(self.__table)} WHERE rowid BETWEEN ? AND ?',
+                                     (start, start + self.__block_size - 1)))
+            self.__blocks[block] = rows
+            if len(self.__blocks) > self._cached_blocks:
+                self.__blocks.popitem(last=False)
+        else:
+            self.__blocks.move_to_end(block)
+        row = rows.get(index, None)
+        return row if row is not None else { }
+
+    def __iter__(self) -> Iterator[dict]:
+        for index, row in self.__fetch(f'SELECT rowid, * FROM {_quote(self.__table)} ORDER BY rowid'):
+            yield self.dirty.get(index, row)
+
+    def invalidate(self) -> None:
+        '''Oublie les blocs lus et le plus grand rowid, après une modification de la table'''
+        self.__blocks.clear()
+        self.__extent = None
+
+'''
+Classes "publiques"
+'''
+
+class SQLiteDataset(Dataset):
+    '''Dataset stocké dans une table SQLite, interrogé avec les mêmes requêtes que les autres datasets.
+    Les index des éléments sont leurs rowid : ils ne sont pas consécutifs après une suppression.
+    Sa longueur est le nombre de lignes de la table.
+    Les valeurs doivent être de types acceptés par SQLite.'''
+
+    def __init__(self, database: str | sqlite3.Connection, table: str, name=None, block_size: int=256) -> None:
+        '''database : chemin du fichier SQLite, ou connexion
+        table : nom de la table, créée au premier ajout d'éléments si elle n'existe pas
+        block_size : nombre de rowid consécutifs lus à la fois'''
+        self.__connection = database if isinstance(database, sqlite3.Connection) else sqlite3.connect(database)
+        self.__connection.create_function('_dataset_regexp', 3, _regexp, deterministic=True)
+        self.__table = table
+        self.__rows = _SQLiteRows(self.__connection, table, block_size)
+        # Nombre de lignes de la table, lu jusqu'à la prochaine modification
+        self.__count: int = None
+        super().__init__(self.__rows, name=name or table)
+
+    def __len__(self) -> int:
+        if self.__count is None:
+            if not self.columns:
+                return 0
+            self.__count = self.__connection.execute(f'SELECT COUNT(*) FROM {_quote(self.__table)}').fetchone()[0]
+        return self.__count
+
+    def __iter__(self) -> Iterator[DatasetElement]:
+        return (self.seek(index) for index in self.scan())
+
+    def cursor(self, indexes: Iterable[int]=None) -> Iterator[int]:
+        '''Comme Dataset.cursor, par défaut sur les rowid des éléments de la table'''
+        return super().cursor(self.scan() if indexes is None else indexes)
+
+    def __iadd__(self, other: Dataset) -> Self:
+        '''Insère les éléments de other dans la table'''
+        if not isinstance(other, Dataset):
+            raise TypeError(f'Can only add another {Dataset.__name__}')
+        rows = other.raw_dataset
+        if rows:
+            columns = self.__add_columns(dict.fromkeys(field for row in rows for field in row))
+            sql = f'INSERT INTO {_quote(self.__table)} ({", ".join(map(_quote, columns))}) VALUES ({", ".join("?" * len(columns))})'
+            with self.__connection:
+                self.__connection.executemany(sql, ([ row.get(column, None) for column in columns ] for row in rows))
+            self.touch()
+        return self
+
+    @property
+    def columns(self) -> list[str]:
+        '''Colonnes de la table'''
+        return [ row[1] for row in self.__connection.execute(f'PRAGMA table_info({_quote(self.__table)})') ]
+
+    def __add_columns(self, fields: Iterable[Hashable]) -> list[str]:
+        '''Crée la table ou ajoute ses colonnes manquantes, et retourne les colonnes de la table'''
+        columns = self.columns
+        missing = [ ]
+        for field in fields:
+            if str(field) not in columns and str(field) not in missing:
+                missing.append(str(field))
+        if missing:
+            with self.__connection:
+                if not columns:
+                    self.__connection.execute(f'CREATE TABLE {_quote(self.__table)} ({", ".join(map(_quote, missing))})')
+                else:
+                    for column in missing:
+                        self.__connection.execute(f'ALTER TABLE {_quote(self.__table)} ADD COLUMN {_quote(column)}')
+        return columns + missing
+
+    def to_sql(self, term: Any) -> tuple[str, list] | None:
+        '''Traduit un champ de ce dataset, une constante ou une condition en SQL : chaîne SQL et paramètres,
+        None si c'est impossible'''
+        translated = _operand(term, self)
+        if translated is not None:
+            return translated[:2]
+        return _condition(term, self)
+
+    def __where(self, clause: Any, exact: bool=False) -> tuple[str, list] | None:
+        '''Clause WHERE SQL formée des termes traduisibles de clause, reliés par AND.
+        exact : tous les termes doivent être traduisibles, sinon None ; à défaut, les termes non traduisibles sont ignorés
+        et la clause SQL retient plus d'éléments que clause, qui reste à évaluer en Python'''
+        conditions, parameters = [ ], [ ]
+        if clause is not None:
+            for conjunct in _conjuncts(clause):
+                translated = _condition(conjunct, self, top=True)
+                if translated is not None:
+                    conditions.append(translated[0])
+                    parameters += translated[1]
+                elif exact:
+                    return None
+        if not conditions:
+            return '', [ ]
+        return ' WHERE ' + ' AND '.join(conditions), parameters
+
+    '''
+    Parcours et modifications élément par élément
+    '''
+
+    def scan(self, predicates: Iterable[tuple[Hashable, Any, Any]]=( ), clause: Any=None) -> Iterable[int]:
+        '''Retourne les rowid des éléments remplissant les termes de clause traduisibles en SQL.
+        Les autres termes sont évalués en Python par la requête'''
+        self.flush()
+        if not self.columns:
+            return [ ]
+        where, parameters = self.__where(clause)
+        cursor = self.__connection.execute(f'SELECT rowid FROM {_quote(self.__table)}{where} ORDER BY rowid', parameters)
+        return (rowid for rowid, in cursor)
+
+    def prepare_write(self) -> None:
+        '''Les éléments sont dans la table : rien à copier'''
+
+    def writable_element(self, index: int) -> DatasetElement:
+        '''Positionne l'élément courant sur l'élément de rowid index en vue de le modifier.
+        Les éléments modifiés sont écrits dans la table par paquets, et au plus tard par touch'''
+        self.__rows.dirty[index] = self.__rows[index]
+        if len(self.__rows.dirty) >= _flush_size:
+            self.flush()
+        return self.seek(index)
+
+    def flush(self) -> None:
+        '''Ecrit dans la table les éléments modifiés via writable_element'''
+        dirty = self.__rows.dirty
+        if not dirty:
+            return
+        columns = self.__add_columns(dict.fromkeys(field for row in dirty.values() for field in row))
+        sql = f'UPDATE {_quote(self.__table)} SET {", ".join(f"{_quote(column)} = ?" for column in columns)} WHERE rowid = ?'
+        with self.__connection:
+            self.__connection.executemany(sql, ([ row.get(column, None) for column in columns ] + [ index ] for index, row in dirty.items()))
+        dirty.clear()
+
+    def remove(self, indexes: Iterable[int]) -> None:
+        '''Supprime les éléments dont les rowid sont fournis'''
+        self.flush()
+        with self.__connection:
+            self.__connection.executemany(f'DELETE FROM {_quote(self.__table)} WHERE rowid = ?', ((index, ) for index in indexes))
+        self.touch()
+
+    def touch(self) -> None:
+        '''Ecrit les modifications en attente et signale la modification des éléments'''
+        self.flush()
+        self.__rows.invalidate()
+        self.__count = None
+        super().touch()
+
+    def snapshot(self) -> None:
+        raise TypeError(f'{__class__.__name__} does not support snapshots')
+
+    @property
+    def raw_dataset(self) -> list[dict]:
+        '''Liste de tous les éléments de la table, chargés en mémoire'''
+        self.flush()
+        return list(self.__rows)
+
+    '''
+    Exécution des requêtes de modification par SQLite
+    '''
+
+    def push_update(self, assignments: list[tuple[DatasetField, Any]], clause: Any=None) -> bool:
+        '''Exécute la mise à jour par une requête UPDATE si ses valeurs sont des champs ou des constantes
+        et si sa clause est entièrement traduisible en SQL'''
+        translated = [ ]
+        for field, value in assignments:
+            sql = _operand(value, self)
+            if field.dataset is not self or sql is None:
+                return False
+            translated.append((field.name, sql[:2]))
+        where = self.__where(clause, exact=True)
+        if where is None:
+            return False
+        self.flush()
+        self.__add_columns(name for name, _ in translated)
+        parameters = [ ]
+        for _, (_, values) in translated:
+            parameters += values
+        assignments = ', '.join(f'{_quote(name)} = {sql}' for name, (sql, _) in translated)
+        with self.__connection:
+            self.__connection.execute(f'UPDATE {_quote(self.__table)} SET {assignments}{where[0]}', parameters + where[1])
+        self.touch()
+        return True
+
+    def push_delete(self, clause: Any=None) -> bool:
+        '''Exécute la suppression par une requête DELETE si sa clause est entièrement traduisible en SQL'''
+        where = self.__where(clause, exact=True)
+        if where is None:
+            return False
+        self.flush()
+        if self.columns:
+            with self.__connection:
+                self.__connection.execute(f'DELETE FROM {_quote(self.__table)}{where[0]}', where[1])
+        self.touch()
+        return True
+
+    def push_drop(self, fields: Iterable[DatasetField], clause: Any=None) -> bool:
+        '''Sans clause, supprime les colonnes de la table ; sinon, leur affecte NULL si la clause est traduisible en SQL'''
+        if clause is not None:
+            return self.push_update([ (field, None) for field in fields ], clause)
+        self.flush()
+        columns = self.columns
+        with self.__connection:
+            for field in fields:
+                if field.name not in columns:
+                    continue
+                try:
+                    self.__connection.execute(f'ALTER TABLE {_quote(self.__table)} DROP COLUMN {_quote(field.name)}')
+                except sqlite3.OperationalError:
+                    # Colonne indexée, ou SQLite antérieur à 3.35 : la colonne est vidée
+                    self.__connection.execute(f'UPDATE {_quote(self.__table)} SET {_quote(field.name)} = NULL')
+        self.touch()
+        return True
@@ -0,0 +1,284 @@
+from collections.abc import Mapping, Sequence
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Hashable, Iterator, Self
+import array
+import os
+import pickle
+import struct
+import weakref
+
+from .Dataset import Dataset, DatasetSnapshot
+
+'''
+Datasets en mémoire partagée
+
+Un dataset publié en mémoire partagée (multiprocessing.shared_memory) est stocké par colonnes.
+Les autres processus s'y rattachent par son nom et l'interrogent sans copie ni sérialisation des éléments :
+seules les valeurs lues sont décodées.
+'''
+
+'''
+Fonctions "publiques"
+'''
+
+def publish(dataset: Dataset, name: str=None) -> 'SharedDataset':
+    '''Publie le dataset en mémoire partagée et retourne la vue correspondante.
+    Le segment est détruit par SharedDataset.unlink, à la sortie du bloc with, ou à la destruction de la vue.'''
+    return SharedDataset._publish(dataset, name=name)
+
+def attach(name: str) -> 'SharedDataset':
+    '''Se rattache au dataset publié en mémoire partagée sous le nom name'''
+    return SharedDataset._attach(name)
+
+'''
+Fonctions et classes "privées"
+'''
+
+# En-tête du segment : taille des métadonnées sérialisées
+_header = struct.Struct('<Q')
+# Etat d'une valeur : champ absent de l'élément, valeur None, valeur présente
+_MISSING, _NONE, _PRESENT = 0, 1, 2
+# Valeur retournée par une colonne pour un champ absent
+_ABSENT = object()
+
+def _align(offset: int) -> int:
+    '''Aligne offset sur 8 octets'''
+    return (offset + 7) & ~7
+
+def _column_kind(values: list) -> str:
+    '''Détermine le stockage d'une colonne d'après ses valeurs non nulles'''
+    kinds = set()
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            kinds.add('bool')
+        elif isinstance(value, int):
+            kinds.add('int' if -2 ** 63 <= value < 2 ** 63 else 'object')
+        elif isinstance(value, float):
+            kinds.add('float')
+        elif isinstance(value, str):
+            kinds.add('str')
+        else:
+            kinds.add('object')
+    if len(kinds) == 1:
+        return kinds.pop()
+    return 'object'
+
+def _encode_column(values: list, states: bytearray, kind: str) -> list[tuple[str, bytes]]:
+    '''Retourne les tampons (format, données) d'une colonne'''
+    match kind:
+        case 'int' | 'bool' | 'float':
+            fmt = { 'int': 'q', 'bool': 'b', 'float': 'd' }[kind]
+            zero = 0.0 if kind == 'float' else 0
+            data = array.array(fmt, (zero if value is None else value for value in values)).tobytes()
+            return [ ('B', bytes(states)), (fmt, data) ]
+        case _:
+            # Valeurs de longueur variable : table des positions et blob
+            encode = (lambda value: value.encode('utf-8')) if kind == 'str' else pickle.dumps
+            blobs = [ b'' if state != _PRESENT else encode(value) for value, state in zip(values, states) ]
+            offsets = [ 0 ]
+            for blob in blobs:
+                offsets.append(offsets[-1] + len(blob))
+            return [ ('B', bytes(states)), ('q', array.array('q', offsets).tobytes()), ('B', b''.join(blobs)) ]
+
+class _Column:
+    '''Colonne d'un dataset en mémoire partagée, lue directement dans le segment'''
+    def __init__(self, kind: str, views: list[memoryview]) -> None:
+        self.kind = kind
+        self.views = views
+        self.states = views[0]
+        match kind:
+            case 'str':
+                self.__decode = lambda data: str(data, 'utf-8')
+            case 'object':
+                self.__decode = pickle.loads
+            case _:
+                self.__decode = None
+
+    def get(self, index: int) -> Any:
+        '''Retourne la valeur de l'élément index, _ABSENT si le champ est absent'''
+        state = self.states[index]
+        if state != _PRESENT:
+            return _ABSENT if state == _MISSING else None
+        if self.__decode is None:
+            value = self.views[1][index]
+            return bool(value) if self.kind == 'bool' else value
+        offsets = self.views[1]
+        return self.__decode(self.views[2][offsets[index]:offsets[index + 1]])
+
+class _SharedRow(Mapping):
+    '''Elément d'un dataset en mémoire partagée, vu comme un dictionnaire en lecture seule'''
+    __slots__ = ('_columns', '_index')
+
+    def __init__(self, columns: dict[Hashable, _Column], index: int) -> None:
+        self._columns = columns
+        self._index = index
+
+    def get(self, key: Hashable, default: Any=None) -> Any:
+        column = self._columns.get(key, None)
+        if column is None:
+            return default
+        value = column.get(self._index)
+        return default if value is _ABSENT else value
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self._columns[key].get(self._index)
+        if value is _ABSENT:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return (key for key, column in self._columns.items() if column.states[self._index] != _MISSING)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+    def copy(self) -> dict:
+        return dict(self)
+
+class _SharedRows(Sequence):
+    '''Séquence des éléments d'un dataset en mémoire partagée'''
+    def __init__(self, columns: dict[Hashable, _Column], length: int) -> None:
+        self.__columns = columns
+        self.__length = length
+
+    def __len__(self) -> int:
+        return self.__length
+
+    def __getitem__(self, index: int | slice) -> _SharedRow | list[_SharedRow]:
+        if isinstance(index, slice):
+            return [ self[position] for position in range(*index.indices(self.__length)) ]
+        if index < 0:
+            index += self.__length
+        if not 0 <= index < self.__length:
+            raise IndexError(f'{__class__.__name__} index out of range')
+        return _SharedRow(self.__columns, index)
+
+def _tracked_name(memory: shared_memory.SharedMemory) -> str | None:
+    '''Nom sous lequel le resource_tracker suit le segment : le nom public précédé de /,
+    None hors POSIX où les segments ne sont pas suivis'''
+    return '/' + memory.name if os.name == 'posix' else None
+
+def _release(memory: shared_memory.SharedMemory, views: list[memoryview], unlink: bool) -> None:
+    '''Libère les vues puis ferme, et détruit le cas échéant, un segment de mémoire partagée'''
+    for view in reversed(views):
+        view.release()
+    views.clear()
+    try:
+        memory.close()
+        if unlink:
+            # Le resource_tracker est commun aux processus lancés par multiprocessing, et n'y suit qu'une fois chaque segment :
+            # un processus rattaché qui l'en a désinscrit (voir SharedDataset._attach) l'a aussi désinscrit pour le publieur.
+            # unlink désinscrit le segment : on l'y réinscrit d'abord, sans quoi le resource_tracker signale une erreur
+            tracked_name = _tracked_name(memory)
+            if tracked_name is not None:
+                resource_tracker.register(tracked_name, 'shared_memory')
+            memory.unlink()
+    except FileNotFoundError:
+        pass
+
+class SharedDataset(DatasetSnapshot):
+    '''Dataset en lecture seule stocké par colonnes en mémoire partagée.
+    Une instance transmise à un autre processus (multiprocessing) n'y est transmise que par son nom.'''
+
+    @classmethod
+    def _publish(cls, dataset: Dataset, name: str=None) -> Self:
+        elements = list(dataset.raw_dataset)
+        fields = [ ]
+        for element in elements:
+            for key in element:
+                if key not in fields:
+                    fields.append(key)
+        # Encodage des colonnes
+        buffers = [ ]
+        metadata = { 'name': str(dataset).strip('`'), 'length': len(elements), 'columns': [ ] }
+        offset = 0
+        for field in fields:
+            states = bytearray(_PRESENT if field in element and element[field] is not None
+                                else (_NONE if field in element else _MISSING) for element in elements)
+            values = [ element.get(field, None) for element in elements ]
+            kind = _column_kind(values)
+            layout = [ ]
+            for fmt, data in _encode_column(values, states, kind):
+                offset = _align(offset)
+                layout.append((fmt, offset, len(data)))
+                buffers.append((offset, data))
+                offset += len(data)
+            metadata['columns'].append((field, kind, layout))
+        header = pickle.dumps(metadata)
+        data_start = _align(_header.size + len(header))
+        memory = shared_memory.SharedMemory(name=name, create=True, size=max(1, data_start + offset))
+        memory.buf[:_header.size] = _header.pack(len(header))
+        memory.buf[_header.size:_header.size + len(header)] = header
+        for position, data in buffers:
+            memory.buf[data_start + position:data_start + position + len(data)] = data
+        return cls(memory, owner=True)
+
+    @classmethod
+    def _attach(cls, name: str) -> Self:
+        memory = shared_memory.SharedMemory(name=name)
+        # SharedMemory inscrit aussi au resource_tracker les segments auxquels on se rattache, et le resource_tracker
+        # détruit les segments inscrits à la sortie du processus. Le segment appartient au processus qui l'a publié :
+        # on l'en désinscrit pour qu'il survive à ce processus
+        tracked_name = _tracked_name(memory)
+        if tracked_name is not None:
+            try:
+                resource_tracker.unregister(tracked_name, 'shared_memory')
+            except Exception:
+                pass
+        return cls(memory, owner=False)
+
+    def __init__(self, memory: shared_memory.SharedMemory, owner: bool=False) -> None:
+        '''Utiliser publish ou attach plutôt que le constructeur'''
+        views = [ ]
+        header_size = _header.unpack(memory.buf[:_header.size])[0]
+        metadata = pickle.loads(memory.buf[_header.size:_header.size + header_size])
+        data_start = _align(_header.size + header_size)
+        columns = { }
+        for field, kind, layout in metadata['columns']:
+            column_views = [ ]
+            for fmt, offset, size in layout:
+                view = memory.buf[data_start + offset:data_start + offset + size]
+                views.append(view)
+                if fmt != 'B':
+                    view = view.cast(fmt)
+                    views.append(view)
+                column_views.append(view)
+            columns[field] = _Column(kind, column_views)
+        super().__init__(_SharedRows(columns, metadata['length']), name=metadata['name'] or None)
+        self.__memory = memory
+        self.__views = views
+        self.__owner = owner
+        # Libération à la destruction de la vue, ou à la sortie de l'interpréteur
+        self.__finalizer = weakref.finalize(self, _release, memory, views, owner)
+
+    def __reduce__(self) -> tuple:
+        return (attach, (self.shm_name, ))
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.__owner:
+            self.unlink()
+        else:
+            self.close()
+
+    @property
+    def shm_name(self) -> str:
+        '''Nom du segment de mémoire partagée, à transmettre à attach'''
+        return self.__memory.name
+
+    def close(self) -> None:
+        '''Détache le segment de ce processus, sans le détruire'''
+        self.__finalizer.detach()
+        _release(self.__memory, self.__views, unlink=False)
+
+    def unlink(self) -> None:
+        '''Détache et détruit le segment : les autres processus n'y ont plus accès une fois détachés'''
+        self.__finalizer.detach()
+        _release(self.__memory, self.__views, unlink=True)
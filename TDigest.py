@@ -0,0 +1,98 @@
+from typing import Self
+import math
+'''
+t-digest
+
+Estimation des quantiles d'une distribution en mémoire bornée : les valeurs sont résumées par des centroïdes
+(moyenne, poids), d'autant plus fins qu'ils sont proches des extrémités de la distribution
+'''
+
+class TDigest:
+    '''Résumé de distribution permettant d'estimer ses quantiles, fusionnable avec d'autres résumés'''
+    def __init__(self, compression: float=100) -> None:
+        '''compression : nombre de centroïdes visé, la précision augmente avec lui'''
+        self.__compression: float = compression
+        # Centroïdes [ moyenne, poids ] triés par moyenne, et valeurs ajoutées depuis le dernier regroupement
+        self.__centroids: list[list[float]] = [ ]
+        self.__buffer: list[tuple[float, float]] = [ ]
+        self.__count: float = 0
+        self.__min: float = math.inf
+        self.__max: float = -math.inf
+
+    def __repr__(self) -> str:
+        self.__compress()
+        return f'<{self.__class__.__name__}: {self.__count:g} items, {len(self.__centroids)} centroids>'
+
+    def __len__(self) -> int:
+        return int(self.__count)
+
+    def add(self, value: float, weight: float=1) -> Self:
+        '''Ajoute une valeur au résumé'''
+        self.__buffer.append((value, weight))
+        self.__count += weight
+        self.__min = min(self.__min, value)
+        self.__max = max(self.__max, value)
+        if len(self.__buffer) >= 8 * self.__compression:
+            self.__compress()
+        return self
+
+    def merge(self, other: 'TDigest') -> Self:
+        '''Ajoute au résumé les valeurs résumées par other'''
+        other.__compress()
+        self.__buffer += [ (mean, weight) for mean, weight in other.__centroids ]
+        self.__count += other.__count
+        self.__min = min(self.__min, other.__min)
+        self.__max = max(self.__max, other.__max)
+        self.__compress()
+        return self
+
+    def __scale(self, quantile: float) -> float:
+        '''Fonction d'échelle k1 : un centroïde couvre au plus une unité d'échelle'''
+        return self.__compression / (2 * math.pi) * math.asin(2 * quantile - 1)
+
+    def __inverse_scale(self, scale: float) -> float:
+        scale = min(scale, self.__compression / 4)
+        return (math.sin(scale * 2 * math.pi / self.__compression) + 1) / 2
+
+    def __compress(self) -> None:
+        '''Regroupe les centroïdes et les valeurs en attente en une nouvelle liste de centroïdes'''
+        if not self.__buffer:
+            return
+        values = sorted(self.__centroids + [ [ value, weight ] for value, weight in self.__buffer ], key=lambda centroid: centroid[0])
+        self.__buffer = [ ]
+        centroids = [ values[0] ]
+        cumulated = 0
+        limit = self.__inverse_scale(self.__scale(0) + 1) * self.__count
+        for mean, weight in values[1:]:
+            current = centroids[-1]
+            if cumulated + current[1] + weight <= limit:
+                current[1] += weight
+                current[0] += (mean - current[0]) * weight / current[1]
+            else:
+                cumulated += current[1]
+                limit = self.__inverse_scale(self.__scale(cumulated / self.__count) + 1) * self.__count
+                centroids.append([ mean, weight ])
+        self.__centroids = centroids
+
+    def quantile(self, quantile: float) -> float | None:
+        '''Estimation de la valeur du quantile (entre 0 et 1) de la distribution, None si le résumé est vide'''
+        if not 0 <= quantile <= 1:
+            raise ValueError(f'Quantile must be between 0 and 1, got {quantile}')
+        self.__compress()
+        if not self.__centroids:
+            return None
+        target = quantile * self.__count
+        # Interpolation linéaire entre les centres des centroïdes, et entre les extrêmes et les centroïdes extrêmes
+        previous_position, previous_value = 0, self.__min
+        cumulated = 0
+        for mean, weight in self.__centroids:
+            position = cumulated + weight / 2
+            if target < position:
+                if position == previous_position:
+                    return mean
+                return previous_value + (mean - previous_value) * (target - previous_position) / (position - previous_position)
+            previous_position, previous_value = position, mean
+            cumulated += weight
+        if self.__count == previous_position:
+            return self.__max
+        return previous_value + (self.__max - previous_value) * (target - previous_position) / (self.__count - previous_position)
@@ -0,0 +1,65 @@
+from CompositeIterator import CompositeIterator
+import itertools
+
+import unittest
+
+class TestCompositeIterator(unittest.TestCase):
+
+    objects = ([ 1, 2, 3 ], 'ab', range(2))
+
+    def test_order(self):
+        # Le dernier objet varie le plus vite, comme itertools.product...
+        self.assertEqual(list(CompositeIterator(*self.objects)), [ list(combination) for combination in itertools.product(*self.objects) ])
+        # ... ou le premier
+        expected = [ list(combination[::-1]) for combination in itertools.product(*self.objects[::-1]) ]
+        self.assertEqual(list(CompositeIterator(*self.objects, right_to_left=False)), expected)
+        # Chaque combinaison est une nouvelle liste, sauf à réutiliser le tampon
+        combinations = list(CompositeIterator(*self.objects))
+        self.assertIsNot(combinations[0], combinations[1])
+        reused = [ id(combination) for combination in CompositeIterator(*self.objects, reuse_buffer=True) ]
+        self.assertEqual(len(set(reused)), 1)
+        # Un itérateur épuisé le reste, jusqu'à une nouvelle itération
+        iterator = iter(CompositeIterator(*self.objects))
+        for _ in range(12):
+            next(iterator)
+        for _ in range(2):
+            self.assertRaises(StopIteration, next, iterator)
+        self.assertEqual(len(list(iterator)), 12)
+
+    def test_empty(self):
+        self.assertEqual(list(CompositeIterator([ 1, 2 ], [ ])), [ ])
+        self.assertEqual(list(CompositeIterator([ ], [ 1, 2 ], right_to_left=False)), [ ])
+        # Sans objet, une seule combinaison, vide
+        self.assertEqual(list(CompositeIterator()), [ [ ] ])
+        self.assertEqual(list(map(list, CompositeIterator([ 1 ], [ ]).blocks())), [ ])
+
+    def test_single(self):
+        self.assertEqual(list(CompositeIterator('abc')), [ [ 'a' ], [ 'b' ], [ 'c' ] ])
+        self.assertEqual(list(CompositeIterator('abc', right_to_left=False)), [ [ 'a' ], [ 'b' ], [ 'c' ] ])
+
+    def test_deep(self):
+        # Plus d'objets que la limite de récursion
+        objects = [ (0, 1) ] + [ (index, ) for index in range(3000) ]
+        combinations = list(CompositeIterator(*objects))
+        self.assertEqual(combinations, [ list(combination) for combination in itertools.product(*objects) ])
+        combinations = list(CompositeIterator(*objects, right_to_left=False))
+        self.assertEqual([ combination[0] for combination in combinations ], [ 0, 1 ])
+
+    def test_blocks(self):
+        expected = list(itertools.product(*self.objects))
+        for right_to_left in (True, False):
+            for block_size in (1, 4, 12, 13, 100):
+                iterator = CompositeIterator(*self.objects, right_to_left=right_to_left)
+                blocks = [ list(block) for block in iterator.blocks(block_size) ]
+                self.assertTrue(all(len(block) == block_size for block in blocks[:-1]))
+                self.assertTrue(0 < len(blocks[-1]) <= block_size)
+                combinations = list(itertools.chain.from_iterable(blocks))
+                self.assertEqual(combinations, [ tuple(combination) for combination in iterator ])
+                if right_to_left:
+                    self.assertEqual(combinations, expected)
+        # Objets qui ne sont pas des séquences : même ordre, sans itertools.product
+        iterator = CompositeIterator(*map(iter, self.objects[:1]), *self.objects[1:])
+        self.assertEqual([ list(block) for block in iterator.blocks(5) ], [ expected[:5], expected[5:10], expected[10:] ])
+
+if __name__ == '__main__':
+    unittest.main()
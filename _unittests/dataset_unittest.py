@@ -1,5 +1,9 @@
 import unittest
-from Dataset import Dataset, DatasetField, Expression
+from Dataset import Dataset, DatasetField, Expression, CSVDataset, JSONLDataset, categorical
+import datetime
+import io
+import os
+import tempfile
 import operator
 
 dataset_name = 'TestDataset'
@@ -88,6 +92,21 @@ class TestExpression(unittest.TestCase):
             self.assertEqual(func_expression.value, element.index * 2)
             
 
+    def test_ShortCircuit(self):
+        calls = [ ]
+        def expensive(value):
+            calls.append(value)
+            return True
+        and_expression = (self.dataset.amount > 2) & self.dataset.amount.func(expensive)
+        or_expression = (self.dataset.amount > 2) | self.dataset.amount.func(expensive)
+        for element in self.dataset:
+            self.assertEqual(and_expression.match, element.index > 2)
+        self.assertEqual(calls, [ 3, 4 ])
+        calls.clear()
+        for element in self.dataset:
+            self.assertTrue(or_expression.match)
+        self.assertEqual(calls, [ 0, 1, 2 ])
+
 class TestDataset(unittest.TestCase):
 
     data = test_data.copy()
@@ -131,9 +150,163 @@ class TestDataset(unittest.TestCase):
         field = self.dataset.element
         self.assertEqual(field.name, 'element')
         self.assertEqual(field.alias, 'element')
-        field.as_('AliasedField')
-        self.assertEqual(field.name, 'element')
-        self.assertEqual(field.alias, 'AliasedField')
+        aliased = field.as_('AliasedField')
+        self.assertEqual(aliased.name, 'element')
+        self.assertEqual(aliased.alias, 'AliasedField')
+        # Le champ du dataset est partagé : il garde son nom
+        self.assertIs(self.dataset.element, field)
+        self.assertEqual(field.alias, 'element')
+        # Un champ qui porte le nom d'une propriété du dataset reste accessible par son nom
+        versions = Dataset([ { 'version': 2 }, { 'current': 3 } ])
+        self.assertIsInstance(versions.version, int)
+        self.assertIsInstance(versions['version'], DatasetField)
+        self.assertIsInstance(versions.current, DatasetField)
+        versions.move_to(0)
+        self.assertEqual(versions['version'].value, 2)
+
+    def test_cursor(self):
+        self.assertEqual(list(self.dataset.cursor([ 3, 1 ])), [ 3, 1 ])
+        self.assertIs(self.dataset._current, self.dataset.raw_dataset[1])
+        self.assertEqual(self.dataset.amount.value, 1)
+        total = 0
+        for index in self.dataset.cursor():
+            self.assertEqual(self.dataset._current['amount'], index)
+            total += self.dataset.amount.value
+        self.assertEqual(total, sum(range(len(self.dataset))))
+        self.assertEqual(self.dataset.move_to(2)['element'], 'Element 2')
+        self.assertEqual(self.dataset.current_element.index, 2)
+
+class TestConcatenation(unittest.TestCase):
+
+    def test_lazy_add(self):
+        parts = [ Dataset([ { 'day': day, 'hour': hour } for hour in range(3) ]) for day in range(4) ]
+        joined = parts[0] + parts[1] + parts[2] + parts[3]
+        self.assertEqual(len(joined), 12)
+        self.assertEqual([ element.data['day'] for element in joined ], [ day for day in range(4) for _ in range(3) ])
+        self.assertEqual(joined.seek(7).data, { 'day': 2, 'hour': 1 })
+        self.assertEqual(joined.seek(11).data, { 'day': 3, 'hour': 2 })
+        # Les éléments ne sont pas copiés...
+        self.assertIs(joined.seek(4).data, parts[1].raw_dataset[1])
+        # ... mais la concaténation ne voit pas les ajouts ultérieurs
+        parts[0] += Dataset([ { 'day': 0, 'hour': 3 } ])
+        self.assertEqual(len(parts[0]), 4)
+        self.assertEqual(len(joined), 12)
+        # La matérialisation n'a lieu qu'à la demande
+        self.assertEqual(joined.raw_dataset, [ { 'day': day, 'hour': hour } for day in range(4) for hour in range(3) ])
+        self.assertIsInstance(joined.raw_dataset, list)
+
+class TestSample(unittest.TestCase):
+
+    dataset = Dataset([ { 'id': index } for index in range(10000) ], name='Numbers')
+
+    def test_sample(self):
+        sample = self.dataset.sample(0.1, seed=1)
+        self.assertTrue(800 < len(sample) < 1200)
+        self.assertEqual(sample.raw_dataset, self.dataset.sample(0.1, seed=1).raw_dataset)
+        # Les éléments ne sont pas copiés, et leur unité de tirage est leur index
+        self.assertIs(sample.raw_dataset[0], self.dataset.raw_dataset[sample.units[0]])
+        blocks = self.dataset.sample(0.5, seed=1, method='block', block_size=100)
+        self.assertEqual(len(blocks) % 100, 0)
+        self.assertTrue(all(element['id'] // 100 == unit for element, unit in zip(blocks.raw_dataset, blocks.units)))
+        self.assertEqual(len(self.dataset.sample(1.0)), len(self.dataset))
+        self.assertEqual(len(self.dataset.sample(0.0)), 0)
+        with self.assertRaises(ValueError):
+            self.dataset.sample(0.1, method='system')
+
+class TestTable(unittest.TestCase):
+
+    dataset = Dataset([ { 'id': index, 'name': f'Element {index}' } for index in range(100) ])
+
+    def test_to_table(self):
+        output = io.StringIO()
+        self.dataset.to_table(file=output, offset=10, page_size=5)
+        lines = output.getvalue().splitlines()
+        # Séparateur, en-tête, séparateur, 5 lignes, séparateur
+        self.assertEqual(len(lines), 9)
+        self.assertEqual(lines[1], '| id |    name    |')
+        self.assertEqual(lines[3], '| 10 | Element 10 |')
+        self.assertEqual(lines[7], '| 14 | Element 14 |')
+
+    def test_to_table_widths(self):
+        output = io.StringIO()
+        self.dataset.to_table(file=output, max_rows=2, widths={ 'name': 6 }, buffer_lines=1)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(lines[3], '|  0 | Ele... |')
+
+    def test_to_table_sample(self):
+        dataset = Dataset([ { 'id': index } for index in range(5) ] + [ { 'id': 5, 'late': 'Late value' } ])
+        # Par défaut, les largeurs sont mesurées sur toute la page
+        output = io.StringIO()
+        dataset.to_table(file=output)
+        self.assertEqual(output.getvalue().splitlines()[-2], '|  5 | Late value |')
+        # Une colonne absente de l'échantillon est tout de même affichée
+        output = io.StringIO()
+        dataset.to_table(file=output, sample_size=2)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(lines[1], '| id | late |')
+        self.assertEqual(lines[-2], '|  5 | L... |')
+
+class TestCSVDataset(unittest.TestCase):
+
+    csv_data = (
+        'id,price,day,status,label\n'
+        '1,2.5,2024-01-02,ok,first\n'
+        '2,3,2024-02-03,ok,second\n'
+        '3,,2024-02-04,ko,third\n'
+        '4,1e3,2024-02-05,ok,fourth\n'
+    )
+
+    def test_schema(self):
+        dataset = CSVDataset().from_file(io.StringIO(self.csv_data), schema={ 'id': int, 'day': datetime.date })
+        self.assertEqual(dataset.schema, { 'id': int, 'day': datetime.date })
+        self.assertEqual(dataset.raw_dataset[0]['id'], 1)
+        self.assertEqual(dataset.raw_dataset[0]['day'], datetime.date(2024, 1, 2))
+        self.assertEqual(dataset.raw_dataset[0]['price'], '2.5')
+        # Le schéma déclaré est strict
+        with self.assertRaises(ValueError):
+            CSVDataset().from_file(io.StringIO(self.csv_data), schema={ 'label': int })
+
+    def test_infer_types(self):
+        dataset = CSVDataset().from_file(io.StringIO(self.csv_data), infer_types=True)
+        self.assertEqual(dataset.schema['id'], int)
+        self.assertEqual(dataset.schema['price'], float)
+        self.assertEqual(dataset.schema['day'], datetime.date)
+        self.assertEqual(dataset.schema['status'], categorical)
+        self.assertEqual(dataset.schema['label'], str)
+        self.assertEqual([ element['price'] for element in dataset.raw_dataset ], [ 2.5, 3.0, None, 1000.0 ])
+        for element in dataset:
+            self.assertEqual((dataset.id > 2).match, element.index >= 2)
+
+class TestJSONLDataset(unittest.TestCase):
+
+    dataset = Dataset([ { 'id': index, 'name': f'Element {index}', 'tags': [ index % 3 ] } for index in range(50) ])
+
+    def test_read_write(self):
+        output = io.StringIO()
+        JSONLDataset(self.dataset.raw_dataset).to_file(output, buffer_lines=7)
+        self.assertEqual(len(output.getvalue().splitlines()), 50)
+        output.seek(0)
+        loaded = JSONLDataset(name='Loaded').from_file(output, chunk_size=8)
+        self.assertEqual(loaded.raw_dataset, self.dataset.raw_dataset)
+        self.assertEqual(str(loaded), '`Loaded`')
+        # Chaque dataset vide a sa propre liste d'éléments
+        empty = JSONLDataset()
+        empty += self.dataset
+        self.assertEqual(len(JSONLDataset()), 0)
+        # Projection : seuls les champs demandés sont gardés
+        output.seek(0)
+        chunks = list(JSONLDataset.chunks(output, fields=[ 'id', loaded.tags ], chunk_size=20))
+        self.assertEqual([ len(chunk) for chunk in chunks ], [ 20, 20, 10 ])
+        self.assertEqual(chunks[2].raw_dataset[0], { 'id': 40, 'tags': [ 1 ] })
+
+    def test_read_parallel(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'data.jsonl')
+            with open(path, 'w') as file:
+                JSONLDataset(self.dataset.raw_dataset).to_file(file)
+            loaded = JSONLDataset.read_parallel(path, fields=[ 'id' ], workers=3)
+        self.assertEqual(loaded.raw_dataset, [ { 'id': index } for index in range(50) ])
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,5 +1,16 @@
-from Dataset import Dataset
-from DatasetQuery import select, update, delete, alter, desc, UpdateElement
+from Dataset import Dataset, categorical
+from DatasetQuery import select, update, delete, alter, insert, merge, desc, UpdateElement
+from DatasetQuery import enable_result_cache, disable_result_cache, count, sum_, avg, Estimate
+from DatasetQuery import approx_count_distinct, approx_percentile
+from DatasetQuery import row_number, lag, lead, running_sum, param
+from DatasetQuery import QueryObserver, SlowQueryLog, add_observer, remove_observer, ResourceLimitError
+from HyperLogLog import HyperLogLog
+from DatasetQuery import _Clauses
+import DatasetQuery
+from SharedDataset import publish, attach
+from SQLiteDataset import SQLiteDataset
+import multiprocessing
+import sqlite3
 
 import unittest
 
@@ -59,6 +70,11 @@ def copy_dataset(dataset: Dataset) -> Dataset:
     new_set = [ item.copy() for item in dataset.raw_dataset ]
     return Dataset(new_set)
 
+def count_sides(arguments: tuple) -> int:
+    '''Exécutée dans un autre processus : le dataset partagé y est transmis par son nom'''
+    shared, sides = arguments
+    return len(select().from_(shared).where(shared.sides == sides).execute())
+
 class test_SelectQuery(unittest.TestCase):
 
     def test_SimpleQuery(self):
@@ -95,6 +111,100 @@ class test_SelectQuery(unittest.TestCase):
         result = query.execute()
         self.assertEqual(result.raw_dataset, full_dataset.raw_dataset)
     
+    def test_MergeJoin(self):
+        shapes = Dataset([ { 'name': name } for name in ('octogon', 'square', 'triangle', 'circle', 'square') ], name='Shapes')
+        query = (
+            select(shapes.name, sides_dataset.sides)
+            .from_(shapes)
+            .join(sides_dataset).on(sides_dataset.shape == shapes.name)
+        )
+        self.assertEqual(query._plan_join(0).strategy, 'merge')
+        # Même résultat, dans le même ordre, qu'une boucle imbriquée
+        nested = (
+            select(shapes.name, sides_dataset.sides)
+            .from_(shapes)
+            .join(sides_dataset).on((sides_dataset.shape == shapes.name).func(bool))
+        )
+        self.assertEqual(nested._plan_join(0).strategy, 'nested loop')
+        self.assertEqual(query.execute().raw_dataset, nested.execute().raw_dataset)
+        self.assertEqual(len(query.execute()), 4)
+
+    def test_JoinNullKeys(self):
+        left = Dataset([ { 'id': 1, 'k': None }, { 'id': 2 }, { 'id': 3, 'k': 'a' } ], name='Left')
+        right = Dataset([ { 'k': 'a', 'label': 'A' }, { 'k': None, 'label': 'none' } ], name='Right')
+        # None == None : l'équi-jointure garde les mêmes combinaisons que la boucle imbriquée et que la clause WHERE
+        query = select(left.id, right.label).from_(left).join(right).on(left.k == right.k)
+        self.assertEqual(query._plan_join(0).strategy, 'merge')
+        expected = [ { 'id': 1, 'label': 'none' }, { 'id': 2, 'label': 'none' }, { 'id': 3, 'label': 'A' } ]
+        self.assertEqual(query.execute().raw_dataset, expected)
+        where = select(left.id, right.label).from_(left).join(right).where(left.k == right.k)
+        self.assertEqual(where.execute().raw_dataset, expected)
+        # Le filtre de Bloom garde les clés nulles
+        filtered = select(left.id).from_(left).join(right).on(left.k == right.k).where(right.label == 'none')
+        self.assertEqual(filtered.execute().raw_dataset, [ { 'id': 1 }, { 'id': 2 } ])
+
+    def test_RangeJoin(self):
+        events = Dataset([ { 'ts': ts } for ts in (12, 3, 7, 25, 18, 0, None) ], name='Events')
+        windows = Dataset([
+            { 'label': 'first', 'start': 0, 'end': 10 },
+            { 'label': 'second', 'start': 10, 'end': 20 },
+            { 'label': 'overlap', 'start': 5, 'end': 15 },
+        ], name='Windows')
+        query = (
+            select(events.ts, windows.label)
+            .from_(windows)
+            .join(events).on((events.ts >= windows.start) & (events.ts < windows.end))
+        )
+        self.assertEqual(query._plan_join(0).strategy, 'range')
+        result = query.execute()
+        expected = [
+            { 'ts': 3, 'label': 'first' },
+            { 'ts': 7, 'label': 'first' },
+            { 'ts': 0, 'label': 'first' },
+            { 'ts': 12, 'label': 'second' },
+            { 'ts': 18, 'label': 'second' },
+            { 'ts': 12, 'label': 'overlap' },
+            { 'ts': 7, 'label': 'overlap' },
+        ]
+        self.assertEqual(result.raw_dataset, expected)
+        # Dans l'autre sens, ce sont les événements qui sont triés
+        query = (
+            select(events.ts, windows.label)
+            .from_(events)
+            .join(windows).on((events.ts >= windows.start) & (events.ts < windows.end))
+        )
+        plan = query._plan_join(0)
+        self.assertEqual((plan.strategy, plan.sorted_side), ('range', 'left'))
+        self.assertEqual(
+            sorted(map(lambda x: tuple(x.values()), query.execute().raw_dataset)),
+            sorted(map(lambda x: tuple(x.values()), expected))
+        )
+
+    def test_BloomFilterSemiJoin(self):
+        sales = Dataset([ { 'shape': shape, 'color': color, 'amount': amount }
+                            for amount, (shape, color) in enumerate([ ('triangle', 'red'), ('square', 'blue'), ('octogon', 'red'),
+                                                                    ('square', 'red'), ('circle', 'blue'), ('triangle', 'blue') ]) ],
+                        name='Sales')
+        query = (
+            select(sales.amount, sides_dataset.sides)
+            .from_(sales)
+            .join(sides_dataset).on(sides_dataset.shape == sales.shape)
+            .join(colors_dataset).on(colors_dataset.name == sales.color)
+            .where((sides_dataset.sides == 4) & (colors_dataset.name == 'red'))
+        )
+        result = query.execute()
+        self.assertEqual(result.raw_dataset, [ { 'amount': 3, 'sides': 4 } ])
+        # Seules les ventes de carrés passent le premier filtre, puis seules les rouges le second
+        self.assertEqual([ removed for _, _, removed in query._semi_join_stats ], [ 4, 1 ])
+        self.assertIn('BLOOM FILTER', query.explain())
+        # Chaque dataset n'est parcouru qu'une fois : les datasets filtrés fournissent leurs candidats à la jointure
+        class Counters(QueryObserver):
+            def query_finished(self, query, fingerprint, duration, counters):
+                self.counters = counters
+        counters = Counters()
+        query.observe(counters).execute()
+        self.assertEqual(counters.counters['rows_scanned'], len(sales) + len(sides_dataset) + len(colors_dataset))
+
     def test_OrderAndLimit(self):
         query = (
             select()
@@ -112,6 +222,508 @@ class test_SelectQuery(unittest.TestCase):
         ]
         self.assertEqual(result.raw_dataset, expected)
 
+    def test_ZoneMaps(self):
+        dataset = Dataset([ { 'ts': ts, 'even': ts % 2 == 0 } for ts in range(1000) ], name='Timestamps')
+        dataset.zone_map(dataset.ts, block_size=100)
+        query = select(dataset.ts).from_(dataset).where((dataset.ts >= 950) & dataset.even)
+        # Seul le dernier bloc est parcouru
+        self.assertEqual(query._scan(dataset), list(range(900, 1000)))
+        self.assertEqual([ element['ts'] for element in query.execute().raw_dataset ], list(range(950, 1000, 2)))
+        # Les résumés sont recalculés après modification
+        update(dataset).set_(UpdateElement(dataset.ts, dataset.ts + 1000)).where(dataset.ts < 100).execute()
+        self.assertEqual(query._scan(dataset), list(range(0, 100)) + list(range(900, 1000)))
+        delete().from_(dataset).where(dataset.ts == 1050).execute()
+        self.assertEqual(len(dataset), 999)
+        self.assertEqual(len(select().from_(dataset).where(dataset.ts > 1000).execute()), 98)
+
+    def test_CastAfterUpdate(self):
+        dataset = Dataset([ { 'n': index } for index in range(3) ], name='Typed', schema={ 'n': int, 'label': str })
+        cast = select(dataset.n.cast_as(int)).from_(dataset).prepare()
+        self.assertEqual(cast.execute().raw_dataset, [ { 'n': 0 }, { 'n': 1 }, { 'n': 2 } ])
+        # Une écriture qui ne respecte pas le type le retire du schéma : le transtypage est de nouveau exécuté
+        update(dataset).set_(UpdateElement(dataset.n, '7')).where(dataset.n == 1).execute()
+        self.assertEqual(dataset.schema, { 'label': str })
+        self.assertEqual([ row['n'] for row in select(dataset.n.cast_as(int)).from_(dataset).execute().raw_dataset ], [ 0, 7, 2 ])
+        self.assertEqual([ row['n'] for row in cast.execute().raw_dataset ], [ 0, 7, 2 ])
+        # Une modification hors requête ne garantit plus aucun type
+        dataset.touch()
+        self.assertEqual(dataset.schema, { })
+
+    def test_ZoneMapsAfterDelete(self):
+        dataset = Dataset([ { 'ts': ts } for ts in range(10) ], name='Deleted')
+        dataset.zone_map('ts', block_size=5)
+        query = select(dataset.ts).from_(dataset).where(dataset.ts >= 5)
+        self.assertEqual(query._scan(dataset), list(range(5, 10)))
+        delete().from_(dataset).where(dataset.ts < 3).execute()
+        # Les blocs sont recalculés sur les éléments restants
+        self.assertEqual([ element['ts'] for element in query.execute().raw_dataset ], [ 5, 6, 7, 8, 9 ])
+
+    def test_DictionaryEncoding(self):
+        dataset = Dataset([ { 'id': index, 'status': ''.join([ 'o', 'k' if index % 3 else 'o' ]) } for index in range(30) ], name='Statuses')
+        dataset.dictionary_encode(dataset.status)
+        self.assertEqual(dataset.dictionary('status').values, [ 'oo', 'ok' ])
+        self.assertIs(dataset.raw_dataset[1]['status'], dataset.raw_dataset[2]['status'])
+        # La constante comparée est celle du dictionnaire
+        self.assertIs((dataset.status == ''.join([ 'o', 'k' ])).args[1], dataset.raw_dataset[1]['status'])
+        # Une chaîne absente du dictionnaire ne peut correspondre à aucun élément
+        query = select(dataset.id).from_(dataset).where(dataset.status == 'ko')
+        self.assertEqual(list(query._scan(dataset)), [ ])
+        self.assertEqual(len(query.execute()), 0)
+        self.assertEqual(len(select().from_(dataset).where(dataset.status.in_([ 'oo', 'ko' ])).execute()), 10)
+        self.assertEqual(len(select(dataset.status).from_(dataset).distinct().execute()), 2)
+        # Le dictionnaire est complété par les seuls éléments modifiés par une requête
+        dictionary = dataset.dictionary('status')
+        update(dataset).set_(UpdateElement(dataset.status, ''.join([ 'k', 'o' ]))).where(dataset.id == 0).execute()
+        self.assertIs(dataset.dictionary('status'), dictionary)
+        self.assertEqual(dictionary.values, [ 'oo', 'ok', 'ko' ])
+        self.assertIs(dataset.raw_dataset[0]['status'], categorical('ko'))
+        self.assertEqual(len(query.execute()), 1)
+        insert().into(dataset).values({ 'id': 30, 'status': ''.join([ 'n', 'o' ]) }).execute()
+        delete().from_(dataset).where(dataset.id == 1).execute()
+        self.assertIs(dataset.dictionary('status'), dictionary)
+        self.assertEqual(dictionary.values, [ 'oo', 'ok', 'ko', 'no' ])
+        self.assertIs(dataset.raw_dataset[-1]['status'], categorical('no'))
+        # Après une modification hors requête, le dictionnaire est recalculé
+        dataset.raw_dataset[0]['status'] = 'ok'
+        dataset.touch()
+        self.assertEqual(dataset.dictionary('status').values, [ 'ok', 'oo', 'no' ])
+
+    def test_ResultCache(self):
+        dataset = copy_dataset(full_dataset)
+        def query():
+            return select(dataset.shape, dataset.sides).from_(dataset).where(dataset.sides > 3)
+        enable_result_cache(max_entries=2)
+        try:
+            first = query().execute()
+            second = query().execute()
+            self.assertEqual(DatasetQuery._result_cache.hits, 1)
+            self.assertEqual(first.raw_dataset, second.raw_dataset)
+            # Le résultat retourné est une copie
+            second.raw_dataset[0]['sides'] = 0
+            self.assertEqual(query().execute().raw_dataset, first.raw_dataset)
+            # Une modification du dataset invalide le résultat
+            version = dataset.version
+            update(dataset).set_(UpdateElement(dataset.sides, 5)).where(dataset.shape == 'square').execute()
+            self.assertNotEqual(dataset.version, version)
+            self.assertEqual([ element['sides'] for element in query().execute().raw_dataset ], [ 5, 5 ])
+            self.assertEqual(DatasetQuery._result_cache.misses, 2)
+        finally:
+            disable_result_cache()
+
+    def test_Snapshot(self):
+        dataset = copy_dataset(updated_dataset)
+        before = [ element.copy() for element in dataset.raw_dataset ]
+        snapshot = dataset.snapshot()
+        update(dataset).set_(UpdateElement(dataset.sides, 0)).where(dataset.shape == 'square').execute()
+        # Seuls les éléments modifiés ont été copiés
+        self.assertIs(snapshot.raw_dataset[0], dataset.raw_dataset[0])
+        self.assertIsNot(snapshot.raw_dataset[2], dataset.raw_dataset[2])
+        alter(dataset).drop(dataset.description).execute()
+        delete().from_(dataset).where(dataset.color == 'blue').execute()
+        dataset += Dataset([ { 'shape': 'circle' } ])
+        # L'instantané n'a vu aucune modification...
+        self.assertEqual(snapshot.raw_dataset, before)
+        self.assertEqual(len(select().from_(snapshot).where(snapshot.sides == 4).execute()), 2)
+        self.assertEqual(dataset.raw_dataset, [
+            { 'shape': 'triangle', 'color': 'red', 'sides': 3, 'even': False },
+            { 'shape': 'square', 'color': 'red', 'sides': 0, 'even': True },
+            { 'shape': 'circle' },
+        ])
+        # Un instantané est en lecture seule
+        with self.assertRaises(TypeError):
+            update(snapshot).set_(UpdateElement(snapshot.sides, 0)).execute()
+        with self.assertRaises(TypeError):
+            snapshot += dataset
+
+    def test_AdaptiveClauses(self):
+        dataset = Dataset([ { 'id': index } for index in range(4096) ], name='Numbers')
+        def expensive(value):
+            return sum(range(200)) > 0
+        # Le terme coûteux et non sélectif est déclaré en premier
+        costly = dataset.id.func(expensive)
+        selective = dataset.id < 10
+        where = _Clauses(costly & selective)
+        matched = 0
+        for element in dataset:
+            matched += where.match
+        self.assertEqual(matched, 10)
+        self.assertIs(where.clauses[0], selective)
+
+    def test_Aggregates(self):
+        query = select(full_dataset.shape, count().as_('count'), sum_(full_dataset.sides).as_('sides')).from_(full_dataset).order_by(desc(full_dataset.shape))
+        self.assertEqual(query.execute().raw_dataset, [
+            { 'shape': 'triangle', 'count': 2, 'sides': 6 },
+            { 'shape': 'square', 'count': 2, 'sides': 8 },
+        ])
+        result = select(count(), avg(full_dataset.sides).as_('average')).from_(full_dataset).where(full_dataset.sides > 10).execute()
+        self.assertEqual(result.raw_dataset, [ { 'COUNT(*)': 0, 'average': None } ])
+        # Un agrégat n'a pas de valeur hors d'une requête, et ne somme que des nombres
+        with self.assertRaises(TypeError):
+            sum_(full_dataset.sides).value
+        with self.assertRaisesRegex(TypeError, 'non-numeric'):
+            select(sum_(full_dataset.shape)).from_(full_dataset).execute()
+
+    def test_Approximate(self):
+        dataset = Dataset([ { 'id': index, 'amount': index % 10 } for index in range(100000) ], name='Amounts')
+        sample = dataset.sample(0.05, seed=2)
+        query = select(count().as_('count'), sum_(sample.amount).as_('total')).from_(sample).approximate(confidence=0.99)
+        result = query.execute().raw_dataset[0]
+        self.assertIsInstance(result['count'], Estimate)
+        self.assertTrue(result['count'].low <= 100000 <= result['count'].high)
+        self.assertTrue(result['total'].low <= 450000 <= result['total'].high)
+        self.assertIn('APPROXIMATE', query.explain())
+        # Sans échantillon, l'estimation est exacte
+        result = select(count().as_('count')).from_(dataset).approximate().execute().raw_dataset[0]
+        self.assertEqual((result['count'], result['count'].error), (100000, 0))
+
+    def test_SketchAggregates(self):
+        dataset = Dataset([ { 'user': index % 5000, 'latency': index % 1000 } for index in range(20000) ], name='Requests')
+        query = select(
+            approx_count_distinct(dataset.user).as_('users'),
+            approx_percentile(dataset.latency, 0.99).as_('p99'),
+        ).from_(dataset)
+        result = query.execute().raw_dataset[0]
+        self.assertAlmostEqual(result['users'], 5000, delta=5000 * 0.05)
+        self.assertAlmostEqual(result['p99'], 990, delta=5)
+        self.assertIn('APPROX_PERCENTILE(`Requests`.`latency`, 0.99, 100)', query.explain())
+        # Les résumés de partitions distinctes se fusionnent
+        first, second = HyperLogLog(), HyperLogLog()
+        for user in range(3000):
+            first.add(user)
+            second.add(user + 2000)
+        self.assertAlmostEqual(len(first.merge(second)), 5000, delta=5000 * 0.05)
+        # Les nombres égaux sont une seule valeur, comme pour DISTINCT
+        numbers = HyperLogLog()
+        for value in (1, 1.0, True, (2, 'a'), (2.0, 'a')):
+            numbers.add(value)
+        self.assertEqual(len(numbers), 2)
+        # Un centile ne se calcule que sur des nombres
+        with self.assertRaisesRegex(TypeError, 'non-numeric'):
+            select(approx_percentile(dataset.latency.cast_as(str), 0.5)).from_(dataset).execute()
+
+    def test_WindowFunctions(self):
+        dataset = Dataset([
+            { 'day': 1, 'shop': 'A', 'sales': 10 },
+            { 'day': 1, 'shop': 'B', 'sales': 5 },
+            { 'day': 2, 'shop': 'A', 'sales': 20 },
+            { 'day': 2, 'shop': 'B', 'sales': 7 },
+            { 'day': 3, 'shop': 'A', 'sales': 30 },
+        ], name='Sales')
+        query = select(
+            dataset.shop,
+            dataset.day,
+            row_number().over(partition_by=dataset.shop, order_by=desc(dataset.day)).as_('rank'),
+            lag(dataset.sales).over(partition_by=dataset.shop, order_by=dataset.day).as_('previous'),
+            lead(dataset.sales, default=0).over(partition_by=dataset.shop, order_by=dataset.day).as_('next'),
+            running_sum(dataset.sales).over(partition_by=dataset.shop, order_by=dataset.day).as_('total'),
+        ).from_(dataset).where(dataset.day > 0).order_by(dataset.shop, dataset.day)
+        self.assertEqual(query.execute().raw_dataset, [
+            { 'shop': 'A', 'day': 1, 'rank': 3, 'previous': None, 'next': 20, 'total': 10 },
+            { 'shop': 'A', 'day': 2, 'rank': 2, 'previous': 10, 'next': 30, 'total': 30 },
+            { 'shop': 'A', 'day': 3, 'rank': 1, 'previous': 20, 'next': 0, 'total': 60 },
+            { 'shop': 'B', 'day': 1, 'rank': 2, 'previous': None, 'next': 7, 'total': 5 },
+            { 'shop': 'B', 'day': 2, 'rank': 1, 'previous': 5, 'next': 0, 'total': 12 },
+        ])
+        self.assertIn('ROW_NUMBER() OVER (PARTITION BY `Sales`.`shop` ORDER BY `Sales`.`day` DESC)', query.explain())
+
+    def test_ExternalSort(self):
+        dataset = Dataset([ { 'id': index, 'group': (index * 7919) % 13 } for index in range(3000) ], name='Unsorted')
+        query = select(dataset.id, dataset.group).from_(dataset).order_by(desc(dataset.group), dataset.id)
+        expected = query.execute().raw_dataset
+        runs = [ ]
+        write_run = DatasetQuery._write_run
+        def counting_write_run(rows, directory=None):
+            runs.append(len(rows))
+            return write_run(rows, directory)
+        DatasetQuery._write_run = counting_write_run
+        try:
+            query.external_sort(max_memory=32 * 1024)
+            self.assertEqual(list(query.stream()), expected)
+            self.assertGreater(len(runs), 1)
+            self.assertEqual(query.limit(5).execute().raw_dataset, expected[:5])
+        finally:
+            DatasetQuery._write_run = write_run
+        # Des éléments non sérialisables sont triés en mémoire, ou dépassent la limite de mémoire
+        unpicklable = Dataset([ { 'id': index, 'function': lambda: index } for index in range(3000) ], name='Unpicklable')
+        query = select(unpicklable.id, unpicklable.function).from_(unpicklable).order_by(desc(unpicklable.id)).external_sort(max_memory=32 * 1024)
+        self.assertEqual([ element['id'] for element in query.stream() ], list(range(2999, -1, -1)))
+        with self.assertRaisesRegex(ResourceLimitError, 'cannot be written to disk'):
+            select(unpicklable.id, unpicklable.function).from_(unpicklable).order_by(unpicklable.id).execute(max_memory=256 * 1024)
+
+    def test_ResourceLimits(self):
+        left = Dataset([ { 'id': index } for index in range(300) ], name='Left')
+        right = Dataset([ { 'id': index } for index in range(300) ], name='Right')
+        # Produit cartésien sans ON : arrêté dès que la jointure dépasse la limite
+        cartesian = select(left.id, right.id.as_('other')).from_(left).join(right)
+        with self.assertRaises(ResourceLimitError):
+            cartesian.execute(max_rows=10000)
+        with self.assertRaises(ResourceLimitError):
+            cartesian.execute(max_memory=100 * 1024)
+        # Une jointure est arrêtée dès la combinaison de trop, même si toutes viennent du même élément
+        evaluated = [ ]
+        def evaluate(value):
+            evaluated.append(value)
+            return value
+        single = Dataset([ { 'id': 0 } ], name='Single')
+        fanout = select(single.id).from_(single).join(right, right.id.func(evaluate) >= single.id)
+        with self.assertRaises(ResourceLimitError):
+            fanout.execute(max_rows=100)
+        self.assertEqual(len(evaluated), 101)
+        # Les agrégats ne peuvent pas être écrits sur disque
+        with self.assertRaises(ResourceLimitError):
+            select(left.id, count()).from_(left).execute(max_rows=100)
+        # Mêmes limites pour une requête préparée, exécutée ou lue au fil de l'eau
+        prepared = select(left.id).from_(left).where(left.id >= param('minimum')).prepare()
+        with self.assertRaises(ResourceLimitError):
+            prepared.execute(minimum=0, max_rows=100)
+        with self.assertRaises(ResourceLimitError):
+            list(prepared.stream(minimum=0, max_rows=100))
+        self.assertEqual(len(prepared.execute(minimum=250, max_rows=100)), 50)
+        with self.assertRaises(TypeError):
+            select(left.id).from_(left).where(left.id >= param('max_rows')).prepare()
+        # Les éléments retournés sont écrits sur disque au-delà de la mémoire allouée, et le résultat est inchangé
+        big = Dataset([ { 'id': index, 'label': f'Element {index}' } for index in range(5000) ], name='Big')
+        runs = [ ]
+        write_run = DatasetQuery._write_run
+        def counting_write_run(rows, directory=None):
+            runs.append(len(rows))
+            return write_run(rows, directory)
+        DatasetQuery._write_run = counting_write_run
+        try:
+            for query in (select(big.id, big.label).from_(big), select(big.id).from_(big).order_by(desc(big.id))):
+                runs.clear()
+                self.assertEqual(query.execute(max_memory=512 * 1024).raw_dataset, query.execute().raw_dataset)
+                self.assertGreater(len(runs), 1)
+        finally:
+            DatasetQuery._write_run = write_run
+        self.assertEqual(len(cartesian.execute(max_rows=90000)), 90000)
+
+    def test_SetOperations(self):
+        red = select(full_dataset.shape).from_(full_dataset).where(full_dataset.color == 'red')
+        squares = select(sides_dataset.shape.as_('name')).from_(sides_dataset).where(sides_dataset.sides == 4)
+        shapes = select(full_dataset.shape).from_(full_dataset)
+        self.assertEqual(shapes.distinct().execute().raw_dataset, [ { 'shape': 'triangle' }, { 'shape': 'square' } ])
+        self.assertEqual(str(shapes), 'SELECT DISTINCT `FullDataset`.`shape` FROM `FullDataset`')
+        self.assertEqual(red.union(squares).execute().raw_dataset, [ { 'shape': 'triangle' }, { 'shape': 'square' } ])
+        self.assertEqual(len(red.union_all(squares).execute()), 3)
+        self.assertEqual(red.intersect(squares).execute().raw_dataset, [ { 'shape': 'square' } ])
+        self.assertEqual(red.except_(squares).execute().raw_dataset, [ { 'shape': 'triangle' } ])
+        self.assertIn(' EXCEPT SELECT ', str(red.except_(squares)))
+        # Au-delà de la mémoire allouée, les éléments sont traités par partitions sur disque
+        left = Dataset([ { 'id': index % 3000, 'tags': [ index % 7 ] } for index in range(6000) ], name='Left')
+        right = Dataset([ { 'id': index } for index in range(0, 3000, 2) ], name='Right')
+        everything = select(left.id).from_(left)
+        evens = select(right.id).from_(right)
+        self.assertEqual(sorted(row['id'] for row in everything.except_(evens).stream(max_memory=512 * 1024)), list(range(1, 3000, 2)))
+        self.assertEqual(len(everything.union(evens).execute(max_memory=512 * 1024)), 3000)
+        distinct = select(left.id, left.tags).from_(left).distinct()
+        self.assertEqual(len(distinct.execute(max_memory=512 * 1024)), 6000)
+        # Les éléments sont comparés comme en Python, valeurs non hachables comprises
+        values = Dataset([
+            { 'm': { 'x': 1, 'y': 2 }, 'n': 1 }, { 'm': { 'y': 2, 'x': 1 }, 'n': 1.0 },
+            { 'm': [ 1, { 2 } ], 'n': 1 }, { 'm': [ 1.0, frozenset({ 2 }) ], 'n': True },
+            { 'm': ( 1, [ 2 ] ), 'n': 1 }, { 'm': [ 1, [ 2 ] ], 'n': 1 }, { 'm': { ( 'x', 1 ) }, 'n': [ ] },
+        ], name='Values')
+        self.assertEqual(len(select(values.m, values.n).from_(values).distinct().execute()), 5)
+
+    def test_InLists(self):
+        ids = list(range(0, 100000, 3))
+        numbers = Dataset([ { 'id': index, 'tags': [ index % 2 ] } for index in range(30) ], name='Numbers')
+        query = select(numbers.id).from_(numbers).where(numbers.id.in_(ids))
+        self.assertEqual([ row['id'] for row in query.execute().raw_dataset ], list(range(0, 30, 3)))
+        self.assertIn('IN [0, 3, 6', str(query))
+        # Valeurs non hachables
+        tagged = select(numbers.id).from_(numbers).where(numbers.tags.in_([ [ 1 ], 'other' ]))
+        self.assertEqual(len(tagged.execute()), 15)
+        # Sous-requêtes : exécutées une fois par exécution, en semi-jointure ou anti-jointure
+        executions = [ ]
+        class Recorder(QueryObserver):
+            def query_started(self, query, fingerprint):
+                executions.append(fingerprint)
+        squares = select(sides_dataset.shape).from_(sides_dataset).where(sides_dataset.sides == param('sides')).observe(Recorder())
+        semi = select(full_dataset.color).from_(full_dataset).where(full_dataset.shape.in_(squares)).prepare()
+        self.assertEqual(semi.parameters, [ 'sides' ])
+        self.assertEqual(semi.execute(sides=4).raw_dataset, [ { 'color': 'red' }, { 'color': 'blue' } ])
+        self.assertEqual(len(executions), 1)
+        anti = select(full_dataset.color).from_(full_dataset).where(~full_dataset.shape.in_(squares)).prepare()
+        self.assertEqual(len(anti.execute(sides=4)), 2)
+        self.assertEqual(len(anti.execute(sides=3)), 2)
+        self.assertEqual(len(executions), 3)
+        self.assertIn('IN (SELECT `Sides`.`shape` FROM `Sides` WHERE', str(anti))
+        # Sous-requête corrélée, ou requête préparée : refusées clairement
+        correlated = select(sides_dataset.shape).from_(sides_dataset).where(sides_dataset.sides == full_dataset.sides)
+        with self.assertRaisesRegex(SyntaxError, 'correlated'):
+            select(full_dataset.color).from_(full_dataset).where(full_dataset.shape.in_(correlated)).execute()
+        with self.assertRaisesRegex(TypeError, 'prepared'):
+            full_dataset.shape.in_(squares.prepare())
+
+    def test_SQLiteDataset(self):
+        dataset = SQLiteDataset(sqlite3.connect(':memory:'), 'shapes')
+        dataset += full_dataset
+        self.assertEqual(dataset.raw_dataset, full_dataset.raw_dataset)
+        # Les termes traduisibles sont exécutés par SQLite, les autres en Python
+        clause = (dataset.sides > 3) & dataset.color.in_([ 'red', 'green' ])
+        self.assertEqual(dataset.to_sql(dataset.color != 'red'), ('(NOT ("color" = ? AND typeof("color") IN (\'text\')))', [ 'red' ]))
+        self.assertIsNotNone(dataset.to_sql(clause))
+        self.assertIsNone(dataset.to_sql(dataset.color.func(str.upper)))
+        # L'arithmétique et CAST ne sont pas traduits : leur sémantique SQL diffère de celle de Python
+        self.assertIsNone(dataset.to_sql(dataset.sides * 2))
+        self.assertIsNone(dataset.to_sql(dataset.sides.cast_as(int) == 3))
+        result = select(dataset.shape, dataset.color).from_(dataset).where(clause & (dataset.shape.func(len) == 6)).execute()
+        self.assertEqual(result.raw_dataset, [ { 'shape': 'square', 'color': 'red' } ])
+        update(dataset).set_(UpdateElement(dataset.sides, dataset.sides * 2)).where(dataset.shape == 'square').execute()
+        update(dataset).set_(UpdateElement(dataset.description, dataset.color.func(str.capitalize))).where(dataset.sides == 8).execute()
+        delete().from_(dataset).where(dataset.color == 'blue').execute()
+        alter(dataset).drop(dataset.color).execute()
+        self.assertEqual(dataset.raw_dataset, [
+            { 'shape': 'triangle', 'sides': 3, 'description': None },
+            { 'shape': 'square', 'sides': 8, 'description': 'Red' },
+        ])
+
+    def test_SQLiteNulls(self):
+        # Les conditions traduites en SQL retiennent les mêmes éléments qu'en Python, NULL compris
+        rows = [ { 'k': 1, 'c': 'red' }, { 'k': 2 }, { 'k': 3, 'c': 'blue' }, { 'k': 4, 'c': 4 }, { 'k': 5, 'c': '3.5' } ]
+        def datasets():
+            memory = Dataset([ dict(row) for row in rows ])
+            stored = SQLiteDataset(sqlite3.connect(':memory:'), 'rows')
+            stored += Dataset([ dict(row) for row in rows ])
+            return memory, stored
+        clauses = [
+            lambda d: d.c != 'red',
+            lambda d: ~(d.c == 'red'),
+            lambda d: d.c == None,
+            lambda d: d.c < 'z',
+            lambda d: ~(d.c < 'z'),
+            lambda d: d.c == d.k,
+            lambda d: d.c != d.k,
+            lambda d: ~(d.c > d.k),
+            lambda d: d.c.in_([ 'red', 4, None ]),
+            lambda d: ~d.c.in_([ 'red' ]),
+            lambda d: (d.c == 'red') | (d.k > 2),
+            lambda d: ~((d.c < 'z') & (d.k > 1)),
+            lambda d: ~((d.c > 'a') | (d.k == 2)),
+            lambda d: d.c.cast_as(int) == 3,
+        ]
+        for clause in clauses:
+            memory, stored = datasets()
+            expected = select(memory.k).from_(memory).where(clause(memory)).execute().raw_dataset
+            self.assertEqual(select(stored.k).from_(stored).where(clause(stored)).execute().raw_dataset, expected)
+            update(memory).set_(UpdateElement(memory.flag, True)).where(clause(memory)).execute()
+            update(stored).set_(UpdateElement(stored.flag, True)).where(clause(stored)).execute()
+            self.assertEqual([ row['k'] for row in stored.raw_dataset if row.get('flag') ], [ row['k'] for row in expected ])
+            delete().from_(memory).where(clause(memory)).execute()
+            delete().from_(stored).where(clause(stored)).execute()
+            self.assertEqual([ row['k'] for row in stored.raw_dataset ], [ row['k'] for row in memory.raw_dataset ])
+            # La longueur est le nombre d'éléments restants, et non le plus grand rowid
+            self.assertEqual(len(stored), len(memory.raw_dataset))
+            self.assertEqual(len(list(stored.cursor())), len(stored))
+
+    def test_PreparedQuery(self):
+        prepared = (
+            select(full_dataset.shape, sides_dataset.sides)
+            .from_(full_dataset)
+            .join(sides_dataset, full_dataset.shape == sides_dataset.shape)
+            .where((full_dataset.sides >= param('min_sides')) & (full_dataset.color == param('color')))
+            .prepare()
+        )
+        self.assertEqual(sorted(prepared.parameters), [ 'color', 'min_sides' ])
+        self.assertIn('(`FullDataset`.`sides` >= :min_sides)', prepared.explain())
+        self.assertEqual(prepared.execute(min_sides=4, color='red').raw_dataset, [ { 'shape': 'square', 'sides': 4 } ])
+        self.assertEqual(prepared.execute(min_sides=0, color='blue').raw_dataset, [
+            { 'shape': 'triangle', 'sides': 3 },
+            { 'shape': 'square', 'sides': 4 },
+        ])
+        with self.assertRaises(TypeError):
+            prepared.execute(min_sides=4)
+        # Une requête n'est pas réentrante : une exécution ne peut pas commencer avant la fin de la précédente
+        rows = prepared.stream(min_sides=0, color='blue')
+        self.assertEqual(next(rows), { 'shape': 'triangle', 'sides': 3 })
+        with self.assertRaises(RuntimeError):
+            prepared.execute(min_sides=4, color='red')
+        with self.assertRaises(RuntimeError):
+            next(prepared.stream(min_sides=4, color='red'))
+        self.assertEqual(list(rows), [ { 'shape': 'square', 'sides': 4 } ])
+        self.assertEqual(len(prepared.execute(min_sides=4, color='red')), 1)
+        query = select(full_dataset.shape).from_(full_dataset)
+        rows = query.stream()
+        next(rows)
+        with self.assertRaises(RuntimeError):
+            query.execute()
+        rows.close()
+        self.assertEqual(len(query.execute()), 4)
+        # Une requête de modification préparée
+        dataset = copy_dataset(full_dataset)
+        recolor = update(dataset).set_(UpdateElement(dataset.color, param('color'))).where(dataset.sides == param('sides')).prepare()
+        recolor.execute(color='green', sides=3)
+        self.assertEqual([ element['color'] for element in dataset.raw_dataset ], [ 'green', 'green', 'red', 'blue' ])
+
+    def test_Observers(self):
+        class Recorder(QueryObserver):
+            def __init__(self):
+                self.events = [ ]
+            def query_finished(self, query, fingerprint, duration, counters):
+                self.events.append((fingerprint, counters))
+            def operator_finished(self, query, operator, duration, rows_in, rows_out):
+                self.events.append((operator, rows_in, rows_out))
+
+        recorder = Recorder()
+        prepared = (
+            select(full_dataset.shape, sides_dataset.sides)
+            .from_(full_dataset)
+            .join(sides_dataset, full_dataset.shape == sides_dataset.shape)
+            .where(full_dataset.color == param('color'))
+            .observe(recorder)
+            .prepare()
+        )
+        prepared.execute(color='red')
+        self.assertIn(('MERGE JOIN (`Sides`.`shape` = `FullDataset`.`shape`) `Sides`', 4, 4), recorder.events)
+        self.assertIn(('FILTER', 4, 2), recorder.events)
+        fingerprint, counters = recorder.events[-1]
+        self.assertEqual(counters, { 'rows_scanned': 7, 'rows_joined': 4, 'rows_returned': 2 })
+        # Même empreinte quelles que soient les valeurs des paramètres
+        prepared.execute(color='blue')
+        self.assertEqual(recorder.events[-1][0], fingerprint)
+        # Sans observateur, aucun libellé d'opérateur n'est construit
+        class Labelled(Dataset):
+            labels = 0
+            def __str__(self):
+                Labelled.labels += 1
+                return super().__str__()
+        shapes, sides = Labelled(full_dataset.raw_dataset), Labelled(sides_dataset.raw_dataset)
+        query = select(shapes.shape).from_(shapes).join(sides, shapes.shape == sides.shape).where(sides.sides > 3)
+        Labelled.labels = 0
+        self.assertEqual(len(query.execute()), 2)
+        self.assertEqual(Labelled.labels, 0)
+        # Journal global des requêtes les plus lentes
+        log = SlowQueryLog(size=2)
+        add_observer(log)
+        try:
+            for _ in range(3):
+                select().from_(full_dataset).execute()
+            copied = copy_dataset(full_dataset)
+            delete().from_(copied).where(copied.sides == 3).execute()
+        finally:
+            remove_observer(log)
+        self.assertEqual(len(log), 2)
+        self.assertEqual(len(copied), 2)
+        slowest = log.entries
+        self.assertGreaterEqual(slowest[0].duration, slowest[1].duration)
+        self.assertTrue(all(entry.explain.startswith(('SELECT', 'DELETE')) for entry in slowest))
+
+    def test_SharedDataset(self):
+        with publish(full_dataset) as shared:
+            self.assertEqual([ dict(element) for element in shared.raw_dataset ], full_dataset.raw_dataset)
+            # Un processus rattaché voit les mêmes éléments, et peut les interroger
+            with attach(shared.shm_name) as attached:
+                result = select(attached.shape).from_(attached).where(attached.sides == 4).execute()
+                self.assertEqual([ dict(element) for element in result.raw_dataset ], [ { 'shape': 'square' } ] * 2)
+            with self.assertRaises(TypeError):
+                shared += full_dataset
+            # D'autres processus s'y rattachent et l'interrogent
+            with multiprocessing.Pool(2) as pool:
+                self.assertEqual(pool.map(count_sides, [ (shared, 3), (shared, 4), (shared, 8) ]), [ 2, 2, 0 ])
+            self.assertEqual(len(shared), 4)
+
     def test_UpdateDataset(self):
 
         def capitalize(string: str) -> str:
@@ -149,6 +761,42 @@ class test_SelectQuery(unittest.TestCase):
         result = query.execute()
         self.assertEqual(result.raw_dataset, dropped_dataset.raw_dataset)
 
+    def test_InsertQuery(self):
+        dataset = copy_dataset(full_dataset)
+        dataset.zone_map('sides', block_size=2)
+        query = insert().into(dataset).values({ 'shape': 'octogon', 'color': 'red', 'sides': 8 })
+        self.assertEqual(str(query), f'INSERT INTO {dataset} VALUES (1 elements)')
+        query.execute()
+        self.assertEqual(dataset.raw_dataset[-1], { 'shape': 'octogon', 'color': 'red', 'sides': 8 })
+        # Les résumés min/max du dataset tiennent compte des éléments insérés
+        self.assertEqual(len(select(dataset.shape).from_(dataset).where(dataset.sides > 5).execute()), 1)
+        insert().into(dataset).from_query(select(sides_dataset.shape, sides_dataset.sides).from_(sides_dataset)).execute()
+        self.assertEqual(len(dataset), 8)
+        with self.assertRaises(SyntaxError):
+            insert().into(dataset).execute()
+
+    def test_MergeQuery(self):
+        stock = Dataset([ { 'sku': 'A', 'quantity': 1 }, { 'sku': 'B', 'quantity': 2 } ], name='Stock')
+        delivery = Dataset([ { 'sku': 'B', 'quantity': 5 }, { 'sku': 'C', 'quantity': 7 } ], name='Delivery')
+        query = (
+            merge(stock)
+            .using(delivery)
+            .on(stock.sku == delivery.sku)
+            .when_matched_update(UpdateElement(stock.quantity, stock.quantity + delivery.quantity))
+            .when_not_matched_insert()
+        )
+        self.assertEqual(str(query), 'MERGE INTO `Stock` USING `Delivery` ON (`Stock`.`sku` == `Delivery`.`sku`) '
+                         'WHEN MATCHED THEN UPDATE SET `Stock`.`quantity` = (`Stock`.`quantity` + `Delivery`.`quantity`) '
+                         'WHEN NOT MATCHED THEN INSERT *')
+        query.execute()
+        self.assertEqual(stock.raw_dataset, [ { 'sku': 'A', 'quantity': 1 }, { 'sku': 'B', 'quantity': 7 }, { 'sku': 'C', 'quantity': 7 } ])
+        # Upsert par nom de champ : les éléments de la source remplacent ceux de la cible
+        upsert = Dataset([ { 'sku': 'A', 'quantity': 0 }, { 'sku': 'D', 'quantity': 1 } ])
+        merge(stock).using(upsert).on('sku').when_matched_update().when_not_matched_insert().execute()
+        self.assertEqual([ (element['sku'], element['quantity']) for element in stock.raw_dataset ], [ ('A', 0), ('B', 7), ('C', 7), ('D', 1) ])
+        with self.assertRaises(ValueError):
+            merge(stock).using(Dataset([ { 'sku': 'A' }, { 'sku': 'A' } ])).on('sku').when_matched_update().execute()
+
     def test_DeleteQuery(self):
         dataset_copy = copy_dataset(updated_dataset)
         query = (